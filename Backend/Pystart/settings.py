@@ -1,14 +1,20 @@
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+# Archivo .env del backend. El servicio de IA lo vuelve a leer cada
+# AI_CONFIG_RELOAD_INTERVAL segundos (ver education/ai_service_isolated.py)
+ENV_FILE = os.path.join(BASE_DIR, ".env")
+
+
 # Cargar variables de entorno desde .env
 def load_env():
-    env_path = os.path.join(BASE_DIR, ".env")
+    env_path = ENV_FILE
     if os.path.exists(env_path):
         with open(env_path, "r") as f:
             for line in f:
@@ -51,7 +57,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise con soporte async (ver Pystart/middleware.py)
+    "Pystart.middleware.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -145,4 +152,160 @@ if not DEBUG:
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # IA Configuration
+# Proveedor de IA (education/ai_providers.py): "groq", "openai" (cualquier API
+# compatible con OpenAI) o "stub" (respuestas simuladas sin red, para pruebas
+# de carga)
+AI_PROVIDER = os.getenv("AI_PROVIDER", "groq")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", None)
+# API de Groq compatible con OpenAI (se puede apuntar a education/mock_llm.py en pruebas)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "30"))
+# Conexiones keep-alive que el cliente HTTP mantiene abiertas por proceso
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60"))
+# Conexiones del cliente asíncrono de las vistas ASGI (ai-assistant/async/, etc.)
+GROQ_ASYNC_MAX_CONNECTIONS = int(os.getenv("GROQ_ASYNC_MAX_CONNECTIONS", "200"))
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", None)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Latencia simulada (segundos) de cada respuesta del proveedor "stub"
+AI_STUB_DELAY = float(os.getenv("AI_STUB_DELAY", "0"))
+# Modelo más pequeño y rápido para las tareas sencillas (tipos de análisis de
+# AI_FAST_MODEL_TASKS); vacío = se usa el modelo predeterminado del proveedor
+AI_FAST_MODEL = os.getenv("AI_FAST_MODEL", "")
+AI_FAST_MODEL_TASKS = [
+    task.strip()
+    for task in os.getenv("AI_FAST_MODEL_TASKS", "explain").split(",")
+    if task.strip()
+]
+# Cada cuántos segundos el servicio de IA vuelve a leer su configuración
+# (incluidos el proveedor, los modelos, las URL y las claves de Backend/.env)
+AI_CONFIG_RELOAD_INTERVAL = int(os.getenv("AI_CONFIG_RELOAD_INTERVAL", "30"))
+# Caché de respuestas de IA: "local" (memoria de cada proceso), "django"
+# (alias AI_CACHE_ALIAS de CACHES, compartido entre procesos) o "" (desactivada)
+AI_CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "django")
+AI_CACHE_ALIAS = os.getenv("AI_CACHE_ALIAS", "ai")
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", str(24 * 3600)))
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "2000"))
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Historial del asistente (education/ai_history.py), en tokens estimados:
+# presupuesto del prompt completo, mensajes recientes que se envían literales,
+# tamaño del resumen de los anteriores y del código del ejercicio
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "4000"))
+AI_HISTORY_RECENT_MESSAGES = int(os.getenv("AI_HISTORY_RECENT_MESSAGES", "10"))
+AI_HISTORY_SUMMARY_TOKENS = int(os.getenv("AI_HISTORY_SUMMARY_TOKENS", "400"))
+AI_CONTEXT_CODE_TOKENS = int(os.getenv("AI_CONTEXT_CODE_TOKENS", "1500"))
+# Peticiones idénticas en curso comparten una sola llamada al proveedor
+# (entre workers mediante la tabla BloqueoIA si la caché es "django")
+AI_SINGLEFLIGHT = os.getenv("AI_SINGLEFLIGHT", "1") == "1"
+# Cada cuántos segundos un worker en espera busca la respuesta en la caché
+AI_SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("AI_SINGLEFLIGHT_POLL_INTERVAL", "0.1"))
+# Protección frente al proveedor (education/ai_resilience.py); el estado se
+# comparte entre workers en este alias de CACHES
+AI_RESILIENCE_CACHE_ALIAS = os.getenv("AI_RESILIENCE_CACHE_ALIAS", AI_CACHE_ALIAS)
+# Cubeta de tokens ajustada a la cuota del proveedor (0 = sin límite) y
+# segundos que una petición puede esperar un token antes de fallar
+AI_RATE_LIMIT_PER_MINUTE = int(os.getenv("AI_RATE_LIMIT_PER_MINUTE", "30"))
+AI_RATE_LIMIT_BURST = int(os.getenv("AI_RATE_LIMIT_BURST", "10"))
+AI_RATE_LIMIT_MAX_WAIT = float(os.getenv("AI_RATE_LIMIT_MAX_WAIT", "2"))
+# Circuit breaker: fallos seguidos que lo abren y segundos hasta la petición de prueba
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv("AI_BREAKER_RESET_TIMEOUT", "30"))
+# Reintentos ante errores transitorios (red, 429, 5xx) con espera exponencial y jitter
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "4"))
+# Medición de uso de IA (tabla UsoIA): activada, registros que se acumulan en
+# memoria y segundos máximos antes de insertarlos en un solo lote
+AI_USAGE_ENABLED = os.getenv("AI_USAGE_ENABLED", "1") == "1"
+AI_USAGE_BUFFER_SIZE = int(os.getenv("AI_USAGE_BUFFER_SIZE", "50"))
+AI_USAGE_FLUSH_INTERVAL = float(os.getenv("AI_USAGE_FLUSH_INTERVAL", "5"))
+# Análisis previo de los ejercicios de cada sección (education/section_analysis.py):
+# activado, hilos del proceso web que lo generan (0 = solo el comando
+# process_section_analyses) y segundos tras los que un análisis en curso se reencola
+AI_PREANALYSIS_ENABLED = os.getenv("AI_PREANALYSIS_ENABLED", "1") == "1"
+AI_PREANALYSIS_WORKERS = int(os.getenv("AI_PREANALYSIS_WORKERS", "1"))
+AI_PREANALYSIS_STALE_AFTER = int(os.getenv("AI_PREANALYSIS_STALE_AFTER", "300"))
+# Inscripciones por UPDATE al recalcular el progreso de un curso cuando se
+# añaden o borran secciones
+PROGRESS_RECALC_BATCH_SIZE = int(os.getenv("PROGRESS_RECALC_BATCH_SIZE", "5000"))
+# Pares estudiante/sección por petición en progreso-secciones/completar/lote/
+PROGRESS_BULK_MAX_ITEMS = int(os.getenv("PROGRESS_BULK_MAX_ITEMS", "1000"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # En disco para que todos los procesos de gunicorn del nodo la compartan
+    "ai": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv(
+            "AI_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "pystart-ai-cache"),
+        ),
+        "TIMEOUT": AI_CACHE_TTL,
+        "OPTIONS": {"MAX_ENTRIES": AI_CACHE_SIZE},
+    },
+}
+
+# Ejecutor de código
+CODE_EXECUTOR_TIMEOUT = int(os.getenv("CODE_EXECUTOR_TIMEOUT", "5"))
+# Número de intérpretes precalentados por proceso web (0 = un proceso nuevo por ejecución)
+CODE_EXECUTOR_POOL_SIZE = int(os.getenv("CODE_EXECUTOR_POOL_SIZE", "2"))
+# Ejecuciones antes de reciclar un intérprete del pool
+CODE_EXECUTOR_MAX_RUNS_PER_WORKER = int(
+    os.getenv("CODE_EXECUTOR_MAX_RUNS_PER_WORKER", "50")
+)
+# Caché de resultados para programas deterministas idénticos (0 = desactivada)
+CODE_EXECUTOR_CACHE_SIZE = int(os.getenv("CODE_EXECUTOR_CACHE_SIZE", "1000"))
+CODE_EXECUTOR_CACHE_TTL = int(os.getenv("CODE_EXECUTOR_CACHE_TTL", "3600"))
+CODE_EXECUTOR_CACHE_MAX_BYTES = int(
+    os.getenv("CODE_EXECUTOR_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+# Modo asíncrono: hilos por proceso web que procesan la cola TrabajoEjecucion
+# (0 = solo el comando "manage.py process_code_jobs")
+CODE_EXECUTOR_JOB_WORKERS = int(os.getenv("CODE_EXECUTOR_JOB_WORKERS", "2"))
+# Máximo de segundos que un GET puede esperar el resultado (long-polling). La
+# espera no ocupa hilos bajo ASGI; bajo WSGI conviene dejarlo en pocos segundos
+CODE_EXECUTOR_JOB_MAX_WAIT = int(os.getenv("CODE_EXECUTOR_JOB_MAX_WAIT", "2"))
+# Intentos de obtener cupo del limitador del nodo antes de dar el trabajo por
+# fallido ("ejecutor saturado"); entre intentos se espera el Retry-After estimado
+CODE_EXECUTOR_JOB_ADMISSION_ATTEMPTS = int(
+    os.getenv("CODE_EXECUTOR_JOB_ADMISSION_ATTEMPTS", "3")
+)
+# Trabajos "ejecutando" más antiguos que esto se reencolan al iniciar el comando
+CODE_EXECUTOR_JOB_STALE_AFTER = int(os.getenv("CODE_EXECUTOR_JOB_STALE_AFTER", "300"))
+# Tiempo máximo para ejecutar todos los casos de prueba de una calificación
+CODE_EXECUTOR_GRADING_TIMEOUT = int(os.getenv("CODE_EXECUTOR_GRADING_TIMEOUT", "15"))
+# Límites de recursos del sandbox (0 = sin límite)
+# Segundos de CPU por ejecución
+CODE_EXECUTOR_CPU_SECONDS = int(os.getenv("CODE_EXECUTOR_CPU_SECONDS", "5"))
+# Memoria virtual máxima de cada intérprete
+CODE_EXECUTOR_MEMORY_MB = int(os.getenv("CODE_EXECUTOR_MEMORY_MB", "256"))
+CODE_EXECUTOR_MAX_OPEN_FILES = int(os.getenv("CODE_EXECUTOR_MAX_OPEN_FILES", "64"))
+# RLIMIT_NPROC cuenta todos los procesos del usuario del sistema, por eso
+# solo conviene activarlo si el ejecutor corre con un usuario dedicado
+CODE_EXECUTOR_MAX_PROCESSES = int(os.getenv("CODE_EXECUTOR_MAX_PROCESSES", "0"))
+# Bytes de salida (stdout + stderr) por ejecución; el programa se detiene al superarlo
+CODE_EXECUTOR_MAX_OUTPUT_BYTES = int(
+    os.getenv("CODE_EXECUTOR_MAX_OUTPUT_BYTES", str(1024 * 1024))
+)
+# Control de admisión: ejecuciones simultáneas en todo el nodo (0 = sin límite)
+CODE_EXECUTOR_MAX_CONCURRENT = int(
+    os.getenv("CODE_EXECUTOR_MAX_CONCURRENT", str(os.cpu_count() or 2))
+)
+# Peticiones que pueden esperar un cupo; las demás reciben 429 con Retry-After
+CODE_EXECUTOR_QUEUE_SIZE = int(os.getenv("CODE_EXECUTOR_QUEUE_SIZE", "50"))
+# Segundos máximos de espera en la cola
+CODE_EXECUTOR_QUEUE_TIMEOUT = int(os.getenv("CODE_EXECUTOR_QUEUE_TIMEOUT", "10"))
+# Directorio compartido por los procesos del nodo para los archivos de bloqueo
+CODE_EXECUTOR_LOCK_DIR = os.getenv("CODE_EXECUTOR_LOCK_DIR", "")
+# Ejecución por lotes (execute-code/batch/): fragmentos en paralelo y máximo por petición
+CODE_EXECUTOR_BATCH_PARALLELISM = int(os.getenv("CODE_EXECUTOR_BATCH_PARALLELISM", "4"))
+CODE_EXECUTOR_BATCH_MAX_ITEMS = int(os.getenv("CODE_EXECUTOR_BATCH_MAX_ITEMS", "200"))
+# Hashes de código ya compilado para la verificación de sintaxis previa
+CODE_EXECUTOR_SYNTAX_CACHE_SIZE = int(
+    os.getenv("CODE_EXECUTOR_SYNTAX_CACHE_SIZE", "5000")
+)
@@ -0,0 +1,272 @@
+"""
+Control de admisión del ejecutor de código.
+
+Limita cuántas ejecuciones corren a la vez en todo el nodo (entre todos los
+procesos de gunicorn) sin servicios externos:
+
+* Cada ejecución en curso tiene bloqueado (``flock``) uno de los archivos
+  ``slot-N`` de ``CODE_EXECUTOR_LOCK_DIR``. El sistema operativo libera el
+  bloqueo si el proceso muere, así que un crash nunca deja un cupo ocupado.
+* Las peticiones que esperan se anotan en ``cola.json`` (protegido por otro
+  ``flock``). La cola es acotada y se atiende por turnos entre clientes (el
+  usuario autenticado o, si no hay, la IP): la segunda petición de un cliente
+  pasa detrás de la primera de todos los demás. Quien espera consulta la
+  cola con un intervalo creciente y el archivo solo se reescribe cuando
+  cambia, para que el bloqueo no sea el cuello de botella con mucha carga.
+
+En plataformas sin ``fcntl`` (Windows) se usa un semáforo por proceso.
+"""
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Intervalo entre consultas de la cola: empieza corto y se duplica hasta el máximo
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+
+class ExecutionQueueFull(Exception):
+    """No hay cupo en la cola de ejecución; el cliente debe reintentar más tarde."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Cola de ejecución llena, reintentar en {retry_after} s")
+        self.retry_after = retry_after
+
+
+class _Timing:
+    """Media móvil de la duración de las ejecuciones para estimar Retry-After."""
+
+    def __init__(self, initial=1.0, alpha=0.2):
+        self.average = initial
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.average += self.alpha * (seconds - self.average)
+
+    def retry_after(self, waiting, slots):
+        return max(1, math.ceil((waiting + 1) / max(slots, 1) * self.average))
+
+
+_timing = _Timing()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _fair_order(entries):
+    # Turno de cada petición dentro de su estudiante (0 para la primera,
+    # 1 para la segunda...) y luego orden de llegada
+    turns = {}
+    ranked = []
+    for entry in sorted(entries, key=lambda entry: entry["since"]):
+        turn = turns.get(entry["student"], 0)
+        turns[entry["student"]] = turn + 1
+        ranked.append((turn, entry["since"], entry["ticket"]))
+    return [ticket for _, _, ticket in sorted(ranked)]
+
+
+class FileLockLimiter:
+    """Semáforo entre procesos basado en archivos bloqueados con ``flock``."""
+
+    def __init__(self, lock_dir, slots, queue_size, queue_timeout):
+        self.lock_dir = lock_dir
+        self.slots = slots
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        os.makedirs(lock_dir, exist_ok=True)
+        self._queue_path = os.path.join(lock_dir, "cola.json")
+        self._queue_lock_path = os.path.join(lock_dir, "cola.lock")
+
+    @contextmanager
+    def _queue(self):
+        """Abre la cola de espera con bloqueo exclusivo y guarda los cambios al salir."""
+        with open(self._queue_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._queue_path) as f:
+                        stored = json.load(f)
+                except (OSError, ValueError):
+                    stored = []
+                # Se descartan las entradas de procesos que murieron mientras esperaban
+                expired = time.time() - self.queue_timeout * 2
+                entries = [
+                    entry
+                    for entry in stored
+                    if entry["since"] > expired and _pid_alive(entry["pid"])
+                ]
+                yield entries
+                # La mayoría de las consultas solo leen la cola
+                if entries != stored:
+                    tmp_path = f"{self._queue_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(entries, f)
+                    os.replace(tmp_path, self._queue_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _try_slot(self):
+        for index in range(self.slots):
+            slot = open(os.path.join(self.lock_dir, f"slot-{index}"), "a")
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot.close()
+                continue
+            return slot
+        return None
+
+    def waiting(self):
+        with self._queue() as entries:
+            return len(entries)
+
+    @contextmanager
+    def acquire(self, student):
+        ticket = uuid.uuid4().hex
+        with self._queue() as entries:
+            if len(entries) >= self.queue_size:
+                raise ExecutionQueueFull(_timing.retry_after(len(entries), self.slots))
+            entries.append(
+                {
+                    "ticket": ticket,
+                    "student": str(student),
+                    "pid": os.getpid(),
+                    "since": time.time(),
+                }
+            )
+
+        slot = None
+        deadline = time.monotonic() + self.queue_timeout
+        interval = POLL_INTERVAL
+        try:
+            while slot is None:
+                with self._queue() as entries:
+                    order = _fair_order(entries)
+                    # Solo compiten por un cupo las primeras peticiones en el orden justo
+                    if ticket in order[: self.slots]:
+                        slot = self._try_slot()
+                    if slot is not None:
+                        entries[:] = [e for e in entries if e["ticket"] != ticket]
+                        break
+                    if time.monotonic() >= deadline:
+                        raise ExecutionQueueFull(
+                            _timing.retry_after(len(entries), self.slots)
+                        )
+                time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+        except BaseException:
+            if slot is None:
+                with self._queue() as entries:
+                    entries[:] = [e for e in entries if e["ticket"] != ticket]
+            raise
+
+        try:
+            yield
+        finally:
+            fcntl.flock(slot, fcntl.LOCK_UN)
+            slot.close()
+
+
+class ThreadLimiter:
+    """Alternativa sin ``fcntl``: limita solo dentro del proceso actual."""
+
+    def __init__(self, slots, queue_size, queue_timeout):
+        self.slots = slots
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(slots)
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def waiting(self):
+        return self._waiting
+
+    @contextmanager
+    def acquire(self, student):
+        with self._lock:
+            if self._waiting >= self.queue_size:
+                raise ExecutionQueueFull(_timing.retry_after(self._waiting, self.slots))
+            self._waiting += 1
+        try:
+            acquired = self._semaphore.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            raise ExecutionQueueFull(_timing.retry_after(self._waiting, self.slots))
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Limitador del nodo según la configuración; ``None`` si está desactivado."""
+    global _limiter
+    if _limiter is None and settings.CODE_EXECUTOR_MAX_CONCURRENT > 0:
+        with _limiter_lock:
+            if _limiter is None:
+                if fcntl is not None:
+                    _limiter = FileLockLimiter(
+                        lock_dir=settings.CODE_EXECUTOR_LOCK_DIR
+                        or os.path.join(
+                            tempfile.gettempdir(), "pystart-executor-locks"
+                        ),
+                        slots=settings.CODE_EXECUTOR_MAX_CONCURRENT,
+                        queue_size=settings.CODE_EXECUTOR_QUEUE_SIZE,
+                        queue_timeout=settings.CODE_EXECUTOR_QUEUE_TIMEOUT,
+                    )
+                else:
+                    _limiter = ThreadLimiter(
+                        slots=settings.CODE_EXECUTOR_MAX_CONCURRENT,
+                        queue_size=settings.CODE_EXECUTOR_QUEUE_SIZE,
+                        queue_timeout=settings.CODE_EXECUTOR_QUEUE_TIMEOUT,
+                    )
+    return _limiter
+
+
+@contextmanager
+def execution_slot(student):
+    """
+    Espera un cupo de ejecución para ``student`` (la clave del cliente, ver
+    ``views._admission_key``).
+
+    Lanza ``ExecutionQueueFull`` si la cola está llena o si la espera supera
+    ``CODE_EXECUTOR_QUEUE_TIMEOUT``.
+    """
+    limiter = get_limiter()
+    if limiter is None:
+        yield
+        return
+    with limiter.acquire(student):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            _timing.record(time.monotonic() - start)
@@ -0,0 +1,156 @@
+"""
+Caché de respuestas del servicio de IA.
+
+La clave es un hash de los mensajes normalizados, el modelo y
+``max_tokens``, así que el mismo análisis pedido por todo un curso solo se
+paga una vez. Hay dos implementaciones:
+
+* ``local``: LRU en memoria de cada proceso (``LRUTTLCache``).
+* ``django``: un alias de ``CACHES`` compartido por todos los procesos
+  (por defecto en disco, ver ``settings.CACHES["ai"]``).
+"""
+
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .result_cache import LRUTTLCache
+
+
+def normalize_messages(messages):
+    # Los espacios al inicio/fin y los saltos de línea de Windows no cambian la respuesta
+    return [
+        {
+            "role": message.get("role", ""),
+            "content": (message.get("content") or "").replace("\r\n", "\n").strip(),
+        }
+        for message in messages
+    ]
+
+
+def ai_cache_key(messages, model, max_tokens):
+    payload = json.dumps(
+        {
+            "messages": normalize_messages(messages),
+            "model": model,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return "ai:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LocalAIResponseCache:
+    # Cada proceso tiene la suya: no sirve para coalescer entre workers
+    shared = False
+
+    def __init__(self, max_entries, ttl, max_bytes):
+        self._cache = LRUTTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value, size=len(value.encode("utf-8")))
+
+    # En memoria no hay E/S: las versiones asíncronas no necesitan otro hilo
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {"backend": "local", **self._cache.stats()}
+
+
+class DjangoAIResponseCache:
+    """Usa un alias de ``CACHES``; los contadores son de este proceso."""
+
+    shared = True
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self._count(self._cache.get(key))
+
+    def set(self, key, value):
+        self._cache.set(key, value, timeout=self.ttl)
+
+    async def aget(self, key):
+        return self._count(await self._cache.aget(key))
+
+    async def aset(self, key, value):
+        await self._cache.aset(key, value, timeout=self.ttl)
+
+    # Sin contar aciertos/fallos: la usan los workers que sondean la
+    # respuesta de otro (ver ai_coalescing.py)
+    def peek(self, key):
+        return self._cache.get(key)
+
+    async def apeek(self, key):
+        return await self._cache.aget(key)
+
+    def _count(self, value):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {
+            "backend": "django",
+            "alias": self.alias,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_ai_cache = None
+_ai_cache_lock = threading.Lock()
+
+
+def get_ai_cache():
+    """Caché configurada en ``AI_CACHE_BACKEND`` o ``None`` si está desactivada."""
+    global _ai_cache
+    if _ai_cache is None and settings.AI_CACHE_BACKEND:
+        with _ai_cache_lock:
+            if _ai_cache is None:
+                if settings.AI_CACHE_BACKEND == "django":
+                    _ai_cache = DjangoAIResponseCache(
+                        alias=settings.AI_CACHE_ALIAS, ttl=settings.AI_CACHE_TTL
+                    )
+                else:
+                    _ai_cache = LocalAIResponseCache(
+                        max_entries=settings.AI_CACHE_SIZE,
+                        ttl=settings.AI_CACHE_TTL,
+                        max_bytes=settings.AI_CACHE_MAX_BYTES,
+                    )
+    return _ai_cache
+
+
+def reset_ai_cache():
+    global _ai_cache
+    with _ai_cache_lock:
+        _ai_cache = None
@@ -0,0 +1,251 @@
+"""
+Coalescencia de prompts idénticos en curso (single-flight).
+
+Cuando todo un curso pulsa "analizar" sobre el mismo ejercicio a la vez,
+solo la primera petición llama al proveedor; las demás con la misma clave
+(``ai_cache_key``) esperan y reciben esa misma respuesta:
+
+* Entre hilos del proceso: ``SingleFlight`` (vistas WSGI) y
+  ``AsyncSingleFlight`` (vistas ASGI, por event loop).
+* Entre workers: la tabla ``BloqueoIA``. El proceso que inserta la clave
+  hace la llamada y los demás sondean la caché compartida de IA hasta que
+  aparece la respuesta, el bloqueo se libera (reintentan ellos) o expira.
+  Solo se usa si la caché de IA es compartida (``AI_CACHE_BACKEND="django"``).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Ejecuta una sola vez cada clave entre los hilos que la piden a la vez."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        """Devuelve ``(resultado, compartido)``; los errores del líder se propagan a todos."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        return {"leaders": self.leaders, "followers": self.followers}
+
+
+class AsyncSingleFlight:
+    """Versión para corrutinas; los futures pertenecen a un event loop, así que hay un registro por loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loops = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.followers = 0
+
+    def _calls(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._loops.setdefault(loop, {})
+
+    async def do(self, key, fn):
+        calls = self._calls()
+        while key in calls:
+            future = calls[key]
+            self.followers += 1
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # Si se canceló el líder (el cliente cerró la conexión) otro
+                # toma su lugar; si nos cancelan a nosotros, se propaga
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        calls[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita el aviso "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            calls.pop(key, None)
+        return result, False
+
+    def stats(self):
+        return {"leaders": self.leaders, "followers": self.followers}
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+
+def _lock_ttl():
+    # Lo máximo que puede durar la llamada del líder
+    return settings.GROQ_CONNECT_TIMEOUT + settings.GROQ_READ_TIMEOUT
+
+
+def _acquire_worker_lock(key):
+    """Inserta la fila de ``key``; devuelve el propietario o ``None`` si otro proceso la tiene."""
+    from .models import BloqueoIA
+
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+    BloqueoIA.objects.filter(clave=key, expira_en__lt=now).delete()
+    try:
+        with transaction.atomic():
+            BloqueoIA.objects.create(
+                clave=key,
+                propietario=owner,
+                expira_en=now + timedelta(seconds=_lock_ttl()),
+            )
+    except IntegrityError:
+        return None
+    return owner
+
+
+def _release_worker_lock(key, owner):
+    from .models import BloqueoIA
+
+    BloqueoIA.objects.filter(clave=key, propietario=owner).delete()
+
+
+def run_once_across_workers(key, cache, fetch):
+    """
+    Llama a ``fetch`` (que guarda la respuesta en ``cache``) solo si este
+    proceso obtiene el bloqueo de ``key``; si no, espera la respuesta del
+    proceso que lo tiene. Devuelve ``(resultado, compartido)``.
+    """
+    deadline = time.monotonic() + _lock_ttl()
+    while True:
+        try:
+            owner = _acquire_worker_lock(key)
+        except DatabaseError as e:
+            logger.warning(f"Tabla de bloqueos de IA no disponible: {e}")
+            return fetch(), False
+
+        if owner is not None:
+            try:
+                # Otro proceso pudo terminar entre la consulta a la caché y el bloqueo
+                cached = cache.peek(key)
+                if cached is not None:
+                    return cached, True
+                return fetch(), False
+            finally:
+                _release_worker_lock(key, owner)
+
+        cached = cache.peek(key)
+        if cached is not None:
+            return cached, True
+        if time.monotonic() >= deadline:
+            return fetch(), False
+        time.sleep(settings.AI_SINGLEFLIGHT_POLL_INTERVAL)
+
+
+async def arun_once_across_workers(key, cache, fetch):
+    """Versión asíncrona de ``run_once_across_workers`` (``fetch`` es una corrutina)."""
+    deadline = time.monotonic() + _lock_ttl()
+    while True:
+        try:
+            owner = await sync_to_async(_acquire_worker_lock)(key)
+        except DatabaseError as e:
+            logger.warning(f"Tabla de bloqueos de IA no disponible: {e}")
+            return await fetch(), False
+
+        if owner is not None:
+            try:
+                cached = await cache.apeek(key)
+                if cached is not None:
+                    return cached, True
+                return await fetch(), False
+            finally:
+                await sync_to_async(_release_worker_lock)(key, owner)
+
+        cached = await cache.apeek(key)
+        if cached is not None:
+            return cached, True
+        if time.monotonic() >= deadline:
+            return await fetch(), False
+        await asyncio.sleep(settings.AI_SINGLEFLIGHT_POLL_INTERVAL)
+
+
+def coalesce(key, fetch, cache=None):
+    """
+    Ejecuta ``fetch`` una vez por clave entre los hilos del proceso y, si
+    ``cache`` es compartida, entre workers. Devuelve ``(resultado, compartido)``.
+    """
+    if not settings.AI_SINGLEFLIGHT:
+        return fetch(), False
+
+    def leader():
+        if cache is not None and cache.shared:
+            return run_once_across_workers(key, cache, fetch)
+        return fetch(), False
+
+    (result, from_other_worker), shared = single_flight.do(key, leader)
+    return result, shared or from_other_worker
+
+
+async def acoalesce(key, fetch, cache=None):
+    """Versión asíncrona de ``coalesce`` (``fetch`` es una función que devuelve una corrutina)."""
+    if not settings.AI_SINGLEFLIGHT:
+        return await fetch(), False
+
+    async def leader():
+        if cache is not None and cache.shared:
+            return await arun_once_across_workers(key, cache, fetch)
+        return await fetch(), False
+
+    (result, from_other_worker), shared = await async_single_flight.do(key, leader)
+    return result, shared or from_other_worker
@@ -0,0 +1,218 @@
+"""
+Compactación del historial de conversación del asistente de IA.
+
+Antes se enviaban los últimos 10 mensajes tal cual y el código completo del
+ejercicio en cada turno. ``HistoryManager`` arma los mensajes dentro de un
+presupuesto de tokens (``AI_PROMPT_TOKEN_BUDGET``):
+
+* Los mensajes más recientes van literalmente mientras quepan.
+* Los anteriores se resumen en un mensaje de sistema que se va desplazando
+  con la conversación (solo las primeras frases de cada turno).
+* Los bloques de código repetidos se sustituyen por una referencia y las
+  versiones parecidas al código actual por un diff.
+* El código del ejercicio se recorta (inicio y final) si es muy largo.
+
+Los tokens son una estimación (unos 4 caracteres por token), suficiente para
+comparar tamaños sin depender del tokenizador del proveedor.
+"""
+
+import difflib
+import logging
+import math
+import re
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CODE_BLOCK_RE = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+# Tokens de formato que el proveedor añade por cada mensaje
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_LINE_CHARS = 160
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+def estimate_message_tokens(messages):
+    return sum(
+        estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def compact_code(code, max_tokens):
+    """Conserva el inicio y el final de ``code`` para que quepa en ``max_tokens``."""
+    if estimate_tokens(code) <= max_tokens:
+        return code
+    lines = code.split("\n")
+    head, tail = [], []
+    budget = max_tokens
+    # Dos tercios del presupuesto para el inicio, el resto para el final
+    for line in lines:
+        cost = estimate_tokens(line + "\n")
+        if cost > budget * 2 / 3 and head:
+            break
+        head.append(line)
+        budget -= cost
+    for line in reversed(lines[len(head) :]):
+        cost = estimate_tokens(line + "\n")
+        if cost > budget:
+            break
+        tail.insert(0, line)
+        budget -= cost
+    omitted = len(lines) - len(head) - len(tail)
+    if omitted <= 0:
+        return code
+    return "\n".join(head + [f"# ... ({omitted} líneas omitidas) ..."] + tail)
+
+
+class HistoryManager:
+    def __init__(
+        self,
+        budget=None,
+        recent_messages=None,
+        summary_tokens=None,
+        code_tokens=None,
+    ):
+        self.budget = budget or settings.AI_PROMPT_TOKEN_BUDGET
+        self.recent_messages = (
+            recent_messages
+            if recent_messages is not None
+            else settings.AI_HISTORY_RECENT_MESSAGES
+        )
+        self.summary_tokens = summary_tokens or settings.AI_HISTORY_SUMMARY_TOKENS
+        self.code_tokens = code_tokens or settings.AI_CONTEXT_CODE_TOKENS
+
+    def build(self, system_prompt, history, current_message, exercise_code=""):
+        """
+        Devuelve ``(mensajes, informe)``. El informe compara los tokens
+        estimados con los del formato anterior (últimos 10 mensajes
+        literales y código completo).
+        """
+        turns = [
+            {
+                "role": "user" if msg.get("sender") == "user" else "assistant",
+                "content": msg.get("content") or "",
+            }
+            for msg in history
+        ]
+        current = {"role": "user", "content": current_message}
+        original_tokens = estimate_message_tokens(
+            [{"role": "system", "content": system_prompt}, *turns[-10:], current]
+        )
+
+        if exercise_code and estimate_tokens(exercise_code) > self.code_tokens:
+            system_prompt = system_prompt.replace(
+                exercise_code, compact_code(exercise_code, self.code_tokens), 1
+            )
+        system = {"role": "system", "content": system_prompt}
+
+        deduplicated = self._deduplicate_code(turns, exercise_code)
+
+        # Mensajes recientes, del más nuevo al más antiguo, mientras quepan
+        remaining = self.budget - estimate_message_tokens([system, current])
+        # Si ya se sabe que habrá resumen se reserva su espacio
+        reserve = self.summary_tokens if len(turns) > self.recent_messages else 0
+        remaining -= reserve
+        kept = []
+        for turn in reversed(turns):
+            cost = estimate_message_tokens([turn])
+            if len(kept) >= self.recent_messages or cost > remaining:
+                break
+            kept.insert(0, turn)
+            remaining -= cost
+        older = turns[: len(turns) - len(kept)]
+
+        messages = [system]
+        summary = self._summarize(
+            older,
+            min(self.summary_tokens, remaining + reserve - MESSAGE_OVERHEAD_TOKENS),
+        )
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        messages.extend(kept)
+        messages.append(current)
+
+        tokens = estimate_message_tokens(messages)
+        report = {
+            "tokens": tokens,
+            "original_tokens": original_tokens,
+            "tokens_saved": max(0, original_tokens - tokens),
+            "summarized_messages": len(older),
+            "deduplicated_code_blocks": deduplicated,
+        }
+        logger.debug(f"Historial de IA compactado: {report}")
+        return messages, report
+
+    def _deduplicate_code(self, turns, exercise_code):
+        """Sustituye en el sitio los bloques de código repetidos; devuelve cuántos cambió."""
+        current_code = (exercise_code or "").strip()
+        seen = set()
+        changed = 0
+
+        def replace(match):
+            nonlocal changed
+            code = match.group(2).strip()
+            if current_code and code == current_code:
+                changed += 1
+                return "[código actual del ejercicio, ver contexto]"
+            if code in seen:
+                changed += 1
+                return "[el mismo código de un mensaje posterior]"
+            seen.add(code)
+            if current_code:
+                diff = "\n".join(
+                    difflib.unified_diff(
+                        current_code.split("\n"),
+                        code.split("\n"),
+                        "actual",
+                        "mensaje",
+                        n=1,
+                        lineterm="",
+                    )
+                )
+                # Solo compensa si el diff es bastante más corto que el bloque
+                if estimate_tokens(diff) * 2 < estimate_tokens(code):
+                    changed += 1
+                    return (
+                        "Cambios respecto al código actual del ejercicio:\n"
+                        f"```diff\n{diff}\n```"
+                    )
+            return match.group(0)
+
+        # Del más nuevo al más antiguo: la copia que se conserva es la
+        # reciente, que es la que tiene más probabilidad de enviarse literal
+        for turn in reversed(turns):
+            turn["content"] = CODE_BLOCK_RE.sub(replace, turn["content"])
+        return changed
+
+    def _summarize(self, turns, max_tokens):
+        """Resumen extractivo de ``turns``; si no cabe, se descartan los más antiguos."""
+        if not turns:
+            return ""
+        lines = []
+        for turn in turns:
+            text = CODE_BLOCK_RE.sub("[código]", turn["content"])
+            text = " ".join(text.split())
+            first = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+            if len(first) > SUMMARY_LINE_CHARS:
+                first = first[: SUMMARY_LINE_CHARS - 3] + "..."
+            speaker = "Estudiante" if turn["role"] == "user" else "Asistente"
+            lines.append(f"- {speaker}: {first}")
+
+        header = f"Resumen de la conversación anterior ({len(turns)} mensajes):"
+        budget = max_tokens - estimate_tokens(header)
+        kept = []
+        for line in reversed(lines):
+            cost = estimate_tokens(line + "\n")
+            if cost > budget:
+                break
+            kept.insert(0, line)
+            budget -= cost
+        if not kept:
+            return ""
+        return "\n".join([header] + kept)
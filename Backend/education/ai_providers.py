@@ -0,0 +1,263 @@
+"""
+Proveedores de IA intercambiables.
+
+``AI_PROVIDER`` elige el backend que usa ``AIService``:
+
+* ``"groq"``: la API de Groq (``GROQ_*``).
+* ``"openai"``: cualquier API compatible con ``/chat/completions`` de OpenAI
+  (``OPENAI_*``), p. ej. OpenAI, un vLLM u Ollama propio.
+* ``"stub"``: respuestas deterministas sin red ni clave (las mismas que
+  ``mock_llm.py``) con una latencia opcional ``AI_STUB_DELAY``. Sirve para
+  medir el rendimiento de las vistas sin depender del proveedor.
+
+Todos exponen ``complete``, ``acomplete`` y ``stream`` con un ``model``
+opcional, de modo que una petición puede ir a un modelo distinto del
+predeterminado (ver ``AI_FAST_MODEL``). ``complete`` y ``acomplete`` devuelven
+``(texto, uso)``, donde ``uso`` son los tokens que informa el proveedor
+(``{"prompt_tokens", "completion_tokens"}``) o ``None``.
+"""
+
+import asyncio
+import json
+import os
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .ai_resilience import get_provider_guard
+from .mock_llm import mock_reply, split_tokens
+
+
+class AIProvider:
+    name = None
+    # Si es falso el servicio funciona sin clave de API
+    requires_api_key = True
+
+    def __init__(self, config):
+        self.config = config
+        self.model = config["model"]
+
+    def complete(self, messages, max_tokens, model=None):
+        """``(texto completo de la respuesta, uso)``."""
+        raise NotImplementedError
+
+    async def acomplete(self, messages, max_tokens, model=None):
+        raise NotImplementedError
+
+    def stream(self, messages, max_tokens, model=None):
+        """Genera los fragmentos de texto a medida que se producen."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OpenAICompatibleProvider(AIProvider):
+    name = "openai"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.api_key = config["api_key"]
+        if not self.api_key:
+            raise Exception(
+                f"{config['api_key_setting']} no está configurada en el archivo .env"
+            )
+        # Cliente con pool de conexiones keep-alive: las peticiones sucesivas
+        # reutilizan la misma conexión TLS
+        self.client = httpx.Client(**self._client_options(config["max_connections"]))
+        # Un cliente asíncrono por event loop (las vistas async y los
+        # benchmarks pueden usar loops distintos); sus conexiones no se
+        # pueden compartir entre loops
+        self._async_clients = weakref.WeakKeyDictionary()
+        # Límite de tasa, circuit breaker y reintentos compartidos entre workers
+        self.guard = get_provider_guard(self.name)
+
+    def _client_options(self, max_connections):
+        return {
+            "base_url": self.config["base_url"],
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+            "timeout": httpx.Timeout(
+                self.config["read_timeout"], connect=self.config["connect_timeout"]
+            ),
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=self.config["keepalive_expiry"],
+            ),
+            # Ignora HTTP_PROXY, HTTPS_PROXY, etc. del entorno, igual que
+            # hacía el antiguo proceso aislado
+            "trust_env": False,
+        }
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                **self._client_options(self.config["async_max_connections"])
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def close(self):
+        self.client.close()
+        # Los clientes asíncronos solo se pueden cerrar desde su loop; al
+        # soltarlos se liberan con el loop
+        self._async_clients.clear()
+
+    def _payload(self, messages, max_tokens, model=None, stream=False):
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def complete(self, messages, max_tokens, model=None):
+        def send():
+            response = self.client.post(
+                "/chat/completions", json=self._payload(messages, max_tokens, model)
+            )
+            response.raise_for_status()
+            return response
+
+        return self._parse(self.guard.call(send))
+
+    async def acomplete(self, messages, max_tokens, model=None):
+        async def send():
+            response = await self._async_client().post(
+                "/chat/completions", json=self._payload(messages, max_tokens, model)
+            )
+            response.raise_for_status()
+            return response
+
+        return self._parse(await self.guard.acall(send))
+
+    def _parse(self, response):
+        data = response.json()
+        usage = data.get("usage") or None
+        if usage is not None:
+            usage = {
+                "prompt_tokens": usage.get("prompt_tokens") or 0,
+                "completion_tokens": usage.get("completion_tokens") or 0,
+            }
+        return data["choices"][0]["message"]["content"], usage
+
+    def stream(self, messages, max_tokens, model=None):
+        # Sin reintentos: una vez enviado el primer token no se puede repetir
+        self.guard.before_call()
+        try:
+            yield from self._read_stream(messages, max_tokens, model)
+        except Exception as e:
+            self.guard.after_call(e)
+            raise
+        self.guard.after_call()
+
+    def _read_stream(self, messages, max_tokens, model):
+        """Lee la respuesta en Server-Sent Events del formato de OpenAI."""
+        with self.client.stream(
+            "POST",
+            "/chat/completions",
+            json=self._payload(messages, max_tokens, model, stream=True),
+        ) as response:
+            if response.is_error:
+                response.read()
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+
+
+class GroqProvider(OpenAICompatibleProvider):
+    """La API de Groq es compatible con la de OpenAI; solo cambia la configuración."""
+
+    name = "groq"
+
+
+class StubProvider(AIProvider):
+    name = "stub"
+    requires_api_key = False
+
+    def complete(self, messages, max_tokens, model=None):
+        if self.config["delay"]:
+            time.sleep(self.config["delay"])
+        return mock_reply(messages), None
+
+    async def acomplete(self, messages, max_tokens, model=None):
+        if self.config["delay"]:
+            await asyncio.sleep(self.config["delay"])
+        return mock_reply(messages), None
+
+    def stream(self, messages, max_tokens, model=None):
+        content, _ = self.complete(messages, max_tokens, model)
+        yield from split_tokens(content)
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (GroqProvider, OpenAICompatibleProvider, StubProvider)
+}
+
+
+def _setting(name, overrides):
+    # ``overrides``: valores de Backend/.env que cambiaron desde el arranque
+    # (ver ``ai_service_isolated.env_file_changes``)
+    value = (overrides or {}).get(name)
+    return getattr(settings, name) if value is None else value
+
+
+def _http_config(prefix, overrides=None):
+    api_key_setting = f"{prefix}_API_KEY"
+    if overrides and api_key_setting in overrides:
+        # Una clave quitada de .env deja al proveedor sin clave
+        api_key = overrides[api_key_setting]
+    else:
+        api_key = getattr(settings, api_key_setting)
+    return {
+        "api_key": api_key,
+        "api_key_setting": api_key_setting,
+        "base_url": _setting(f"{prefix}_BASE_URL", overrides),
+        "model": _setting(f"{prefix}_MODEL", overrides),
+        # Tiempos de espera y conexiones son comunes a los proveedores HTTP
+        "connect_timeout": settings.GROQ_CONNECT_TIMEOUT,
+        "read_timeout": settings.GROQ_READ_TIMEOUT,
+        "max_connections": settings.GROQ_MAX_CONNECTIONS,
+        "keepalive_expiry": settings.GROQ_KEEPALIVE_EXPIRY,
+        "async_max_connections": settings.GROQ_ASYNC_MAX_CONNECTIONS,
+    }
+
+
+def read_provider_config(overrides=None):
+    """Configuración del proveedor elegido en ``AI_PROVIDER``."""
+    name = _setting("AI_PROVIDER", overrides)
+    if name == "groq":
+        config = _http_config("GROQ", overrides)
+    elif name == "openai":
+        config = _http_config("OPENAI", overrides)
+    elif name == "stub":
+        config = {"model": "stub", "delay": settings.AI_STUB_DELAY}
+    else:
+        config = {}
+    return {"provider": name, **config}
+
+
+def create_provider(config):
+    try:
+        provider_class = PROVIDERS[config["provider"]]
+    except KeyError:
+        raise Exception(
+            f"AI_PROVIDER desconocido: {config['provider']!r} "
+            f"(opciones: {', '.join(PROVIDERS)})"
+        )
+    return provider_class(config)
@@ -0,0 +1,325 @@
+"""
+Protección frente a un proveedor de IA lento o que limita peticiones.
+
+``ProviderGuard`` envuelve cada llamada al proveedor con:
+
+* Una cubeta de tokens (algoritmo GCRA) ajustada a la cuota del proveedor
+  (``AI_RATE_LIMIT_PER_MINUTE`` y ``AI_RATE_LIMIT_BURST``). Si no hay
+  token en ``AI_RATE_LIMIT_MAX_WAIT`` segundos la petición falla al momento.
+* Un circuit breaker: tras ``AI_BREAKER_FAILURE_THRESHOLD`` llamadas
+  fallidas seguidas deja de llamar al proveedor durante
+  ``AI_BREAKER_RESET_TIMEOUT`` segundos; después una sola petición de
+  prueba decide si se cierra o vuelve a abrirse.
+* Reintentos acotados (``AI_MAX_RETRIES``) con espera exponencial y
+  jitter completo, solo para errores transitorios (red, 429 y 5xx).
+
+El estado de la cubeta y del breaker vive en el alias
+``AI_RESILIENCE_CACHE_ALIAS`` de ``CACHES``, así que lo comparten todos los
+workers. Las actualizaciones se serializan con un bloqueo basado en
+``cache.add``; con backends sin ``add`` atómico (p. ej. en disco) el
+bloqueo es aproximado, suficiente para limitar la tasa. En la versión
+asíncrona (``acall``) ese acceso a la caché se hace en un hilo aparte.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """El guard rechazó la llamada sin contactar al proveedor."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"{reason} (reintentar en {retry_after:.1f} s)")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _in_thread(fn):
+    # Hilos del executor por defecto: las llamadas de distintas peticiones no
+    # se serializan en el hilo principal
+    return sync_to_async(fn, thread_sensitive=False)
+
+
+def is_retryable(error):
+    """Errores que indican un proveedor saturado o caído (no de la petición)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _retry_after_header(error):
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    try:
+        return float(error.response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class ProviderGuard:
+    def __init__(self, name):
+        self.name = name
+        self._stats_lock = threading.Lock()
+        # Contadores de este proceso
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected_rate_limited": 0,
+            "rejected_circuit_open": 0,
+        }
+
+    @property
+    def _cache(self):
+        return caches[settings.AI_RESILIENCE_CACHE_ALIAS]
+
+    def _key(self, suffix):
+        return f"ai:{self.name}:{suffix}"
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    @contextmanager
+    def _locked(self, key):
+        cache = self._cache
+        lock_key = key + ":lock"
+        deadline = time.monotonic() + 1
+        acquired = cache.add(lock_key, 1, timeout=5)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.005)
+            acquired = cache.add(lock_key, 1, timeout=5)
+        try:
+            yield cache
+        finally:
+            if acquired:
+                cache.delete(lock_key)
+
+    # Cubeta de tokens
+
+    def _rate(self):
+        per_minute = settings.AI_RATE_LIMIT_PER_MINUTE
+        if per_minute <= 0:
+            return None, None
+        return 60 / per_minute, max(1, settings.AI_RATE_LIMIT_BURST)
+
+    def _take_token(self):
+        """0 si se obtuvo un token; si no, segundos hasta el siguiente."""
+        interval, burst = self._rate()
+        if interval is None:
+            return 0
+        key = self._key("bucket")
+        with self._locked(key) as cache:
+            now = time.time()
+            # Instante teórico en que la cubeta vuelve a estar llena
+            full_at = max(cache.get(key) or now, now)
+            wait = full_at - now - (burst - 1) * interval
+            if wait > 0:
+                return wait
+            cache.set(key, full_at + interval, timeout=int(burst * interval) + 60)
+            return 0
+
+    def _wait_for_token(self):
+        """Genera las esperas hasta obtener un token; lanza ``ProviderUnavailable`` si superan el máximo."""
+        deadline = time.monotonic() + settings.AI_RATE_LIMIT_MAX_WAIT
+        while True:
+            wait = self._take_token()
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                self._count("rejected_rate_limited")
+                raise ProviderUnavailable("rate_limited", wait)
+            yield wait
+
+    # Circuit breaker
+
+    def _breaker(self):
+        return self._cache.get(self._key("breaker")) or {
+            "state": CLOSED,
+            "failures": 0,
+            "opened_at": None,
+        }
+
+    def _check_circuit(self):
+        state = self._breaker()
+        if state["state"] == CLOSED:
+            return
+        elapsed = time.time() - state["opened_at"]
+        reset_timeout = settings.AI_BREAKER_RESET_TIMEOUT
+        # Pasado el tiempo de espera solo un worker hace la petición de prueba
+        if elapsed >= reset_timeout and self._cache.add(
+            self._key("probe"), 1, timeout=max(1, int(reset_timeout))
+        ):
+            with self._locked(self._key("breaker")) as cache:
+                cache.set(self._key("breaker"), {**state, "state": HALF_OPEN}, None)
+            return
+        self._count("rejected_circuit_open")
+        raise ProviderUnavailable("circuit_open", max(0.0, reset_timeout - elapsed))
+
+    def _record_success(self):
+        state = self._breaker()
+        if state["state"] == CLOSED and not state["failures"]:
+            return
+        with self._locked(self._key("breaker")) as cache:
+            cache.set(
+                self._key("breaker"),
+                {"state": CLOSED, "failures": 0, "opened_at": None},
+                None,
+            )
+            cache.delete(self._key("probe"))
+
+    def _record_failure(self):
+        self._count("failures")
+        with self._locked(self._key("breaker")) as cache:
+            state = self._breaker()
+            failures = state["failures"] + 1
+            if (
+                state["state"] == HALF_OPEN
+                or failures >= settings.AI_BREAKER_FAILURE_THRESHOLD
+            ):
+                state = {"state": OPEN, "failures": failures, "opened_at": time.time()}
+            else:
+                state = {**state, "failures": failures}
+            cache.set(self._key("breaker"), state, None)
+            cache.delete(self._key("probe"))
+
+    # Llamadas
+
+    def _retry_delay(self, attempt, error):
+        """Segundos antes del reintento ``attempt`` o ``None`` si no conviene reintentar."""
+        if attempt >= settings.AI_MAX_RETRIES or not is_retryable(error):
+            return None
+        max_delay = settings.AI_RETRY_MAX_DELAY
+        retry_after = _retry_after_header(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= max_delay else None
+        # Jitter completo: evita que todos los workers reintenten a la vez
+        return random.uniform(
+            0, min(max_delay, settings.AI_RETRY_BASE_DELAY * 2**attempt)
+        )
+
+    def before_call(self):
+        """Comprueba breaker y cubeta; lanza ``ProviderUnavailable`` si no se debe llamar."""
+        self._check_circuit()
+        for wait in self._wait_for_token():
+            time.sleep(wait)
+
+    async def abefore_call(self):
+        """
+        Versión asíncrona de ``before_call``. El breaker y la cubeta leen y
+        escriben la caché compartida (y esperan su bloqueo), así que se
+        consultan en un hilo para no detener el event loop.
+        """
+        await _in_thread(self._check_circuit)()
+        waits = self._wait_for_token()
+        while True:
+            wait = await _in_thread(next)(waits, None)
+            if wait is None:
+                return
+            await asyncio.sleep(wait)
+
+    def after_call(self, error=None):
+        if error is None:
+            self._record_success()
+        elif is_retryable(error):
+            self._record_failure()
+
+    async def aafter_call(self, error=None):
+        await _in_thread(self.after_call)(error)
+
+    def call(self, fn):
+        """Ejecuta ``fn()`` con límite de tasa, breaker y reintentos."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self.before_call()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self.after_call(e)
+                    raise
+                self._count("retries")
+                attempt += 1
+                time.sleep(delay)
+            else:
+                self.after_call()
+                return result
+
+    async def acall(self, fn):
+        """Versión asíncrona de ``call``; ``fn`` devuelve una corrutina."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            await self.abefore_call()
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    await self.aafter_call(e)
+                    raise
+                self._count("retries")
+                attempt += 1
+                await asyncio.sleep(delay)
+            else:
+                await self.aafter_call()
+                return result
+
+    def metrics(self):
+        breaker = self._breaker()
+        interval, burst = self._rate()
+        bucket = None
+        if interval is not None:
+            full_at = self._cache.get(self._key("bucket")) or 0
+            used = max(0.0, full_at - time.time()) / interval
+            bucket = {
+                "per_minute": settings.AI_RATE_LIMIT_PER_MINUTE,
+                "burst": burst,
+                "available": max(0, int(burst - used)),
+            }
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            "provider": self.name,
+            "circuit": {
+                **breaker,
+                "failure_threshold": settings.AI_BREAKER_FAILURE_THRESHOLD,
+                "reset_timeout": settings.AI_BREAKER_RESET_TIMEOUT,
+            },
+            "rate_limit": bucket,
+            "process": stats,
+        }
+
+    def reset(self):
+        cache = self._cache
+        for suffix in ("bucket", "breaker", "probe"):
+            cache.delete(self._key(suffix))
+        with self._stats_lock:
+            for stat in self.stats:
+                self.stats[stat] = 0
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_provider_guard(name):
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ProviderGuard(name)
+        return _guards[name]
@@ -1,218 +1,494 @@
-import os
 import logging
-import ast
-import re
-import subprocess
-import json
-import tempfile
-import sys
+import os
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from django.core import checks
+
+from .ai_cache import ai_cache_key, get_ai_cache
+from .ai_history import estimate_message_tokens, estimate_tokens
+from .ai_usage import arecord_ai_usage, record_ai_usage
+from .code_analysis import analyze_python_code
+from .ai_providers import PROVIDERS, create_provider, read_provider_config
+from .ai_resilience import ProviderUnavailable
+from .ai_coalescing import acoalesce, async_single_flight, coalesce, single_flight
+from .models import UsoIA
 
 logger = logging.getLogger(__name__)
 
+AI_ERROR_MESSAGE = (
+    "Lo siento, no pude procesar tu pregunta en este momento. Inténtalo de nuevo."
+)
+AI_BUSY_MESSAGE = (
+    "El asistente está recibiendo demasiadas consultas en este momento. "
+    "Inténtalo de nuevo en unos segundos."
+)
+
+
+# Variables que se pueden cambiar en Backend/.env sin reiniciar el proceso;
+# el resto de la configuración de IA se fija al arrancar
+RELOADABLE_ENV = (
+    "AI_PROVIDER",
+    "AI_FAST_MODEL",
+    "GROQ_API_KEY",
+    "GROQ_BASE_URL",
+    "GROQ_MODEL",
+    "OPENAI_API_KEY",
+    "OPENAI_BASE_URL",
+    "OPENAI_MODEL",
+)
+
+
+def read_env_file(path):
+    """Variables de un archivo .env (mismo formato que ``load_env`` de settings)."""
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if "=" in line and not line.strip().startswith("#"):
+                    key, value = line.strip().split("=", 1)
+                    values[key] = value
+    except OSError:
+        pass
+    return values
+
+
+# Contenido de cada archivo .env al arrancar el proceso
+_startup_env_files = {}
+
+
+def _startup_env_file(path):
+    if path not in _startup_env_files:
+        _startup_env_files[path] = read_env_file(path)
+    return _startup_env_files[path]
+
+
+def env_file_changes():
+    """
+    Variables de ``RELOADABLE_ENV`` cuyo valor en ``ENV_FILE`` cambió desde
+    el arranque (``None`` si se quitaron del archivo). Igual que al arrancar,
+    las definidas en el entorno real del proceso tienen prioridad sobre el
+    archivo.
+    """
+    path = settings.ENV_FILE
+    if not path:
+        return {}
+    startup = _startup_env_file(path)
+    current = read_env_file(path)
+    changes = {}
+    for name in RELOADABLE_ENV:
+        if current.get(name) == startup.get(name):
+            continue
+        process_value = os.environ.get(name)
+        if process_value is not None and process_value != startup.get(name):
+            continue
+        changes[name] = current.get(name)
+    return changes
+
+
+def read_ai_config(overrides=None):
+    """
+    Configuración actual del servicio de IA (variables de entorno y
+    settings), con ``overrides`` (ver ``env_file_changes``) por encima.
+    """
+    fast_model = (overrides or {}).get("AI_FAST_MODEL")
+    return {
+        **read_provider_config(overrides),
+        # Modelo para las tareas sencillas (AI_FAST_MODEL_TASKS); vacío = el mismo
+        "fast_model": settings.AI_FAST_MODEL if fast_model is None else fast_model,
+        "fast_model_tasks": tuple(settings.AI_FAST_MODEL_TASKS),
+    }
+
+
+def _estimate_usage(messages, content):
+    """Tokens estimados cuando el proveedor no los informa."""
+    return {
+        "prompt_tokens": estimate_message_tokens(messages),
+        "completion_tokens": estimate_tokens(content),
+    }
+
 
 class AIService:
-    def __init__(self):
-        self.api_key = os.getenv("GROQ_API_KEY")
-        if not self.api_key:
-            raise Exception("GROQ_API_KEY no está configurada en el archivo .env")
+    def __init__(self, config=None):
+        self.config = config or read_ai_config()
+        self.provider = create_provider(self.config)
+        self.model = self.provider.model
+        self.fast_model = self.config["fast_model"] or self.model
+        self.last_success = None
+        self.last_error = None
+        self.consecutive_failures = 0
 
-        self.model = "llama3-8b-8192"
+    def close(self):
+        self.provider.close()
 
-    def _execute_groq_request(self, messages, max_tokens=1000):
-        """Ejecuta una petición a Groq en un proceso aislado"""
-        try:
-            # Crear script temporal para ejecutar Groq
-            script_content = f"""
-import os
-import sys
-import json
-
-# Limpiar todas las variables de proxy
-proxy_vars = ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'NO_PROXY', 'no_proxy', 'ALL_PROXY', 'all_proxy']
-for var in proxy_vars:
-    if var in os.environ:
-        del os.environ[var]
-
-try:
-    from groq import Groq
-    
-    client = Groq(api_key="{self.api_key}")
-    
-    messages = {json.dumps(messages)}
-    
-    response = client.chat.completions.create(
-        model="{self.model}",
-        messages=messages,
-        max_tokens={max_tokens},
-        temperature=0.7,
-    )
-    
-    result = response.choices[0].message.content
-    print("SUCCESS:" + result)
-    
-except Exception as e:
-    print("ERROR:" + str(e))
-"""
-
-            with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
-                f.write(script_content)
-                temp_script = f.name
-
-            try:
-                # Ejecutar en proceso completamente aislado
-                env = os.environ.copy()
-                # Limpiar variables de proxy del entorno
-                proxy_vars = [
-                    "HTTP_PROXY",
-                    "HTTPS_PROXY",
-                    "http_proxy",
-                    "https_proxy",
-                    "NO_PROXY",
-                    "no_proxy",
-                ]
-                for var in proxy_vars:
-                    env.pop(var, None)
-
-                result = subprocess.run(
-                    [sys.executable, temp_script],
-                    capture_output=True,
-                    text=True,
-                    env=env,
-                    timeout=30,
-                )
+    def model_for(self, task):
+        """Modelo que atiende ``task`` (p. ej. el tipo de análisis de código)."""
+        if task in self.config["fast_model_tasks"]:
+            return self.fast_model
+        return self.model
 
-                if result.stdout.startswith("SUCCESS:"):
-                    return result.stdout[8:]  # Quitar "SUCCESS:"
-                else:
-                    logger.error(
-                        f"Error en proceso aislado: {result.stdout} {result.stderr}"
-                    )
-                    return "Lo siento, no pude procesar tu pregunta en este momento. Inténtalo de nuevo."
-
-            finally:
-                # Limpiar archivo temporal
-                try:
-                    os.unlink(temp_script)
-                except:
-                    pass
+    def _record(self, error=None):
+        if error is None:
+            self.last_success = time.time()
+            self.consecutive_failures = 0
+        else:
+            self.last_error = {"message": error, "at": time.time()}
+            self.consecutive_failures += 1
 
-        except Exception as e:
-            logger.error(f"Error ejecutando Groq aislado: {e}")
-            return "Lo siento, no pude procesar tu pregunta en este momento. Inténtalo de nuevo."
+    def _failure(self, error):
+        if isinstance(error, ProviderUnavailable):
+            # Rechazo inmediato: el proveedor no llegó a recibir la petición
+            logger.warning(f"Llamada a {self.provider.name} rechazada: {error}")
+            self._record(error.reason)
+            return self._error_result(AI_BUSY_MESSAGE, UsoIA.RECHAZADA)
+        if isinstance(error, httpx.HTTPStatusError):
+            logger.error(
+                f"{self.provider.name} respondió {error.response.status_code}: "
+                f"{error.response.text[:500]}"
+            )
+            self._record(f"HTTP {error.response.status_code}")
+        else:
+            logger.error(f"Error en la API de {self.provider.name}: {error}")
+            self._record(str(error))
+        return self._error_result(AI_ERROR_MESSAGE)
+
+    def _error_result(self, content, outcome=UsoIA.ERROR):
+        return {
+            "content": content,
+            "success": False,
+            "cached": False,
+            "coalesced": False,
+            "provider": self.provider.name,
+            "outcome": outcome,
+        }
 
     def analyze_python_code(self, code):
-        """Analiza código Python para detectar errores"""
-        errors = []
-        warnings = []
+        """Analiza código Python para detectar errores (ver ``code_analysis.py``)"""
+        return analyze_python_code(code)
+
+    def complete(
+        self, messages, max_tokens=1000, use_cache=True, model=None, usage_context=None
+    ):
+        """
+        Obtiene respuesta del proveedor de IA (``AI_PROVIDER``) con ``model``
+        o, si no se indica, el modelo predeterminado.
+
+        Devuelve ``{"content", "success", "cached", "coalesced", "provider",
+        "outcome"}``. Las respuestas exitosas se guardan en la caché de IA (ver
+        ``ai_cache.py``) salvo que ``use_cache`` sea falso. Las peticiones
+        idénticas en curso comparten una sola llamada al proveedor (ver
+        ``ai_coalescing.py``). Cada llamada se mide en ``UsoIA`` junto con
+        ``usage_context`` (endpoint, curso, sección y estudiante).
+        """
+        start = time.perf_counter()
+        model = model or self.model
+        usage = {}
+        result = self._complete(messages, max_tokens, use_cache, model, usage)
+        record_ai_usage(**self._usage(result, model, usage, start, usage_context))
+        return result
+
+    def _complete(self, messages, max_tokens, use_cache, model, usage):
+        cache = get_ai_cache() if use_cache else None
+        cache_key = ai_cache_key(messages, model, max_tokens)
+        if cache is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return self._result(cached, cached=True)
+
+        def fetch():
+            content, reported = self.provider.complete(messages, max_tokens, model)
+            usage.update(reported or _estimate_usage(messages, content))
+            self._succeeded()
+            if cache is not None:
+                cache.set(cache_key, content)
+            return content
 
-        # Verificar sintaxis con AST
         try:
-            ast.parse(code)
-        except SyntaxError as e:
-            errors.append(
-                {
-                    "type": "SyntaxError",
-                    "message": f"Error de sintaxis: {str(e)}",
-                    "line": e.lineno,
-                    "column": e.offset,
-                }
+            content, coalesced = coalesce(cache_key, fetch, cache)
+        except Exception as e:
+            return self._failure(e)
+        return self._result(content, coalesced=coalesced)
+
+    async def acomplete(
+        self, messages, max_tokens=1000, use_cache=True, model=None, usage_context=None
+    ):
+        """Versión asíncrona de ``complete`` para las vistas ASGI."""
+        start = time.perf_counter()
+        model = model or self.model
+        usage = {}
+        result = await self._acomplete(messages, max_tokens, use_cache, model, usage)
+        await arecord_ai_usage(
+            **self._usage(result, model, usage, start, usage_context)
+        )
+        return result
+
+    async def _acomplete(self, messages, max_tokens, use_cache, model, usage):
+        cache = get_ai_cache() if use_cache else None
+        cache_key = ai_cache_key(messages, model, max_tokens)
+        if cache is not None:
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                return self._result(cached, cached=True)
+
+        async def fetch():
+            content, reported = await self.provider.acomplete(
+                messages, max_tokens, model
             )
+            usage.update(reported or _estimate_usage(messages, content))
+            self._succeeded()
+            if cache is not None:
+                await cache.aset(cache_key, content)
+            return content
 
-        # Análisis básico de variables
-        lines = code.split("\n")
-        defined_variables = set()
-
-        for i, line in enumerate(lines, 1):
-            line_stripped = line.strip()
-
-            # Detectar asignaciones de variables
-            if "=" in line_stripped and not line_stripped.startswith("#"):
-                var_match = re.match(r"\s*(\w+)\s*=", line_stripped)
-                if var_match:
-                    defined_variables.add(var_match.group(1))
-
-            # Detectar uso de variables no definidas
-            if line_stripped and not line_stripped.startswith("#"):
-                code_part = line_stripped.split("#")[0].strip()
-                if code_part:
-                    words = re.findall(r"\b([a-zA-Z_]\w*)\b", code_part)
-
-                    assignment_vars = set()
-                    if "=" in code_part and not any(
-                        op in code_part for op in ["==", "!=", "<=", ">="]
-                    ):
-                        left_side = code_part.split("=")[0]
-                        assignment_vars.update(
-                            re.findall(r"\b([a-zA-Z_]\w*)\b", left_side)
-                        )
-
-                    for word in words:
-                        if (
-                            word
-                            not in [
-                                "self",
-                                "True",
-                                "False",
-                                "None",
-                                "print",
-                                "len",
-                                "str",
-                                "int",
-                                "float",
-                                "list",
-                                "dict",
-                                "range",
-                                "def",
-                                "if",
-                                "else",
-                                "elif",
-                                "for",
-                                "while",
-                                "return",
-                                "import",
-                                "from",
-                                "class",
-                                "append",
-                                "items",
-                            ]
-                            and word not in defined_variables
-                            and word not in assignment_vars
-                            and not word.isdigit()
-                        ):
-
-                            warnings.append(
-                                {
-                                    "type": "NameError",
-                                    "message": f"Variable '{word}' no está definida",
-                                    "line": i,
-                                    "suggestion": "Verifica que la variable esté definida correctamente.",
-                                }
-                            )
+        try:
+            content, coalesced = await acoalesce(cache_key, fetch, cache)
+        except Exception as e:
+            return self._failure(e)
+        return self._result(content, coalesced=coalesced)
 
+    def _succeeded(self):
+        self._record()
+        logger.info(f"Respuesta de {self.provider.name} recibida exitosamente")
+
+    def _result(self, content, cached=False, coalesced=False):
         return {
-            "errors": errors,
-            "warnings": warnings,
-            "has_issues": len(errors) > 0 or len(warnings) > 0,
-            "defined_variables": list(defined_variables),
+            "content": content,
+            "success": True,
+            "cached": cached,
+            "coalesced": coalesced,
+            "provider": self.provider.name,
+            "outcome": UsoIA.EXITO,
         }
 
-    def get_ai_response(self, messages, max_tokens=1000):
-        """Obtiene respuesta de IA usando Groq en proceso aislado"""
+    def _usage(self, result, model, usage, start, usage_context):
+        """Campos de ``UsoIA`` de una llamada que empezó en ``start``."""
+        # Solo la petición que llamó al proveedor gasta tokens; las respuestas
+        # de caché o compartidas quedan con 0
+        return {
+            "endpoint": "",
+            **(usage_context or {}),
+            "proveedor": self.provider.name,
+            "modelo": model,
+            "tokens_prompt": usage.get("prompt_tokens", 0),
+            "tokens_respuesta": usage.get("completion_tokens", 0),
+            "latencia_ms": round((time.perf_counter() - start) * 1000),
+            "desde_cache": result["cached"],
+            "compartida": result["coalesced"],
+            "resultado": result["outcome"],
+        }
+
+    def get_ai_response(self, messages, max_tokens=1000, use_cache=True):
+        """Obtiene respuesta del proveedor de IA"""
+        return self.complete(messages, max_tokens, use_cache)["content"]
+
+    def stream(
+        self, messages, max_tokens=1000, use_cache=True, model=None, usage_context=None
+    ):
+        """
+        Versión incremental de ``complete``.
+
+        Genera ``{"event": "token", "content"}`` por cada fragmento y termina
+        con ``{"event": "done", "success", "cached"}``. Si falla a mitad de la
+        respuesta se envía el mensaje de error como último token. Los tokens
+        medidos son estimados: el proveedor no los informa al hacer streaming.
+        """
+        start = time.perf_counter()
+        model = model or self.model
+        usage = {}
+        cache = get_ai_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = ai_cache_key(messages, model, max_tokens)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                result = self._result(cached, cached=True)
+                record_ai_usage(
+                    **self._usage(result, model, usage, start, usage_context)
+                )
+                yield {"event": "token", "content": cached}
+                yield {"event": "done", "success": True, "cached": True}
+                return
+
+        parts = []
         try:
-            result = self._execute_groq_request(messages, max_tokens)
-            if "Lo siento" not in result:
-                logger.info("Respuesta de Groq recibida exitosamente")
-            return result
+            for token in self.provider.stream(messages, max_tokens, model):
+                parts.append(token)
+                yield {"event": "token", "content": token}
+        except Exception as e:
+            # Registra el fallo y elige el mensaje (error o proveedor saturado)
+            result = self._failure(e)
+        else:
+            self._record()
+            content = "".join(parts)
+            if cache_key is not None:
+                cache.set(cache_key, content)
+            usage.update(_estimate_usage(messages, content))
+            result = self._result(content)
+        record_ai_usage(**self._usage(result, model, usage, start, usage_context))
+        if result["success"]:
+            yield {"event": "done", "success": True, "cached": False}
+            return
+
+        prefix = "\n\n" if parts else ""
+        yield {"event": "token", "content": prefix + result["content"]}
+        yield {"event": "done", "success": False, "cached": False}
+
+    def iter_ai_response(self, messages, max_tokens=1000, use_cache=True):
+        """Igual que ``get_ai_response`` pero como iterador de fragmentos de texto."""
+        for event in self.stream(messages, max_tokens, use_cache):
+            if event["event"] == "token":
+                yield event["content"]
+
+
+class AIServiceRegistry:
+    """
+    Instancia única de ``AIService`` por proceso.
+
+    Se crea en el primer uso, se comparte entre hilos y vuelve a leer la
+    configuración como máximo cada ``AI_CONFIG_RELOAD_INTERVAL`` segundos,
+    incluido ``Backend/.env`` (proveedor, modelos, URL y claves; ver
+    ``RELOADABLE_ENV``): solo se reconstruye si la configuración cambió. Un fallo de
+    inicialización (p. ej. sin la clave del proveedor) también se guarda, así que no se
+    reintenta en cada petición.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._service = None
+        self._config = None
+        self._error = None
+        self._checked_at = None
+        self._retired = []
+
+    def _needs_check(self):
+        if self._checked_at is None:
+            return True
+        return time.monotonic() - self._checked_at >= settings.AI_CONFIG_RELOAD_INTERVAL
+
+    def get(self):
+        """Devuelve el servicio o ``None`` si no está disponible."""
+        if not self._needs_check():
+            return self._service
+        with self._lock:
+            if self._needs_check():
+                self._reload()
+            return self._service
+
+    def _reload(self):
+        config = read_ai_config(env_file_changes())
+        if config == self._config:
+            self._checked_at = time.monotonic()
+            return
 
+        try:
+            service = AIService(config)
         except Exception as e:
-            logger.error(f"Error en Groq API: {e}")
-            return "Lo siento, no pude procesar tu pregunta en este momento. Inténtalo de nuevo."
+            logger.error(f"Error inicializando AI Service: {e}")
+            service = None
+            self._error = str(e)
+        else:
+            self._error = None
+            if self._config is not None:
+                logger.info("Configuración de IA actualizada; se recrea el servicio")
+
+        # El cliente anterior puede tener peticiones en curso: se cierra en la
+        # siguiente recarga en lugar de inmediatamente
+        for retired in self._retired:
+            retired.close()
+        self._retired = [self._service] if self._service is not None else []
+        self._service = service
+        self._config = config
+        # Se marca al final: los demás hilos no deben ver el servicio a medio crear
+        self._checked_at = time.monotonic()
+
+    def reset(self):
+        """Cierra el servicio actual; el siguiente ``get`` lo vuelve a crear."""
+        with self._lock:
+            for service in self._retired + [self._service]:
+                if service is not None:
+                    service.close()
+            self._service = None
+            self._config = None
+            self._error = None
+            self._checked_at = None
+            self._retired = []
+
+    def health(self):
+        service = self.get()
+        if service is None:
+            return {"status": "unavailable", "error": self._error}
+        cache = get_ai_cache()
+        return {
+            "cache": cache.stats() if cache is not None else None,
+            # Llamadas al proveedor (líderes) y peticiones que esperaron a otra
+            "coalescing": {
+                "threads": single_flight.stats(),
+                "async": async_single_flight.stats(),
+            },
+            "status": "degraded" if service.consecutive_failures else "ok",
+            "provider": service.provider.name,
+            "model": service.model,
+            "fast_model": service.fast_model,
+            "last_success": service.last_success,
+            "last_error": service.last_error,
+            "consecutive_failures": service.consecutive_failures,
+        }
+
+
+ai_service_registry = AIServiceRegistry()
 
 
-# Función para obtener instancia del servicio
 def get_ai_service():
-    try:
-        return AIService()
-    except Exception as e:
-        logger.error(f"Error inicializando AI Service: {e}")
+    """Servicio de IA compartido por el proceso, o ``None`` si no está configurado."""
+    return ai_service_registry.get()
+
+
+def _missing_api_key(config):
+    # Proveedor HTTP elegido sin su clave; ``None`` si no aplica
+    provider_class = PROVIDERS.get(config["provider"])
+    if provider_class is None or not provider_class.requires_api_key:
+        return None
+    if config["api_key"]:
         return None
+    return {
+        "msg": f"{config['api_key_setting']} no está configurada para AI_PROVIDER={config['provider']!r}.",
+        "hint": "Defínela en el entorno o en Backend/.env, o usa AI_PROVIDER=stub para trabajar sin proveedor.",
+    }
+
+
+@checks.register(checks.Tags.compatibility)
+def check_ai_configuration(app_configs, **kwargs):
+    """
+    Avisa si el proveedor no existe o le falta la clave. Sin clave el resto
+    de la aplicación (migraciones, pruebas...) funciona; el asistente
+    responde que el servicio no está disponible.
+    """
+    config = read_ai_config()
+    if config["provider"] not in PROVIDERS:
+        return [
+            checks.Error(
+                f"AI_PROVIDER desconocido: {config['provider']!r}.",
+                hint=f"Opciones: {', '.join(PROVIDERS)}.",
+                id="education.E001",
+            )
+        ]
+    missing = _missing_api_key(config)
+    if missing is None:
+        return []
+    return [checks.Warning(**missing, id="education.W002")]
+
+
+@checks.register(checks.Tags.security, deploy=True)
+def check_ai_configuration_deploy(app_configs, **kwargs):
+    """En producción (``check --deploy``) la falta de clave es un error."""
+    missing = _missing_api_key(read_ai_config())
+    if missing is None:
+        return []
+    return [checks.Error(**missing, id="education.E002")]
+
+
+# Referencia para detectar los cambios de .env (ver env_file_changes)
+if getattr(settings, "ENV_FILE", None):
+    _startup_env_file(settings.ENV_FILE)
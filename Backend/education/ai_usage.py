@@ -0,0 +1,78 @@
+"""
+Medición del uso de los endpoints de IA.
+
+``AIService`` registra cada llamada (modelo, tokens, latencia, acierto de
+caché y resultado) con ``record_ai_usage``. Los registros se acumulan en
+memoria y se insertan en ``UsoIA`` con un solo ``bulk_create`` cada
+``AI_USAGE_BUFFER_SIZE`` registros o ``AI_USAGE_FLUSH_INTERVAL`` segundos, así
+que medir no añade una escritura por petición. Si el proceso termina se
+vuelca lo pendiente; si la base de datos falla el lote se descarta con un
+aviso (la medición nunca rompe una respuesta).
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UsageBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = []
+        self._flushed_at = time.monotonic()
+        self.dropped = 0
+
+    def add(self, record):
+        """Añade ``record``; devuelve si ya toca volcar el búfer."""
+        with self._lock:
+            self._records.append(record)
+            return (
+                len(self._records) >= settings.AI_USAGE_BUFFER_SIZE
+                or time.monotonic() - self._flushed_at
+                >= settings.AI_USAGE_FLUSH_INTERVAL
+            )
+
+    def flush(self):
+        """Inserta los registros pendientes; devuelve cuántos se guardaron."""
+        from .models import UsoIA
+
+        with self._lock:
+            records, self._records = self._records, []
+            self._flushed_at = time.monotonic()
+        if not records:
+            return 0
+        try:
+            UsoIA.objects.bulk_create([UsoIA(**record) for record in records])
+        except Exception as e:
+            self.dropped += len(records)
+            logger.warning(f"No se pudieron guardar {len(records)} usos de IA: {e}")
+            return 0
+        return len(records)
+
+    def pending(self):
+        with self._lock:
+            return len(self._records)
+
+
+usage_buffer = UsageBuffer()
+
+
+atexit.register(usage_buffer.flush)
+
+
+def record_ai_usage(**record):
+    """Registra una llamada; ``record`` son campos de ``UsoIA``."""
+    if settings.AI_USAGE_ENABLED and usage_buffer.add(record):
+        usage_buffer.flush()
+
+
+async def arecord_ai_usage(**record):
+    """Versión para las vistas ASGI: el volcado se hace fuera del event loop."""
+    if settings.AI_USAGE_ENABLED and usage_buffer.add(record):
+        await sync_to_async(usage_buffer.flush)()
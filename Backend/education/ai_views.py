@@ -1,76 +1,184 @@
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.http import JsonResponse
+from django.views import View
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+import json
 import logging
-from .ai_service_isolated import get_ai_service
+import time
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from .ai_history import HistoryManager
+from .ai_resilience import get_provider_guard
+from .ai_service_isolated import ai_service_registry, get_ai_service
+from .ai_usage import record_ai_usage, usage_buffer
+from .models import UsoIA
+from .section_analysis import precomputed_answer
+from .sse import sse_response
 
 logger = logging.getLogger(__name__)
 
 
-class AIAssistantView(APIView):
+def _use_cache(data):
+    value = data.get("useCache", True)
+    if isinstance(value, str):
+        return value.lower() not in ("false", "0", "no")
+    return bool(value)
 
-    def post(self, request, *args, **kwargs):
+
+# Campos de UsoIA -> claves del cuerpo (o de "context") que los identifican
+USAGE_IDS = {
+    "curso_id": "courseId",
+    "seccion_id": "sectionId",
+    "estudiante_id": "studentId",
+}
+
+
+def _usage_context(request, data):
+    """Endpoint e ids opcionales de curso, sección y estudiante para la medición de uso."""
+    context = data.get("context")
+    sources = [data, context] if isinstance(context, dict) else [data]
+    usage_context = {"endpoint": request.resolver_match.url_name}
+    for field, key in USAGE_IDS.items():
+        value = next((s[key] for s in sources if s.get(key) is not None), None)
         try:
-            # Obtener datos de la request
-            user_message = request.data.get("message", "")
-            context = request.data.get("context", {})
-            conversation_history = request.data.get("conversationHistory", [])
-
-            if not user_message:
-                return Response(
-                    {"error": "El mensaje es requerido"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+            usage_context[field] = int(value) if value is not None else None
+        except (TypeError, ValueError):
+            usage_context[field] = None
+    return usage_context
 
-            # Obtener servicio de IA
-            ai_service = get_ai_service()
-            if not ai_service:
-                return Response(
-                    {
-                        "response": "El servicio de IA no está disponible. Verifica tu configuración GROQ_API_KEY.",
-                        "success": False,
-                    },
-                    status=status.HTTP_200_OK,
-                )
 
-            # Construir el prompt con contexto
-            system_prompt = self._build_system_prompt(context)
-
-            # **NUEVA FUNCIONALIDAD**: Detectar si el usuario pregunta sobre errores y hacer análisis automático
-            code_analysis_result = None
-            if (
-                self._is_asking_about_code_errors(user_message)
-                and context
-                and context.get("exerciseCode")
-            ):
-                ai_service_instance = get_ai_service()
-                if ai_service_instance:
-                    code_analysis_result = ai_service_instance.analyze_python_code(
-                        context.get("exerciseCode", "")
-                    )
-
-            messages = self._build_conversation_messages(
-                system_prompt, conversation_history, user_message, code_analysis_result
-            )
+class AIAssistantView(APIView):
+    error_data = {
+        "response": "Lo siento, no pude procesar tu pregunta en este momento. Verifica tu configuración de IA.",
+        "success": False,
+    }
 
-            # Usar el servicio de IA
-            ai_response = ai_service.get_ai_response(messages, max_tokens=1000)
+    def post(self, request, *args, **kwargs):
+        try:
+            precomputed = self._precomputed(request, request.data)
+            if precomputed is not None:
+                return Response(precomputed, status=status.HTTP_200_OK)
+
+            prepared = self._prepare(request.data)
+            if isinstance(prepared, Response):
+                return prepared
+            ai_service, messages, compaction = prepared
+
+            # Usar el servicio de IA ("useCache": false fuerza una respuesta nueva)
+            result = ai_service.complete(
+                messages,
+                max_tokens=1000,
+                use_cache=_use_cache(request.data),
+                model=ai_service.model_for(self._task(request.data)),
+                usage_context=_usage_context(request, request.data),
+            )
 
             return Response(
-                {"response": ai_response, "success": True, "provider": "groq"},
+                self._response_data(request.data, result, compaction),
                 status=status.HTTP_200_OK,
             )
 
         except Exception as e:
             logger.error(f"Error en AIAssistantView: {e}")
+            return Response(self.error_data, status=status.HTTP_200_OK)
+
+    def _task(self, data):
+        """Tarea con la que se elige el modelo (ver ``AIService.model_for``)."""
+        return "assistant"
+
+    def _precomputed(self, request, data):
+        """
+        Respuesta del análisis previo de la sección (``sectionId``) si la
+        pregunta es genérica sobre el ejercicio; ``None`` si hay que
+        preguntar al modelo.
+        """
+        message = data.get("message", "")
+        if not isinstance(message, str) or not _use_cache(data):
+            return None
+        start = time.perf_counter()
+        usage_context = _usage_context(request, data)
+        answer = precomputed_answer(usage_context["seccion_id"], message)
+        if answer is None:
+            return None
+        content, analisis = answer
+        record_ai_usage(
+            **usage_context,
+            proveedor="precomputed",
+            modelo=analisis.modelo,
+            latencia_ms=round((time.perf_counter() - start) * 1000),
+            desde_cache=True,
+            resultado=UsoIA.EXITO,
+        )
+        return {
+            "response": content,
+            "success": True,
+            "cached": True,
+            "precomputed": True,
+            "provider": "precomputed",
+            "prompt_compaction": None,
+        }
+
+    def _prepare(self, data):
+        """Valida los datos y construye los mensajes. Devuelve ``(servicio, mensajes)`` o una ``Response``."""
+        # Obtener datos de la request
+        user_message = data.get("message", "")
+        context = data.get("context", {})
+        conversation_history = data.get("conversationHistory", [])
+
+        if not user_message:
+            return Response(
+                {"error": "El mensaje es requerido"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Obtener servicio de IA
+        ai_service = get_ai_service()
+        if not ai_service:
             return Response(
                 {
-                    "response": "Lo siento, no pude procesar tu pregunta en este momento. Verifica tu configuración de IA.",
+                    "response": "El servicio de IA no está disponible. Verifica tu configuración GROQ_API_KEY.",
                     "success": False,
                 },
                 status=status.HTTP_200_OK,
             )
 
+        # Construir el prompt con contexto
+        system_prompt = self._build_system_prompt(context)
+
+        # **NUEVA FUNCIONALIDAD**: Detectar si el usuario pregunta sobre errores y hacer análisis automático
+        code_analysis_result = None
+        if (
+            self._is_asking_about_code_errors(user_message)
+            and context
+            and context.get("exerciseCode")
+        ):
+            code_analysis_result = ai_service.analyze_python_code(
+                context.get("exerciseCode", "")
+            )
+
+        messages, compaction = self._build_conversation_messages(
+            system_prompt,
+            conversation_history,
+            user_message,
+            code_analysis_result,
+            exercise_code=(context or {}).get("exerciseCode", ""),
+        )
+        return ai_service, messages, compaction
+
+    def _response_data(self, data, result, compaction):
+        return {
+            "response": result["content"],
+            "success": result["success"],
+            "cached": result["cached"],
+            "provider": result["provider"],
+            # Tokens estimados del prompt y ahorro frente a enviar el historial completo
+            "prompt_compaction": compaction,
+        }
+
     def _build_system_prompt(self, context):
         """Construye el prompt del sistema con el contexto del curso."""
 
@@ -142,16 +250,19 @@ Usa este contexto para dar respuestas más específicas y relevantes."""
         return any(keyword in message_lower for keyword in error_keywords)
 
     def _build_conversation_messages(
-        self, system_prompt, history, current_message, code_analysis=None
+        self,
+        system_prompt,
+        history,
+        current_message,
+        code_analysis=None,
+        exercise_code="",
     ):
-        """Construye la lista de mensajes para la conversación, incluyendo análisis de código si está disponible."""
-
-        messages = [{"role": "system", "content": system_prompt}]
+        """
+        Construye la lista de mensajes para la conversación, incluyendo análisis de código si está disponible.
 
-        # Agregar historial de conversación
-        for msg in history[-10:]:  # Últimos 10 mensajes para no sobrecargar
-            role = "user" if msg.get("sender") == "user" else "assistant"
-            messages.append({"role": role, "content": msg.get("content", "")})
+        El historial se compacta dentro de ``AI_PROMPT_TOKEN_BUDGET`` (ver
+        ``ai_history.py``). Devuelve ``(mensajes, informe de compactación)``.
+        """
 
         # Si hay análisis de código automático, incluirlo en el mensaje del usuario
         final_user_message = current_message
@@ -172,8 +283,44 @@ Usa este contexto para dar respuestas más específicas y relevantes."""
 
             final_user_message += analysis_info
 
-        messages.append({"role": "user", "content": final_user_message})
-        return messages
+        return HistoryManager().build(
+            system_prompt, history, final_user_message, exercise_code=exercise_code
+        )
+
+
+class AIAssistantStreamView(AIAssistantView):
+    """
+    Variante de ai-assistant/ que envía la respuesta como Server-Sent Events
+    a medida que el modelo genera los tokens. Eventos: "token" con cada
+    fragmento de texto y "done" con ``success`` y ``cached``.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            precomputed = self._precomputed(request, request.data)
+            prepared = None if precomputed else self._prepare(request.data)
+        except Exception as e:
+            logger.error(f"Error en AIAssistantStreamView: {e}")
+            prepared = Response(self.error_data, status=status.HTTP_200_OK)
+        if isinstance(prepared, Response):
+            return prepared
+        if precomputed is not None:
+            return sse_response(
+                [
+                    ("token", {"content": precomputed["response"]}),
+                    ("done", {"success": True, "cached": True}),
+                ]
+            )
+        ai_service, messages, _ = prepared
+
+        events = ai_service.stream(
+            messages,
+            max_tokens=1000,
+            use_cache=_use_cache(request.data),
+            model=ai_service.model_for(self._task(request.data)),
+            usage_context=_usage_context(request, request.data),
+        )
+        return sse_response((event.pop("event"), event) for event in events)
 
 
 class AICodeAnalysisView(APIView):
@@ -181,44 +328,83 @@ class AICodeAnalysisView(APIView):
     Endpoint específico para análisis de código usando IA GRATUITA
     """
 
+    error_data = {
+        "analysis": "Lo siento, no pude analizar el código en este momento.",
+        "success": False,
+    }
+
     def post(self, request, *args, **kwargs):
         try:
-            # Obtener datos de la request
-            code = request.data.get("code", "")
-            analysis_type = request.data.get("type", "debug")
-
-            if not code:
-                return Response(
-                    {"error": "El código es requerido"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+            prepared = self._prepare(request.data)
+            if isinstance(prepared, Response):
+                return prepared
+            ai_service, messages, code_analysis = prepared
+
+            # Las explicaciones van al modelo rápido (AI_FAST_MODEL) si está configurado
+            result = ai_service.complete(
+                messages,
+                max_tokens=1500,
+                use_cache=_use_cache(request.data),
+                model=ai_service.model_for(self._task(request.data)),
+                usage_context=_usage_context(request, request.data),
+            )
 
-            # Obtener servicio de IA
-            ai_service = get_ai_service()
-            if not ai_service:
-                return Response(
-                    {
-                        "analysis": "El servicio de IA no está disponible.",
-                        "success": False,
-                    },
-                    status=status.HTTP_200_OK,
-                )
+            return Response(
+                self._response_data(request.data, result, code_analysis),
+                status=status.HTTP_200_OK,
+            )
 
-            # Análisis automático de código Python
-            code_analysis = ai_service.analyze_python_code(code)
+        except Exception as e:
+            logger.error(f"Error en AICodeAnalysisView: {e}")
+            return Response(self.error_data, status=status.HTTP_200_OK)
 
-            # Construir prompt para IA basado en el análisis
-            if code_analysis["has_issues"]:
-                issues_text = "ERRORES DETECTADOS:\n"
-                for error in code_analysis["errors"]:
-                    issues_text += f"- {error['type']} en línea {error['line']}: {error['message']}\n"
+    def _task(self, data):
+        return data.get("type", "debug")
 
-                for warning in code_analysis["warnings"]:
-                    issues_text += f"- {warning['type']} en línea {warning['line']}: {warning['message']}\n"
-                    if "suggestion" in warning:
-                        issues_text += f"  Sugerencia: {warning['suggestion']}\n"
+    def _precomputed(self, request, data):
+        # El análisis depende del código enviado: siempre va al modelo
+        return None
+
+    def _prepare(self, data):
+        """Valida los datos y construye los mensajes. Devuelve ``(servicio, mensajes, análisis)`` o una ``Response``."""
+        # Obtener datos de la request
+        code = data.get("code", "")
+        analysis_type = data.get("type", "debug")
+
+        if not code:
+            return Response(
+                {"error": "El código es requerido"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Obtener servicio de IA
+        ai_service = get_ai_service()
+        if not ai_service:
+            return Response(
+                {
+                    "analysis": "El servicio de IA no está disponible.",
+                    "success": False,
+                },
+                status=status.HTTP_200_OK,
+            )
 
-                prompt = f"""Analiza este código Python y ayuda al estudiante:
+        # Análisis automático de código Python
+        code_analysis = ai_service.analyze_python_code(code)
+
+        # Construir prompt para IA basado en el análisis
+        if code_analysis["has_issues"]:
+            issues_text = "ERRORES DETECTADOS:\n"
+            for error in code_analysis["errors"]:
+                issues_text += (
+                    f"- {error['type']} en línea {error['line']}: {error['message']}\n"
+                )
+
+            for warning in code_analysis["warnings"]:
+                issues_text += f"- {warning['type']} en línea {warning['line']}: {warning['message']}\n"
+                if "suggestion" in warning:
+                    issues_text += f"  Sugerencia: {warning['suggestion']}\n"
+
+            prompt = f"""Analiza este código Python y ayuda al estudiante:
 
 CÓDIGO:
 ```python
@@ -234,16 +420,16 @@ Proporciona:
 4. Mejores prácticas relevantes
 
 Mantén la explicación educativa y alentadora."""
-            else:
-                # Si no hay errores, hacer análisis según el tipo
-                type_prompts = {
-                    "debug": "Revisa si hay errores potenciales o mejoras en este código:",
-                    "optimize": "Sugiere optimizaciones para este código:",
-                    "explain": "Explica paso a paso cómo funciona este código:",
-                    "general": "Haz un análisis general de este código:",
-                }
+        else:
+            # Si no hay errores, hacer análisis según el tipo
+            type_prompts = {
+                "debug": "Revisa si hay errores potenciales o mejoras en este código:",
+                "optimize": "Sugiere optimizaciones para este código:",
+                "explain": "Explica paso a paso cómo funciona este código:",
+                "general": "Haz un análisis general de este código:",
+            }
 
-                prompt = f"""{type_prompts.get(analysis_type, type_prompts['general'])}
+            prompt = f"""{type_prompts.get(analysis_type, type_prompts['general'])}
 
 ```python
 {code}
@@ -251,35 +437,192 @@ Mantén la explicación educativa y alentadora."""
 
 Proporciona una respuesta educativa y constructiva."""
 
-            # Obtener respuesta de IA
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Eres un experto profesor de Python que ayuda a estudiantes a mejorar su código.",
-                },
-                {"role": "user", "content": prompt},
-            ]
+        # Obtener respuesta de IA
+        messages = [
+            {
+                "role": "system",
+                "content": "Eres un experto profesor de Python que ayuda a estudiantes a mejorar su código.",
+            },
+            {"role": "user", "content": prompt},
+        ]
+        return ai_service, messages, code_analysis
 
-            ai_response = ai_service.get_ai_response(messages, max_tokens=1500)
+    def _response_data(self, data, result, code_analysis):
+        return {
+            "analysis": result["content"],
+            "code": data.get("code", ""),
+            "type": data.get("type", "debug"),
+            "automatic_analysis": code_analysis,
+            "success": result["success"],
+            "cached": result["cached"],
+            "provider": result["provider"],
+        }
 
-            return Response(
-                {
-                    "analysis": ai_response,
-                    "code": code,
-                    "type": analysis_type,
-                    "automatic_analysis": code_analysis,
-                    "success": True,
-                    "provider": "groq",
-                },
-                status=status.HTTP_200_OK,
+
+class _AsyncAIView(View):
+    """
+    Base de las vistas ASGI de IA. Reutiliza la validación y los prompts de
+    ``sync_view`` pero espera al proveedor con ``AIService.acomplete``, así
+    que un mismo proceso puede tener cientos de llamadas en curso sin ocupar
+    un hilo por cada una. Bajo WSGI también funcionan (Django ejecuta la
+    vista en un event loop propio por petición).
+    """
+
+    sync_view = None
+    max_tokens = 1000
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Igual que APIView: sin comprobación CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse(
+                {"error": "El cuerpo debe ser un objeto JSON"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
+        view = self.sync_view()
+        try:
+            precomputed = await sync_to_async(view._precomputed)(request, data)
+            if precomputed is not None:
+                return JsonResponse(precomputed)
+
+            prepared = view._prepare(data)
+            if isinstance(prepared, Response):
+                return JsonResponse(prepared.data, status=prepared.status_code)
+            ai_service, messages, *extra = prepared
+
+            result = await ai_service.acomplete(
+                messages,
+                max_tokens=self.max_tokens,
+                use_cache=_use_cache(data),
+                model=ai_service.model_for(view._task(data)),
+                usage_context=_usage_context(request, data),
+            )
+            return JsonResponse(view._response_data(data, result, *extra))
+
         except Exception as e:
-            logger.error(f"Error en AICodeAnalysisView: {e}")
+            logger.error(f"Error en {type(self).__name__}: {e}")
+            return JsonResponse(view.error_data)
+
+
+class AIAssistantAsyncView(_AsyncAIView):
+    """Versión asíncrona de ai-assistant/ (mismo cuerpo y misma respuesta)."""
+
+    sync_view = AIAssistantView
+
+
+class AICodeAnalysisAsyncView(_AsyncAIView):
+    """Versión asíncrona de ai-code-analysis/ (mismo cuerpo y misma respuesta)."""
+
+    sync_view = AICodeAnalysisView
+    max_tokens = 1500
+
+
+class AIHealthView(APIView):
+    """Estado del servicio de IA del proceso (configuración y últimas llamadas)."""
+
+    def get(self, request, *args, **kwargs):
+        health = ai_service_registry.health()
+        http_status = (
+            status.HTTP_200_OK
+            if health["status"] != "unavailable"
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        return Response(health, status=http_status)
+
+
+class AIMetricsView(APIView):
+    """Circuit breaker, límite de tasa (compartidos entre workers) y contadores del proceso."""
+
+    def get(self, request, *args, **kwargs):
+        # El proveedor en uso, que puede haber cambiado en Backend/.env sin
+        # reiniciar (settings.AI_PROVIDER conserva el del arranque)
+        service = get_ai_service()
+        if service is None:
             return Response(
-                {
-                    "analysis": "Lo siento, no pude analizar el código en este momento.",
-                    "success": False,
-                },
-                status=status.HTTP_200_OK,
+                {"status": "unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        provider = service.provider.name
+        return Response(
+            {"provider": provider, **get_provider_guard(provider).metrics()},
+            status=status.HTTP_200_OK,
+        )
+
+
+class AIUsageView(APIView):
+    """
+    Uso agregado de los endpoints de IA para encontrar los puntos más caros.
+
+    Parámetros: ``group_by`` (curso, seccion, estudiante, modelo o endpoint;
+    por defecto curso), ``days`` (últimos N días, 30 por defecto) y
+    ``limit``. Ordenado por tokens totales de mayor a menor.
+    """
+
+    # Agrupación -> (campo, campo con el nombre legible o None)
+    GROUPS = {
+        "curso": ("curso", "curso__nombre_curso"),
+        "seccion": ("seccion", "seccion__nombre_seccion"),
+        "estudiante": ("estudiante", "estudiante__nombre_estudiante"),
+        "modelo": ("modelo", None),
+        "endpoint": ("endpoint", None),
+    }
+
+    def get(self, request, *args, **kwargs):
+        group_by = request.query_params.get("group_by", "curso")
+        if group_by not in self.GROUPS:
+            return Response(
+                {"error": f"group_by debe ser uno de: {', '.join(self.GROUPS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            days = int(request.query_params.get("days", 30))
+            limit = int(request.query_params.get("limit", 50))
+        except ValueError:
+            return Response(
+                {"error": "days y limit deben ser números enteros"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Incluye lo que este proceso aún tiene en memoria
+        usage_buffer.flush()
+
+        field, name_field = self.GROUPS[group_by]
+        fields = [field] + ([name_field] if name_field else [])
+        rows = (
+            UsoIA.objects.filter(fecha__gte=timezone.now() - timedelta(days=days))
+            .values(*fields)
+            .annotate(
+                calls=Count("id_uso"),
+                prompt_tokens=Sum("tokens_prompt"),
+                completion_tokens=Sum("tokens_respuesta"),
+                total_tokens=Sum(F("tokens_prompt") + F("tokens_respuesta")),
+                avg_latency_ms=Avg("latencia_ms"),
+                max_latency_ms=Max("latencia_ms"),
+                cache_hits=Count("id_uso", filter=Q(desde_cache=True)),
+                errors=Count("id_uso", filter=Q(resultado=UsoIA.ERROR)),
+                rejected=Count("id_uso", filter=Q(resultado=UsoIA.RECHAZADA)),
             )
+            .order_by("-total_tokens", "-calls")[: max(1, limit)]
+        )
+
+        results = []
+        for row in rows:
+            item = {
+                group_by: row[field],
+                "name": row[name_field] if name_field else row[field],
+                **{key: value for key, value in row.items() if key not in fields},
+            }
+            item["avg_latency_ms"] = round(item["avg_latency_ms"] or 0)
+            results.append(item)
+        return Response(
+            {"group_by": group_by, "days": days, "results": results},
+            status=status.HTTP_200_OK,
+        )
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EducationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "education"
+
+    def ready(self):
+        # Registra la verificación de configuración del servicio de IA
+        from . import ai_service_isolated  # noqa: F401
@@ -0,0 +1,402 @@
+"""
+Análisis estático del código Python de los estudiantes.
+
+Un solo recorrido del AST registra, por ámbito (módulo, función, lambda,
+clase y comprensión), los nombres que se asignan y los que se leen. Al
+terminar se resuelve cada lectura con las reglas de Python: ámbito local,
+funciones que lo contienen (las clases no se ven desde sus métodos),
+``global``/``nonlocal``, módulo y builtins. Así no se marcan como
+indefinidos los builtins, atributos, argumentos, importaciones ni
+variables de comprensiones.
+"""
+
+import ast
+import builtins
+
+BUILTIN_NAMES = frozenset(dir(builtins)) | {
+    "__file__",
+    "__name__",
+    "__doc__",
+    "__builtins__",
+    "__spec__",
+    "__loader__",
+    "__package__",
+}
+
+AST = ast.AST
+
+UNDEFINED_SUGGESTION = "Verifica que la variable esté definida correctamente."
+
+
+class _Scope:
+    def __init__(self, kind, parent=None):
+        self.kind = kind
+        self.parent = parent
+        # Nombre -> posición (orden de evaluación) de la primera asignación
+        self.bindings = {}
+        self.globals = set()
+        self.nonlocals = set()
+        # (nombre, línea, dentro de un bucle, posición)
+        self.loads = []
+        self.star_import = False
+
+    def bind(self, name, position):
+        self.bindings.setdefault(name, position)
+
+
+class _ScopeVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.module = _Scope("module")
+        self.scope = self.module
+        self.scopes = [self.module]
+        self.loop_depth = 0
+        # Contador de lecturas y asignaciones en el orden en que Python las
+        # evalúa: en "x += 1" la lectura va antes que la asignación, aunque
+        # ambas estén en la misma línea
+        self.position = 0
+        self._methods = {}
+
+    # Recorrido: ast.NodeVisitor busca el método con getattr en cada nodo y
+    # recorre los campos con iter_fields; en entregas grandes eso es la
+    # mitad del tiempo total, así que se cachea el método por tipo de nodo
+
+    def visit(self, node):
+        method = self._methods.get(node.__class__)
+        if method is None:
+            method = getattr(
+                self, "visit_" + node.__class__.__name__, self.generic_visit
+            )
+            self._methods[node.__class__] = method
+        method(node)
+
+    def generic_visit(self, node):
+        visit = self.visit
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, AST):
+                        visit(item)
+            elif isinstance(value, AST):
+                visit(value)
+
+    def _skip(self, node):
+        pass
+
+    # Hojas sin nombres (y el visit_Constant de NodeVisitor es lento)
+    visit_Constant = _skip
+    visit_Load = _skip
+    visit_Store = _skip
+    visit_Del = _skip
+
+    # Ámbitos
+
+    def _push(self, kind):
+        scope = _Scope(kind, self.scope)
+        self.scopes.append(scope)
+        self.scope = scope
+        saved_loop_depth, self.loop_depth = self.loop_depth, 0
+        return saved_loop_depth
+
+    def _pop(self, saved_loop_depth):
+        self.scope = self.scope.parent
+        self.loop_depth = saved_loop_depth
+
+    def _bind(self, name, scope=None):
+        scope = scope or self.scope
+        self.position += 1
+        if name in scope.globals:
+            self.module.bind(name, self.position)
+        elif name not in scope.nonlocals:
+            scope.bind(name, self.position)
+
+    def _load(self, name, lineno):
+        self.position += 1
+        self.scope.loads.append((name, lineno, self.loop_depth > 0, self.position))
+
+    def _bind_arguments(self, args):
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            self._bind(arg.arg)
+        for arg in (args.vararg, args.kwarg):
+            if arg is not None:
+                self._bind(arg.arg)
+
+    def _visit_arguments_outside(self, args):
+        # Valores por defecto y anotaciones se evalúan en el ámbito exterior
+        for default in args.defaults + [d for d in args.kw_defaults if d]:
+            self.visit(default)
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            if arg.annotation:
+                self.visit(arg.annotation)
+        for arg in (args.vararg, args.kwarg):
+            if arg is not None and arg.annotation:
+                self.visit(arg.annotation)
+
+    # Nombres
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Store):
+            self._bind(node.id)
+        else:
+            # Load y Del: el nombre tiene que existir
+            self._load(node.id, node.lineno)
+
+    # Asignaciones: el valor se evalúa antes de asignar el destino
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            # "total += 1" lee total antes de asignarla
+            self._load(node.target.id, node.target.lineno)
+        self.visit(node.target)
+
+    def visit_AnnAssign(self, node):
+        self.visit(node.annotation)
+        if node.value is not None:
+            self.visit(node.value)
+            self.visit(node.target)
+        elif not isinstance(node.target, ast.Name):
+            # "obj.attr: int" evalúa obj aunque no asigne nada
+            self.visit(node.target)
+
+    def visit_Global(self, node):
+        self.scope.globals.update(node.names)
+
+    def visit_Nonlocal(self, node):
+        self.scope.nonlocals.update(node.names)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._bind(alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                self.scope.star_import = True
+            else:
+                self._bind(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.type:
+            self.visit(node.type)
+        if node.name:
+            self._bind(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        # En una comprensión, := asigna en el primer ámbito que no lo es
+        scope = self.scope
+        while scope.kind == "comprehension":
+            scope = scope.parent
+        self._bind(node.target.id, scope)
+
+    def visit_MatchAs(self, node):
+        if node.pattern:
+            self.visit(node.pattern)
+        if node.name:
+            self._bind(node.name)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self._bind(node.name)
+
+    def visit_MatchMapping(self, node):
+        self.generic_visit(node)
+        if node.rest:
+            self._bind(node.rest)
+
+    # Definiciones
+
+    def _visit_function(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_arguments_outside(node.args)
+        if node.returns:
+            self.visit(node.returns)
+        self._bind(node.name)
+        saved = self._push("function")
+        self._bind_arguments(node.args)
+        for statement in node.body:
+            self.visit(statement)
+        self._pop(saved)
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Lambda(self, node):
+        self._visit_arguments_outside(node.args)
+        saved = self._push("function")
+        self._bind_arguments(node.args)
+        self.visit(node.body)
+        self._pop(saved)
+
+    def visit_ClassDef(self, node):
+        for expression in node.decorator_list + node.bases:
+            self.visit(expression)
+        for keyword in node.keywords:
+            self.visit(keyword.value)
+        saved = self._push("class")
+        for statement in node.body:
+            self.visit(statement)
+        self._pop(saved)
+        self._bind(node.name)
+
+    def _visit_comprehension(self, node, *elements):
+        # El primer iterable se evalúa fuera; el resto dentro del ámbito propio
+        self.visit(node.generators[0].iter)
+        saved = self._push("comprehension")
+        for index, generator in enumerate(node.generators):
+            if index:
+                self.visit(generator.iter)
+            self.visit(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self._pop(saved)
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, node.elt)
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, node.key, node.value)
+
+    # Bucles: un nombre puede leerse antes de asignarse en la misma vuelta
+
+    def _visit_loop(self, node):
+        self.loop_depth += 1
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    visit_For = _visit_loop
+    visit_AsyncFor = _visit_loop
+    visit_While = _visit_loop
+
+
+def _has_star_import(scope):
+    while scope is not None:
+        if scope.star_import:
+            return True
+        scope = scope.parent
+    return False
+
+
+def _resolve(scope, name, module):
+    """Ámbito donde está asignado ``name`` visto desde ``scope`` o ``None``."""
+    if name in scope.globals:
+        return module if name in module.bindings else None
+    current = scope
+    while current is not None:
+        # Los nombres de una clase solo se ven dentro del cuerpo de la clase
+        if current is scope or current.kind != "class":
+            if name in current.bindings:
+                return current
+        current = current.parent
+    return None
+
+
+def _undefined_names(visitor):
+    warnings = []
+    reported = set()
+    for scope in visitor.scopes:
+        if _has_star_import(scope):
+            continue
+        for name, lineno, in_loop, position in scope.loads:
+            if (name, lineno) in reported:
+                continue
+            owner = _resolve(scope, name, visitor.module)
+            if owner is None:
+                if name in BUILTIN_NAMES:
+                    continue
+                warning = {
+                    "type": "NameError",
+                    "message": f"Variable '{name}' no está definida",
+                    "line": lineno,
+                    "suggestion": UNDEFINED_SUGGESTION,
+                }
+            elif (
+                owner is scope
+                and not in_loop
+                and scope.kind != "comprehension"
+                and owner.bindings[name] > position
+            ):
+                # Se asigna más abajo en el mismo ámbito
+                warning = {
+                    "type": (
+                        "UnboundLocalError" if scope.kind == "function" else "NameError"
+                    ),
+                    "message": f"Variable '{name}' se usa antes de asignarse",
+                    "line": lineno,
+                    "suggestion": (
+                        f"Asigna un valor a '{name}' antes de la línea {lineno}."
+                    ),
+                }
+            else:
+                continue
+            reported.add((name, lineno))
+            warnings.append(warning)
+    warnings.sort(key=lambda warning: warning["line"])
+    return warnings
+
+
+def analyze_python_code(code):
+    """
+    Devuelve ``{"errors", "warnings", "has_issues", "defined_variables"}``.
+
+    ``errors`` contiene el error de sintaxis (si lo hay), ``warnings`` los
+    nombres indefinidos o usados antes de asignarse y ``defined_variables``
+    todos los nombres asignados en el código (variables, funciones, clases,
+    argumentos e importaciones).
+    """
+    errors = []
+    warnings = []
+    defined = set()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        errors.append(
+            {
+                "type": "SyntaxError",
+                "message": f"Error de sintaxis: {str(e)}",
+                "line": e.lineno,
+                "column": e.offset,
+            }
+        )
+    except ValueError as e:
+        # Bytes nulos en el código
+        errors.append(
+            {
+                "type": "SyntaxError",
+                "message": f"Error de sintaxis: {str(e)}",
+                "line": None,
+                "column": None,
+            }
+        )
+    else:
+        visitor = _ScopeVisitor()
+        try:
+            visitor.visit(tree)
+        except RecursionError:
+            # Anidamiento extremo: el intérprete tampoco podría compilarlo
+            visitor = None
+        if visitor is not None:
+            warnings = _undefined_names(visitor)
+            for scope in visitor.scopes:
+                defined.update(scope.bindings)
+
+    return {
+        "errors": errors,
+        "warnings": warnings,
+        "has_issues": len(errors) > 0 or len(warnings) > 0,
+        "defined_variables": sorted(defined),
+    }
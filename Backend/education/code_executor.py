@@ -0,0 +1,761 @@
+"""
+Ejecución de código Python de los estudiantes.
+
+En lugar de lanzar un intérprete nuevo por cada envío, se mantiene un pool de
+procesos trabajadores (``sandbox_worker.py``) ya iniciados que reciben el
+código por un pipe. Cada trabajador se recicla tras ``max_runs`` ejecuciones,
+cuando excede el tiempo límite o si termina inesperadamente.
+
+Cada trabajador corre con límites de memoria, archivos abiertos y procesos
+(``setrlimit``) y cada ejecución con límites de CPU y de bytes de salida.
+Las respuestas incluyen el consumo medido de la ejecución.
+"""
+
+import ast
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .admission import ExecutionQueueFull, execution_slot
+from .result_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py"
+)
+
+
+_CRASH_MESSAGE = "Error: El proceso de ejecución terminó inesperadamente."
+
+
+def _timeout_message(timeout_seconds):
+    return f"Error: La ejecución del código excedió el límite de tiempo ({timeout_seconds} segundos)."
+
+
+def _queue_full_message(exc):
+    return f"Error: El ejecutor está saturado, intenta de nuevo en {exc.retry_after} segundos."
+
+
+def _sandbox_env():
+    # Entorno mínimo: el código del estudiante no debe ver SECRET_KEY, claves de API, etc.
+    env = {"PATH": os.environ.get("PATH", "")}
+    if os.name == "nt":
+        env["SYSTEMROOT"] = os.environ.get("SYSTEMROOT", "")
+    return env
+
+
+# Métricas de consumo que el trabajador devuelve con cada ejecución
+RESOURCE_METRICS = ("limit_exceeded", "cpu_time_ms", "peak_memory_kb", "output_bytes")
+
+# Límites que se aplican por ejecución; el resto se fija al iniciar el trabajador
+RUN_LIMITS = ("cpu_seconds", "max_output_bytes")
+
+
+def get_resource_limits():
+    """Límites de recursos configurados para el sandbox (0 = sin límite)."""
+    return {
+        "cpu_seconds": settings.CODE_EXECUTOR_CPU_SECONDS,
+        "memory_mb": settings.CODE_EXECUTOR_MEMORY_MB,
+        "max_open_files": settings.CODE_EXECUTOR_MAX_OPEN_FILES,
+        "max_processes": settings.CODE_EXECUTOR_MAX_PROCESSES,
+        "max_output_bytes": settings.CODE_EXECUTOR_MAX_OUTPUT_BYTES,
+    }
+
+
+def build_execution_result(stdout, stderr, returncode):
+    """Combina la salida de una ejecución con el mismo formato que el ejecutor original."""
+    output = stdout or ""
+    if stderr:
+        output += "\n" + stderr
+
+    if returncode != 0:
+        execution_status = "error"
+    elif "Timeout" in output:
+        execution_status = "timeout"
+    else:
+        execution_status = "success"
+
+    return {"output": output, "status": execution_status, "returncode": returncode}
+
+
+class SandboxWorker:
+    """Proceso Python persistente que ejecuta código recibido por stdin."""
+
+    def __init__(self, workdir, limits=None):
+        self.runs = 0
+        self.broken = False
+        # Hilos que dejó la última ejecución: podrían escribir en la siguiente
+        self.threads_left = 0
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", WORKER_SCRIPT, json.dumps(limits or {})],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=workdir,
+            env=_sandbox_env(),
+        )
+        self._responses = queue.Queue()
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    def _read_responses(self):
+        for line in self.process.stdout:
+            try:
+                self._responses.put(json.loads(line))
+            except ValueError:
+                break
+        # EOF: el proceso terminó (crash, kill o reciclado)
+        self._responses.put(None)
+
+    @property
+    def alive(self):
+        return not self.broken and self.process.poll() is None
+
+    def request(self, payload, timeout):
+        """
+        Envía una petición al trabajador y espera su respuesta.
+
+        Devuelve ``None`` si el proceso murió y lanza ``queue.Empty`` si no
+        respondió dentro de ``timeout`` segundos.
+        """
+        if not self._send(payload):
+            return None
+        response = self._responses.get(timeout=timeout)
+        self._finished(response)
+        return response
+
+    def stream(self, payload, timeout):
+        """
+        Igual que ``request`` pero genera cada mensaje de salida a medida que
+        llega, terminando con el mensaje final (o ``None`` si el proceso murió).
+        """
+        deadline = time.monotonic() + timeout
+        if not self._send(payload):
+            yield None
+            return
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise queue.Empty
+            message = self._responses.get(timeout=remaining)
+            final = message is None or message.get("event") != "output"
+            if final:
+                self._finished(message)
+            yield message
+            if final:
+                return
+
+    def _finished(self, response):
+        if response is None:
+            self.broken = True
+        else:
+            self.threads_left = response.get("threads_left", 0)
+
+    def _send(self, payload):
+        self.runs += 1
+        try:
+            self.process.stdin.write(json.dumps(payload).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except OSError:
+            self.broken = True
+            return False
+        return True
+
+    def run(self, code, timeout):
+        return self.request({"code": code}, timeout)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class ExecutorPool:
+    """Pool acotado de trabajadores precalentados."""
+
+    def __init__(self, size, max_runs, limits=None):
+        self.size = size
+        self.max_runs = max_runs
+        self.limits = limits
+        self.workdir = tempfile.mkdtemp(prefix="pystart-executor-")
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def prestart(self):
+        """Inicia todos los trabajadores para que la primera ejecución no pague el arranque."""
+        for _ in range(self.size - self._idle.qsize()):
+            self._idle.put(SandboxWorker(self.workdir, self.limits))
+
+    def _checkout(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return SandboxWorker(self.workdir, self.limits)
+            if worker.alive:
+                return worker
+            worker.close()
+
+    def _checkin(self, worker):
+        if worker.threads_left:
+            logger.warning(
+                f"El código dejó {worker.threads_left} hilos en ejecución; "
+                "se descarta el trabajador"
+            )
+        if (
+            self._closed
+            or not worker.alive
+            or worker.threads_left
+            or worker.runs >= self.max_runs
+        ):
+            worker.close()
+            if not self._closed:
+                # Reemplazo inmediato: el nuevo intérprete arranca mientras no se usa
+                self._idle.put(SandboxWorker(self.workdir, self.limits))
+        else:
+            self._idle.put(worker)
+
+    def submit(self, payload, timeout):
+        """Envía una petición a un trabajador libre (ver ``SandboxWorker.request``)."""
+        with self._slots:
+            worker = self._checkout()
+            try:
+                return worker.request(payload, timeout)
+            except queue.Empty:
+                worker.close()
+                raise
+            finally:
+                self._checkin(worker)
+
+    def stream(self, payload, timeout):
+        """Versión incremental de ``submit`` (ver ``SandboxWorker.stream``)."""
+        with self._slots:
+            worker = self._checkout()
+            finished = False
+            try:
+                for message in worker.stream(payload, timeout):
+                    if message is None or message.get("event") != "output":
+                        finished = True
+                    yield message
+            finally:
+                # Si el consumidor abandonó el stream el programa sigue corriendo
+                if not finished:
+                    worker.close()
+                self._checkin(worker)
+
+    def execute(self, code, timeout):
+        try:
+            response = self.submit({"code": code}, timeout)
+        except queue.Empty:
+            return {"output": _timeout_message(timeout), "status": "timeout"}
+        return _result_from_response(response)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def submit_to_fresh_worker(payload, timeout):
+    """Envía la petición a un trabajador nuevo que se descarta al terminar."""
+    workdir = tempfile.mkdtemp(prefix="pystart-executor-")
+    worker = SandboxWorker(workdir, get_resource_limits())
+    try:
+        return worker.request(payload, timeout)
+    finally:
+        worker.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def stream_from_fresh_worker(payload, timeout):
+    workdir = tempfile.mkdtemp(prefix="pystart-executor-")
+    worker = SandboxWorker(workdir, get_resource_limits())
+    try:
+        yield from worker.stream(payload, timeout)
+    finally:
+        worker.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _result_from_response(response):
+    if response is None:
+        return {"output": _CRASH_MESSAGE, "status": "error"}
+    result = build_execution_result(
+        response["stdout"], response["stderr"], response["returncode"]
+    )
+    for metric in RESOURCE_METRICS:
+        result[metric] = response.get(metric)
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_executor_pool():
+    """Devuelve el pool del proceso actual, creándolo en el primer uso (después del fork de gunicorn)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None and settings.CODE_EXECUTOR_POOL_SIZE > 0:
+                pool = ExecutorPool(
+                    size=settings.CODE_EXECUTOR_POOL_SIZE,
+                    max_runs=settings.CODE_EXECUTOR_MAX_RUNS_PER_WORKER,
+                    limits=get_resource_limits(),
+                )
+                pool.prestart()
+                atexit.register(pool.shutdown)
+                _pool = pool
+    return _pool
+
+
+# Módulos cuya salida no depende del reloj, del azar ni del entorno
+DETERMINISTIC_MODULES = {
+    "abc",
+    "array",
+    "bisect",
+    "cmath",
+    "collections",
+    "copy",
+    "dataclasses",
+    "decimal",
+    "enum",
+    "fractions",
+    "functools",
+    "heapq",
+    "itertools",
+    "json",
+    "math",
+    "numbers",
+    "operator",
+    "pprint",
+    "re",
+    "statistics",
+    "string",
+    "textwrap",
+    "typing",
+}
+
+# Builtins que leen el entorno, permiten importar módulos de forma dinámica o
+# cuya salida cambia entre procesos (identidad, hash y orden de los sets de
+# cadenas, que depende de PYTHONHASHSEED)
+NONDETERMINISTIC_BUILTINS = {
+    "__builtins__",
+    "__import__",
+    "__loader__",
+    "__spec__",
+    "breakpoint",
+    "compile",
+    "delattr",
+    "eval",
+    "exec",
+    "frozenset",
+    "getattr",
+    "globals",
+    "hash",
+    "id",
+    "input",
+    "locals",
+    "open",
+    "set",
+    "setattr",
+    "vars",
+}
+
+
+# Los atributos especiales (``__class__``, ``__subclasses__``, ``__globals__``,
+# ``__hash__``...) llegan al intérprete sin pasar por un import o dependen del
+# proceso (el hash de las cadenas cambia con PYTHONHASHSEED)
+def _is_dunder(name):
+    return name.startswith("__") and name.endswith("__")
+
+
+# Repr por defecto (``<__main__.A object at 0x7f...>``, funciones, generadores):
+# la dirección cambia en cada ejecución
+UNSTABLE_OUTPUT_RE = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def is_deterministic(code):
+    """
+    Indica si el resultado del código puede reutilizarse entre envíos.
+
+    Es conservador: cualquier import fuera de ``DETERMINISTIC_MODULES`` (time,
+    random, os, datetime...), el uso de builtins como ``open``, ``input``,
+    ``id``, ``hash`` o ``getattr``, los sets y el acceso a atributos
+    especiales (``obj.__hash__()``, ``x.__class__``...) excluyen el código de
+    la caché. Las salidas con direcciones de memoria se
+    descartan después de ejecutar (ver ``UNSTABLE_OUTPUT_RE``).
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # Los errores de sintaxis siempre producen la misma salida
+        return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+        elif isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_BUILTINS:
+            return False
+        elif isinstance(node, ast.Attribute) and _is_dunder(node.attr):
+            return False
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            return False
+        else:
+            continue
+        if any(name.split(".")[0] not in DETERMINISTIC_MODULES for name in modules):
+            return False
+    return True
+
+
+def execution_cache_key(code, language="python"):
+    """Clave de la caché: hash del código, el lenguaje y la versión del intérprete."""
+    digest = hashlib.sha256()
+    for part in (language, sys.version, code):
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = LRUTTLCache(
+                    max_entries=settings.CODE_EXECUTOR_CACHE_SIZE,
+                    ttl=settings.CODE_EXECUTOR_CACHE_TTL,
+                    max_bytes=settings.CODE_EXECUTOR_CACHE_MAX_BYTES,
+                )
+    return _result_cache
+
+
+_syntax_cache = None
+_syntax_cache_lock = threading.Lock()
+
+
+def get_syntax_cache():
+    global _syntax_cache
+    if _syntax_cache is None:
+        with _syntax_cache_lock:
+            if _syntax_cache is None:
+                _syntax_cache = LRUTTLCache(
+                    max_entries=settings.CODE_EXECUTOR_SYNTAX_CACHE_SIZE
+                )
+    return _syntax_cache
+
+
+def check_syntax(code):
+    """
+    Compila el código en este proceso sin ejecutarlo.
+
+    Devuelve ``None`` si compila o un resultado de ejecución con
+    ``error_type`` y ``error_message`` si no, con el mismo texto que
+    mostraría el sandbox. El resultado se memoriza por hash del código.
+    """
+    cache = get_syntax_cache()
+    key = execution_cache_key(code)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    try:
+        compile(code, "<string>", "exec")
+    except (SyntaxError, ValueError) as exc:
+        if isinstance(exc, SyntaxError) and exc.lineno is not None:
+            error_message = f"{exc.msg} (línea {exc.lineno})"
+        elif isinstance(exc, SyntaxError):
+            error_message = exc.msg
+        else:
+            # Por ejemplo, bytes nulos en el código
+            error_message = str(exc)
+        stderr = "".join(traceback.format_exception_only(type(exc), exc))
+        result = {
+            **build_execution_result("", stderr, 1),
+            "error_type": type(exc).__name__,
+            "error_message": error_message,
+        }
+    except (RecursionError, MemoryError):
+        # Código patológico: que lo evalúe el sandbox con sus límites
+        return None
+    else:
+        result = {}
+    cache.set(key, result)
+    return result or None
+
+
+def execute_python_code(code, timeout=None, use_cache=True, admission_key=None):
+    """
+    Ejecuta código Python y devuelve un diccionario con ``output``, ``status``
+    ('success', 'error' o 'timeout') y ``cached``.
+
+    Los errores de sintaxis se detectan sin lanzar ningún proceso (ver
+    ``check_syntax``) y los programas deterministas se sirven desde la caché
+    de resultados. Como toda ejecución en el sandbox, espera un cupo del
+    limitador del nodo a nombre de ``admission_key`` (id del estudiante o IP;
+    ver ``_submit``) y puede lanzar ``ExecutionQueueFull``.
+    """
+    if timeout is None:
+        timeout = settings.CODE_EXECUTOR_TIMEOUT
+
+    syntax_error = check_syntax(code)
+    if syntax_error is not None:
+        return {**syntax_error, "cached": False}
+
+    cache = get_result_cache()
+    cache_key = None
+    if use_cache and cache.max_entries > 0 and is_deterministic(code):
+        cache_key = execution_cache_key(code)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    result = _execute(code, timeout, admission_key)
+
+    # Solo se guardan ejecuciones que terminaron normalmente (no timeouts ni
+    # caídas), sin alcanzar un límite de recursos (dependen de la carga del
+    # nodo) y cuya salida no incluye direcciones de memoria
+    if (
+        cache_key is not None
+        and result.get("returncode") is not None
+        and not result.get("limit_exceeded")
+        and not UNSTABLE_OUTPUT_RE.search(result["output"])
+    ):
+        cache.set(
+            cache_key, result, size=len(result["output"].encode("utf-8", "replace"))
+        )
+    return {**result, "cached": False}
+
+
+def _run_limits(**overrides):
+    # Se envían con cada petición para que un cambio de configuración no
+    # requiera reiniciar los trabajadores del pool
+    limits = get_resource_limits()
+    limits = {key: limits[key] for key in RUN_LIMITS}
+    limits.update({key: value for key, value in overrides.items() if value is not None})
+    return limits
+
+
+def execute_python_batch(codes, timeout=None, parallelism=None, admission_key=None):
+    """
+    Ejecuta varios fragmentos en paralelo (como máximo ``parallelism`` a la
+    vez) y devuelve sus resultados en el mismo orden.
+
+    Cada fragmento conserva su propio límite de tiempo y pasa por el control
+    de admisión por separado; si no obtiene cupo su resultado es un error en
+    lugar de rechazar todo el lote.
+    """
+    if parallelism is None:
+        parallelism = settings.CODE_EXECUTOR_BATCH_PARALLELISM
+
+    def run(code):
+        try:
+            return execute_python_code(code, timeout, admission_key=admission_key)
+        except ExecutionQueueFull as e:
+            return {
+                "output": _queue_full_message(e),
+                "status": "error",
+                "cached": False,
+            }
+
+    codes = list(codes)
+    if not codes:
+        return []
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(parallelism, len(codes))),
+        thread_name_prefix="code-batch",
+    ) as executor:
+        return list(executor.map(run, codes))
+
+
+# Cupo del limitador para las ejecuciones que no piden un estudiante
+# (trabajos en cola, comandos); comparten un turno en el orden justo
+DEFAULT_ADMISSION_KEY = "sistema"
+
+
+def _submit(payload, timeout, admission_key=None):
+    """
+    Punto único por el que toda ejecución llega al sandbox (execute-code,
+    lotes, trabajos en cola y calificación; el streaming usa ``_stream``).
+    Espera un cupo del limitador del nodo (ver ``admission.py``) y puede
+    lanzar ``ExecutionQueueFull``.
+    """
+    payload = {**payload, "limits": _run_limits()}
+    with execution_slot(admission_key or DEFAULT_ADMISSION_KEY):
+        pool = get_executor_pool()
+        if pool is not None:
+            return pool.submit(payload, timeout)
+        return submit_to_fresh_worker(payload, timeout)
+
+
+def _stream(payload, timeout, admission_key=None):
+    """Versión incremental de ``_submit``: el cupo se ocupa mientras dura el stream."""
+    with execution_slot(admission_key or DEFAULT_ADMISSION_KEY):
+        pool = get_executor_pool()
+        if pool is not None:
+            messages = pool.stream(payload, timeout)
+        else:
+            messages = stream_from_fresh_worker(payload, timeout)
+        try:
+            yield from messages
+        finally:
+            # Detiene el trabajador si el programa seguía produciendo salida
+            messages.close()
+
+
+def _execute(code, timeout, admission_key=None):
+    try:
+        response = _submit({"code": code}, timeout, admission_key)
+    except ExecutionQueueFull:
+        raise
+    except queue.Empty:
+        return {"output": _timeout_message(timeout), "status": "timeout"}
+    except FileNotFoundError:
+        return {
+            "output": "Error: El intérprete de Python no se encontró.",
+            "status": "error",
+        }
+    except Exception as e:
+        logger.error(f"Error inesperado en el ejecutor de código: {e}")
+        return {
+            "output": f"Error inesperado al ejecutar el código: {str(e)}",
+            "status": "error",
+        }
+    return _result_from_response(response)
+
+
+def run_test_cases(
+    code, inputs, case_timeout=None, total_timeout=None, admission_key=None
+):
+    """
+    Ejecuta el código una vez por cada entrada (stdin) dentro de un único
+    proceso del sandbox, con un namespace nuevo por caso.
+
+    Devuelve una lista con ``stdout``, ``stderr``, ``returncode``,
+    ``time_ms`` y ``timed_out`` por cada entrada, o ``None`` si el proceso
+    murió o excedió ``total_timeout``. Puede lanzar ``ExecutionQueueFull``
+    (ver ``_submit``).
+    """
+    if case_timeout is None:
+        case_timeout = settings.CODE_EXECUTOR_TIMEOUT
+    if total_timeout is None:
+        total_timeout = settings.CODE_EXECUTOR_GRADING_TIMEOUT
+
+    try:
+        response = _submit(
+            {"code": code, "inputs": list(inputs), "case_timeout": case_timeout},
+            total_timeout,
+            admission_key,
+        )
+    except queue.Empty:
+        return None
+    if response is None:
+        return None
+    return response["cases"]
+
+
+def stream_python_code(code, timeout=None, max_bytes=None, admission_key=None):
+    """
+    Ejecuta código Python generando la salida a medida que se produce.
+
+    Genera eventos ``{"event": "output", "stream", "data"}`` y termina con
+    ``{"event": "result", "status", "truncated", "output_bytes", ...}`` junto
+    con las métricas de consumo. Si la salida supera ``max_bytes`` (por
+    defecto ``CODE_EXECUTOR_MAX_OUTPUT_BYTES``) el trabajador la trunca y
+    detiene el programa. Si el limitador del nodo no concede un cupo el
+    stream termina con un error, igual que un fragmento de un lote.
+    """
+    if timeout is None:
+        timeout = settings.CODE_EXECUTOR_TIMEOUT
+
+    syntax_error = check_syntax(code)
+    if syntax_error is not None:
+        yield {
+            "event": "output",
+            "stream": "stderr",
+            "data": syntax_error["output"].lstrip("\n"),
+        }
+        yield _stream_result("error", 0)
+        return
+
+    payload = {
+        "code": code,
+        "stream": True,
+        "limits": _run_limits(max_output_bytes=max_bytes),
+    }
+    messages = _stream(payload, timeout, admission_key)
+
+    total_bytes = 0
+    try:
+        for message in messages:
+            if message is None:
+                yield {"event": "output", "stream": "stderr", "data": _CRASH_MESSAGE}
+                yield _stream_result("error", total_bytes)
+                return
+
+            if message["event"] != "output":
+                execution_status = "error" if message["returncode"] != 0 else "success"
+                yield _stream_result(
+                    execution_status,
+                    message.get("output_bytes", total_bytes),
+                    truncated=message.get("limit_exceeded") == "output",
+                    metrics=message,
+                )
+                return
+
+            total_bytes += len(message["data"].encode("utf-8", "replace"))
+            yield message
+    except ExecutionQueueFull as e:
+        yield {"event": "output", "stream": "stderr", "data": _queue_full_message(e)}
+        yield _stream_result("error", total_bytes)
+    except queue.Empty:
+        yield {"event": "output", "stream": "stderr", "data": _timeout_message(timeout)}
+        yield _stream_result("timeout", total_bytes)
+    finally:
+        messages.close()
+
+
+def _stream_result(execution_status, output_bytes, truncated=False, metrics=None):
+    result = {
+        "event": "result",
+        "status": execution_status,
+        "truncated": truncated,
+        "output_bytes": output_bytes,
+    }
+    for metric in ("limit_exceeded", "cpu_time_ms", "peak_memory_kb"):
+        result[metric] = (metrics or {}).get(metric)
+    return result
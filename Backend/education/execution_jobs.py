@@ -0,0 +1,118 @@
+"""
+Modo asíncrono del ejecutor de código.
+
+Los envíos se guardan en la tabla ``TrabajoEjecucion``, que hace de cola
+(ver job_queue.py): los procesa un pool acotado de hilos del propio proceso
+web o el comando ``process_code_jobs`` en procesos separados.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .admission import ExecutionQueueFull
+from .code_executor import (
+    RESOURCE_METRICS,
+    _queue_full_message,
+    execute_python_code,
+)
+from .job_queue import TableQueue
+from .models import TrabajoEjecucion
+
+logger = logging.getLogger(__name__)
+
+job_queue = TableQueue(
+    TrabajoEjecucion,
+    name="code-job",
+    status_field="estado_trabajo",
+    order_field="fecha_creacion",
+    workers_setting="CODE_EXECUTOR_JOB_WORKERS",
+    stale_after_setting="CODE_EXECUTOR_JOB_STALE_AFTER",
+)
+
+
+def enqueue_job(code, language="python"):
+    """Crea el trabajo y lo despacha al pool local cuando se confirma la transacción."""
+    job = TrabajoEjecucion.objects.create(codigo=code, lenguaje=language)
+    transaction.on_commit(dispatch_jobs)
+    return job
+
+
+def claim_next_job():
+    """Reclama el trabajo pendiente más antiguo. Devuelve ``None`` si no hay ninguno."""
+    return job_queue.claim()
+
+
+def _execute_with_retries(code):
+    # El trabajo ya esperó en una cola: no se descarta al primer rechazo del
+    # limitador del nodo, pero los intentos son finitos para que una
+    # saturación sostenida no deje los hilos del pool ocupados para siempre
+    attempts = max(settings.CODE_EXECUTOR_JOB_ADMISSION_ATTEMPTS, 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            return execute_python_code(code)
+        except ExecutionQueueFull as e:
+            if attempt == attempts:
+                return {
+                    "output": _queue_full_message(e),
+                    "status": "error",
+                    "cached": False,
+                    "error_type": "ExecutionQueueFull",
+                    "error_message": str(e),
+                }
+            time.sleep(e.retry_after)
+
+
+def run_job(job):
+    result = _execute_with_retries(job.codigo)
+    job.salida = result["output"].strip()
+    job.estado_ejecucion = result["status"]
+    job.resultado_en_cache = result["cached"]
+    job.detalle_ejecucion = {
+        key: result.get(key)
+        for key in ("error_type", "error_message", *RESOURCE_METRICS)
+    }
+    job.estado_trabajo = TrabajoEjecucion.FINALIZADO
+    job.fecha_fin = timezone.now()
+    job.save(
+        update_fields=[
+            "salida",
+            "estado_ejecucion",
+            "resultado_en_cache",
+            "detalle_ejecucion",
+            "estado_trabajo",
+            "fecha_fin",
+        ]
+    )
+    return job
+
+
+def process_next_job():
+    """Procesa un trabajo pendiente. Devuelve ``True`` si había alguno."""
+    job = claim_next_job()
+    if job is None:
+        return False
+    try:
+        run_job(job)
+    except Exception as e:
+        logger.error(f"Error procesando el trabajo de ejecución {job.id_trabajo}: {e}")
+        TrabajoEjecucion.objects.filter(id_trabajo=job.id_trabajo).update(
+            estado_trabajo=TrabajoEjecucion.FINALIZADO,
+            estado_ejecucion="error",
+            salida=f"Error inesperado al ejecutar el código: {str(e)}",
+            fecha_fin=timezone.now(),
+        )
+    return True
+
+
+def requeue_stale_jobs():
+    """Devuelve a la cola los trabajos que quedaron en ejecución (p. ej. si el proceso murió)."""
+    return job_queue.requeue_stale()
+
+
+def dispatch_jobs():
+    """Encola una tarea en el pool local. Con 0 hilos solo procesan los comandos externos."""
+    job_queue.dispatch(process_next_job)
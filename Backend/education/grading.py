@@ -0,0 +1,110 @@
+"""
+Calificación automática de ejercicios contra los casos de prueba de una sección.
+
+Todos los casos se ejecutan en un único proceso del sandbox (ver
+``run_test_cases``), no un proceso por caso.
+"""
+
+from django.db import transaction
+
+from .code_executor import run_test_cases
+from .models import InscripcionCurso, ProgresoSeccion
+
+
+def normalize_output(text):
+    # Se ignoran los espacios al final de cada línea y las líneas vacías finales
+    lines = [line.rstrip() for line in (text or "").replace("\r\n", "\n").split("\n")]
+    while lines and not lines[-1]:
+        lines.pop()
+    return "\n".join(lines)
+
+
+def _case_status(case):
+    if case["timed_out"]:
+        return "timeout"
+    if case["returncode"] != 0:
+        return "error"
+    return "success"
+
+
+def grade_submission(
+    seccion, code, estudiante=None, marcar_completado=False, admission_key=None
+):
+    """
+    Ejecuta el código contra todos los casos de prueba de la sección.
+
+    Si todos pasan, ``marcar_completado`` es verdadero y el estudiante está
+    inscrito en el curso, registra el ``ProgresoSeccion`` correspondiente.
+    ``admission_key`` identifica al cliente en el limitador del nodo.
+    """
+    casos = list(seccion.casos_prueba.all())
+    # Puede lanzar ExecutionQueueFull si el nodo está saturado
+    results = run_test_cases(
+        code,
+        [caso.entrada_caso for caso in casos],
+        admission_key=admission_key,
+    )
+
+    resultados = []
+    for index, caso in enumerate(casos):
+        if results is None:
+            # El proceso excedió el tiempo total o terminó inesperadamente
+            resultados.append(
+                {
+                    "id_caso_prueba": caso.id_caso_prueba,
+                    "orden_caso": caso.orden_caso,
+                    "aprobado": False,
+                    "status": "timeout",
+                    "tiempo_ms": None,
+                    "salida_obtenida": "",
+                    "salida_esperada": caso.salida_esperada_caso,
+                }
+            )
+            continue
+
+        case = results[index]
+        execution_status = _case_status(case)
+        output = case["stdout"]
+        if case["stderr"]:
+            output += "\n" + case["stderr"]
+        resultados.append(
+            {
+                "id_caso_prueba": caso.id_caso_prueba,
+                "orden_caso": caso.orden_caso,
+                "aprobado": execution_status == "success"
+                and normalize_output(case["stdout"])
+                == normalize_output(caso.salida_esperada_caso),
+                "status": execution_status,
+                "tiempo_ms": case["time_ms"],
+                "salida_obtenida": output.strip(),
+                "salida_esperada": caso.salida_esperada_caso,
+            }
+        )
+
+    aprobados = sum(1 for resultado in resultados if resultado["aprobado"])
+    todos_aprobados = bool(resultados) and aprobados == len(resultados)
+
+    progreso_registrado = False
+    if todos_aprobados and marcar_completado and estudiante is not None:
+        inscripcion = InscripcionCurso.objects.filter(
+            estudiante_inscripcion=estudiante,
+            curso_inscripcion_id=seccion.seccion_del_curso_id,
+        ).first()
+        if inscripcion is not None:
+            # Progreso y contador de la inscripción en la misma transacción
+            with transaction.atomic():
+                ProgresoSeccion.objects.get_or_create(
+                    estudiante=estudiante,
+                    seccion=seccion,
+                    defaults={"from_inscripcion": inscripcion},
+                )
+            progreso_registrado = True
+
+    return {
+        "seccion": seccion.id_seccion,
+        "total_casos": len(resultados),
+        "casos_aprobados": aprobados,
+        "aprobado": todos_aprobados,
+        "progreso_registrado": progreso_registrado,
+        "resultados": resultados,
+    }
@@ -0,0 +1,112 @@
+"""
+Colas de trabajos sobre tablas de la base de datos.
+
+``TrabajoEjecucion`` (ver execution_jobs.py) y ``AnalisisPrevioSeccion``
+(ver section_analysis.py) hacen de broker local: las filas pendientes son
+los trabajos por hacer. La reclamación es un UPDATE condicional, así que
+funciona igual en SQLite y en PostgreSQL sin servicios externos, y los
+trabajos los procesa un pool acotado de hilos del propio proceso web o un
+comando de gestión en procesos separados.
+
+El modelo debe definir las constantes ``PENDIENTE`` y ``EJECUTANDO`` y el
+campo ``fecha_inicio``.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class TableQueue:
+    def __init__(
+        self,
+        model,
+        name,
+        status_field,
+        order_field,
+        workers_setting,
+        stale_after_setting,
+        match_fields=(),
+    ):
+        self.model = model
+        self.name = name
+        self.status_field = status_field
+        self.order_field = order_field
+        self.workers_setting = workers_setting
+        self.stale_after_setting = stale_after_setting
+        # Campos que deben seguir igual al reclamar (p. ej. la huella del
+        # contenido): si la fila cambió entre la lectura y el UPDATE no se toma
+        self.match_fields = tuple(match_fields)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _in_status(self, status):
+        return {self.status_field: status}
+
+    def claim(self, queryset=None):
+        """Reclama la fila pendiente más antigua. Devuelve ``None`` si no hay ninguna."""
+        pending = self._in_status(self.model.PENDIENTE)
+        while True:
+            row = (
+                self.model.objects.filter(**pending)
+                .order_by(self.order_field)
+                .values_list("pk", *self.match_fields)
+                .first()
+            )
+            if row is None:
+                return None
+
+            pk, *values = row
+            # Solo un ejecutor consigue cambiar el estado; los demás reintentan con la siguiente
+            claimed = self.model.objects.filter(
+                pk=pk, **dict(zip(self.match_fields, values)), **pending
+            ).update(
+                **self._in_status(self.model.EJECUTANDO), fecha_inicio=timezone.now()
+            )
+            if claimed:
+                if queryset is None:
+                    queryset = self.model.objects.all()
+                return queryset.get(pk=pk)
+
+    def requeue_stale(self):
+        """Devuelve a la cola las filas que quedaron en ejecución (p. ej. si el proceso murió)."""
+        limit = timezone.now() - timedelta(
+            seconds=getattr(settings, self.stale_after_setting)
+        )
+        return self.model.objects.filter(
+            **self._in_status(self.model.EJECUTANDO), fecha_inicio__lt=limit
+        ).update(**self._in_status(self.model.PENDIENTE), fecha_inicio=None)
+
+    def _get_executor(self, workers):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=workers, thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    def _process_in_thread(self, process):
+        try:
+            process()
+        except Exception as e:
+            logger.error(f"Error en la cola {self.name}: {e}")
+        finally:
+            # Cada hilo abre su propia conexión; se cierra para no acumularlas
+            connections.close_all()
+
+    def dispatch(self, process):
+        """
+        Encola ``process`` (que procesa una fila) en el pool local. Con 0
+        hilos solo procesan los comandos externos.
+        """
+        workers = getattr(settings, self.workers_setting)
+        if workers > 0:
+            self._get_executor(workers).submit(self._process_in_thread, process)
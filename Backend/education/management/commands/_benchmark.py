@@ -0,0 +1,20 @@
+"""Utilidades compartidas por los comandos de medición (benchmark_*)."""
+
+import math
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano (``values`` ordenados)."""
+    if not values:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(values):
+    """p50/p95/p99 en milisegundos redondeados."""
+    values = sorted(values)
+    return {
+        f"p{pct}_ms": round(percentile(values, pct), 2) if values else None
+        for pct in (50, 95, 99)
+    }
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from education.ai_cache import reset_ai_cache
+from education.ai_service_isolated import ai_service_registry
+from education.mock_llm import MockLLMServer
+
+from ._benchmark import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo hasta el primer token (TTFT) y el tiempo total del "
+        "asistente de IA, con y sin streaming, contra el proveedor simulado "
+        "de education/mock_llm.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.2,
+            help="Segundos que el proveedor simulado tarda en generar el primer token.",
+        )
+        parser.add_argument(
+            "--token-delay",
+            type=float,
+            default=0.02,
+            help="Segundos entre tokens del proveedor simulado.",
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=100,
+            help="Palabras del mensaje (el simulador las repite en la respuesta).",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime los resultados como JSON."
+        )
+
+    def handle(self, *args, **options):
+        message = " ".join(f"palabra{i}" for i in range(options["words"]))
+        server = MockLLMServer(
+            delay=options["delay"], token_delay=options["token_delay"]
+        ).start()
+        # Sin registro de uso: las peticiones de prueba no deben escribir en la BD real
+        overrides = override_settings(
+            GROQ_BASE_URL=server.url,
+            AI_CACHE_BACKEND="",
+            AI_USAGE_ENABLED=False,
+            ALLOWED_HOSTS=["localhost"],
+        )
+        env = mock.patch.dict(os.environ, {"GROQ_API_KEY": "benchmark"})
+        try:
+            with overrides, env:
+                ai_service_registry.reset()
+                reset_ai_cache()
+                report = {
+                    "blocking": self._run(self._blocking, message, options),
+                    "stream": self._run(self._streaming, message, options),
+                }
+        finally:
+            ai_service_registry.reset()
+            reset_ai_cache()
+            server.stop()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for mode, result in report.items():
+            self.stdout.write(
+                f"{mode:<9} TTFT p50 {result['ttft']['p50_ms']} ms, "
+                f"p95 {result['ttft']['p95_ms']} ms | total p50 "
+                f"{result['total']['p50_ms']} ms, p95 {result['total']['p95_ms']} ms"
+            )
+
+    def _run(self, request_fn, message, options):
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(
+                executor.map(lambda _: request_fn(message), range(options["requests"]))
+            )
+        return {
+            "ttft": summarize(ttft for ttft, _ in results),
+            "total": summarize(total for _, total in results),
+        }
+
+    def _blocking(self, message):
+        # Sin streaming el primer token llega con la respuesta completa
+        client = Client(SERVER_NAME="localhost")
+        start = time.perf_counter()
+        client.post(
+            reverse("ai-assistant"),
+            {"message": message},
+            content_type="application/json",
+        )
+        total = (time.perf_counter() - start) * 1000
+        return total, total
+
+    def _streaming(self, message):
+        client = Client(SERVER_NAME="localhost")
+        start = time.perf_counter()
+        response = client.post(
+            reverse("ai-assistant-stream"),
+            {"message": message},
+            content_type="application/json",
+        )
+        ttft = None
+        for chunk in response.streaming_content:
+            if ttft is None and chunk.startswith(b"event: token"):
+                ttft = (time.perf_counter() - start) * 1000
+        total = (time.perf_counter() - start) * 1000
+        return ttft if ttft is not None else total, total
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from education.ai_cache import reset_ai_cache
+from education.ai_service_isolated import ai_service_registry
+from education.mock_llm import MockLLMServer
+
+from ._benchmark import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el rendimiento con peticiones concurrentes del asistente de IA "
+        "síncrono (WSGI, un hilo por petición) y asíncrono (ASGI, un solo event "
+        "loop) contra el servidor simulado de education/mock_llm.py o el "
+        'proveedor "stub" (sin red). Ambas pilas de Django se ejecutan en '
+        "este proceso, sin servidor HTTP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Hilos del lado WSGI (equivale a los hilos de gunicorn por proceso).",
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.5,
+            help="Segundos que tarda el proveedor simulado en responder.",
+        )
+        parser.add_argument(
+            "--provider",
+            choices=["mock", "stub"],
+            default="mock",
+            help=(
+                "mock: proveedor HTTP contra education/mock_llm.py (incluye el "
+                "cliente HTTP); stub: AI_PROVIDER=stub, solo las vistas."
+            ),
+        )
+        parser.add_argument(
+            "--endpoint",
+            choices=["assistant", "code-analysis"],
+            default="assistant",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime los resultados como JSON."
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        if options["provider"] == "stub":
+            provider_settings = {
+                "AI_PROVIDER": "stub",
+                "AI_STUB_DELAY": options["delay"],
+            }
+        else:
+            server = MockLLMServer(delay=options["delay"]).start()
+            provider_settings = {"AI_PROVIDER": "groq", "GROQ_BASE_URL": server.url}
+        # Sin caché ni límite de tasa: cada petición debe llegar al proveedor.
+        # Sin registro de uso: las peticiones de prueba no escriben en la BD real
+        overrides = override_settings(
+            **provider_settings,
+            AI_CACHE_BACKEND="",
+            AI_RATE_LIMIT_PER_MINUTE=0,
+            AI_USAGE_ENABLED=False,
+            ALLOWED_HOSTS=["localhost", "testserver"],
+        )
+        env = mock.patch.dict(os.environ, {"GROQ_API_KEY": "benchmark"})
+        try:
+            with overrides, env:
+                ai_service_registry.reset()
+                reset_ai_cache()
+                report = {
+                    "wsgi": self._wsgi(options),
+                    "asgi": asyncio.run(self._asgi(options)),
+                }
+        finally:
+            ai_service_registry.reset()
+            reset_ai_cache()
+            if server is not None:
+                server.stop()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for mode, result in report.items():
+            self.stdout.write(
+                f"{mode}: {result['throughput_rps']} req/s, "
+                f"p50 {result['latency']['p50_ms']} ms, "
+                f"p95 {result['latency']['p95_ms']} ms, "
+                f"{result['failures']} fallos"
+            )
+
+    def _body(self, index, options):
+        # Peticiones distintas para que ninguna capa pueda reutilizar respuestas
+        if options["endpoint"] == "assistant":
+            return {"message": f"pregunta {index}"}
+        return {"code": f"x = {index}\nprint(x)", "type": "explain"}
+
+    def _wsgi(self, options):
+        url = reverse(f"ai-{options['endpoint']}")
+
+        def request(index):
+            client = Client(SERVER_NAME="localhost")
+            start = time.perf_counter()
+            response = client.post(
+                url, self._body(index, options), content_type="application/json"
+            )
+            return time.perf_counter() - start, self._ok(response)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            results = list(executor.map(request, range(options["requests"])))
+        return self._report(results, time.perf_counter() - start)
+
+    async def _asgi(self, options):
+        url = reverse(f"ai-{options['endpoint']}-async")
+        client = AsyncClient()
+
+        async def request(index):
+            start = time.perf_counter()
+            response = await client.post(
+                url, self._body(index, options), content_type="application/json"
+            )
+            return time.perf_counter() - start, self._ok(response)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(request(index) for index in range(options["requests"]))
+        )
+        return self._report(results, time.perf_counter() - start)
+
+    def _ok(self, response):
+        return response.status_code == 200 and response.json().get("success")
+
+    def _report(self, results, elapsed):
+        return {
+            "requests": len(results),
+            "failures": sum(1 for _, ok in results if not ok),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(results) / elapsed, 1) if elapsed else 0.0,
+            "latency": summarize(seconds * 1000 for seconds, _ in results),
+        }
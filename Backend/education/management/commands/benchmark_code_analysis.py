@@ -0,0 +1,186 @@
+import ast
+import json
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from education.code_analysis import analyze_python_code
+
+from ._benchmark import summarize
+
+# Bloque que se repite para construir entregas grandes; usa builtins,
+# atributos, argumentos, comprensiones e importaciones
+BLOCK = """
+def procesar_{n}(datos, factor=2, *extra, **opciones):
+    resultado = [valor * factor for valor in datos if valor % 2 == 0]
+    total = sum(resultado) + len(extra)
+    for clave, valor in opciones.items():
+        print(f"{{clave}}: {{valor}}", math.sqrt(abs(valor)))
+    return {{"total": total, "maximo": max(resultado, default=0)}}
+
+
+class Registro{n}:
+    def __init__(self, nombre):
+        self.nombre = nombre.strip().title()
+
+    def resumen(self):
+        return self.nombre.upper() + str(procesar_{n}(range(10))["total"])
+
+"""
+
+
+def build_source(lines):
+    """Programa sintácticamente válido de aproximadamente ``lines`` líneas."""
+    parts = ["import math\n"]
+    n = 0
+    while sum(part.count("\n") for part in parts) < lines:
+        parts.append(BLOCK.format(n=n))
+        n += 1
+    return "".join(parts)
+
+
+def regex_analyzer(code):
+    """Analizador anterior a code_analysis.py: un ast.parse y luego expresiones regulares línea a línea."""
+    errors = []
+    warnings = []
+
+    # Verificar sintaxis con AST
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        errors.append(
+            {
+                "type": "SyntaxError",
+                "message": f"Error de sintaxis: {str(e)}",
+                "line": e.lineno,
+                "column": e.offset,
+            }
+        )
+
+    # Análisis básico de variables
+    lines = code.split("\n")
+    defined_variables = set()
+
+    for i, line in enumerate(lines, 1):
+        line_stripped = line.strip()
+
+        # Detectar asignaciones de variables
+        if "=" in line_stripped and not line_stripped.startswith("#"):
+            var_match = re.match(r"\s*(\w+)\s*=", line_stripped)
+            if var_match:
+                defined_variables.add(var_match.group(1))
+
+        # Detectar uso de variables no definidas
+        if line_stripped and not line_stripped.startswith("#"):
+            code_part = line_stripped.split("#")[0].strip()
+            if code_part:
+                words = re.findall(r"\b([a-zA-Z_]\w*)\b", code_part)
+
+                assignment_vars = set()
+                if "=" in code_part and not any(
+                    op in code_part for op in ["==", "!=", "<=", ">="]
+                ):
+                    left_side = code_part.split("=")[0]
+                    assignment_vars.update(re.findall(r"\b([a-zA-Z_]\w*)\b", left_side))
+
+                for word in words:
+                    if (
+                        word
+                        not in [
+                            "self",
+                            "True",
+                            "False",
+                            "None",
+                            "print",
+                            "len",
+                            "str",
+                            "int",
+                            "float",
+                            "list",
+                            "dict",
+                            "range",
+                            "def",
+                            "if",
+                            "else",
+                            "elif",
+                            "for",
+                            "while",
+                            "return",
+                            "import",
+                            "from",
+                            "class",
+                            "append",
+                            "items",
+                        ]
+                        and word not in defined_variables
+                        and word not in assignment_vars
+                        and not word.isdigit()
+                    ):
+
+                        warnings.append(
+                            {
+                                "type": "NameError",
+                                "message": f"Variable '{word}' no está definida",
+                                "line": i,
+                                "suggestion": "Verifica que la variable esté definida correctamente.",
+                            }
+                        )
+
+    return {
+        "errors": errors,
+        "warnings": warnings,
+        "has_issues": len(errors) > 0 or len(warnings) > 0,
+        "defined_variables": list(defined_variables),
+    }
+
+
+ANALYZERS = {"regex": regex_analyzer, "ast": analyze_python_code}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el tiempo y las advertencias del analizador de código por AST "
+        "(education/code_analysis.py) con el anterior basado en expresiones "
+        "regulares, sobre programas generados de distintos tamaños."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 5000],
+            help="Tamaños (en líneas) de los programas a analizar.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime los resultados como JSON."
+        )
+
+    def handle(self, *args, **options):
+        report = {}
+        for lines in options["lines"]:
+            source = build_source(lines)
+            report[lines] = {}
+            for name, analyzer in ANALYZERS.items():
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    result = analyzer(source)
+                    timings.append((time.perf_counter() - start) * 1000)
+                report[lines][name] = {
+                    **summarize(timings),
+                    # El programa es correcto: toda advertencia es un falso positivo
+                    "warnings": len(result["warnings"]),
+                }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for lines, results in report.items():
+            for name, result in results.items():
+                self.stdout.write(
+                    f"{lines:>6} líneas {name:<5} p50 {result['p50_ms']} ms, "
+                    f"{result['warnings']} advertencias"
+                )
@@ -0,0 +1,246 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from education.code_executor import ExecutorPool, SandboxWorker, get_resource_limits
+
+from ._benchmark import summarize
+
+# Programa de cada escenario y estado esperado en la respuesta
+SCENARIOS = {
+    "trivial": ("print('hola')", "success"),
+    "cpu": ("print(sum(i * i for i in range(2_000_000)))", "success"),
+    "large_output": ("for i in range(20_000):\n    print(i)", "success"),
+    "syntax_error": ("print('hola'", "error"),
+    "timeout": ("while True:\n    pass", "timeout"),
+}
+
+ENDPOINTS = {
+    "sync": "execute-code",
+    "stream": "execute-code-stream",
+    "batch": "execute-code-batch",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95/p99), rendimiento y costo de arranque del "
+        "ejecutor de código. Usa el cliente de pruebas de Django o, con --url, "
+        "un servidor local ya iniciado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="URL base de un servidor en ejecución (p. ej. http://localhost:8000).",
+        )
+        parser.add_argument(
+            "--endpoint",
+            choices=sorted(ENDPOINTS),
+            default="sync",
+            help="Variante del ejecutor a medir.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(SCENARIOS),
+            help="Escenarios separados por comas.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            default="1,4,8",
+            help="Niveles de concurrencia separados por comas.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=20,
+            help="Peticiones por escenario y nivel (el escenario timeout hace una sola tanda).",
+        )
+        parser.add_argument(
+            "--allow-cache",
+            action="store_true",
+            help="Repite el mismo código para incluir los aciertos de la caché de resultados.",
+        )
+        parser.add_argument(
+            "--skip-spawn",
+            action="store_true",
+            help="No mide el arranque de intérpretes.",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime los resultados como JSON."
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options["scenarios"].split(",") if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency debe ser una lista de enteros.")
+
+        self.base_url = (options["url"] or "").rstrip("/")
+        self.endpoint = options["endpoint"]
+        self.path = reverse(ENDPOINTS[self.endpoint])
+        self._local = threading.local()
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        self.allow_cache = options["allow_cache"]
+
+        report = {"endpoint": self.endpoint, "runs": []}
+        if not options["skip_spawn"]:
+            report["spawn"] = self._measure_spawn()
+        for scenario in scenarios:
+            for level in levels:
+                total = options["requests"]
+                if scenario == "timeout":
+                    total = level
+                report["runs"].append(self._run_scenario(scenario, level, total))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+
+    def _measure_spawn(self, samples=5):
+        """Compara el arranque de un intérprete nuevo con una ejecución en el pool."""
+        limits = get_resource_limits()
+        cold = []
+        pool = ExecutorPool(size=1, max_runs=samples + 1, limits=limits)
+        try:
+            for _ in range(samples):
+                start = time.perf_counter()
+                worker = SandboxWorker(pool.workdir, limits)
+                try:
+                    worker.run("pass", timeout=10)
+                finally:
+                    worker.close()
+                cold.append((time.perf_counter() - start) * 1000)
+
+            pool.prestart()
+            warm = []
+            for _ in range(samples):
+                start = time.perf_counter()
+                pool.execute("pass", timeout=10)
+                warm.append((time.perf_counter() - start) * 1000)
+        finally:
+            pool.shutdown()
+
+        cold_ms = sorted(cold)[len(cold) // 2]
+        warm_ms = sorted(warm)[len(warm) // 2]
+        return {
+            "cold_ms": round(cold_ms, 2),
+            "warm_ms": round(warm_ms, 2),
+            "overhead_ms": round(cold_ms - warm_ms, 2),
+        }
+
+    def _code(self, scenario):
+        code = SCENARIOS[scenario][0]
+        if self.allow_cache:
+            return code
+        # Un comentario distinto evita que la caché de resultados responda
+        with self._counter_lock:
+            self._counter += 1
+            return f"{code}\n# benchmark {self._counter}"
+
+    def _post(self, payload):
+        """Envía la petición y devuelve (código HTTP, cuerpo de la respuesta)."""
+        body = json.dumps(payload)
+        if self.base_url:
+            request = urllib.request.Request(
+                self.base_url + self.path,
+                data=body.encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    return response.status, response.read().decode("utf-8")
+            except urllib.error.HTTPError as e:
+                return e.code, e.read().decode("utf-8")
+
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client(SERVER_NAME="localhost")
+        response = client.post(self.path, body, content_type="application/json")
+        if response.streaming:
+            content = b"".join(response.streaming_content)
+        else:
+            content = response.content
+        return response.status_code, content.decode("utf-8")
+
+    def _execution_status(self, body):
+        if self.endpoint == "stream":
+            # El último evento SSE es el resultado final
+            last = [block for block in body.split("\n\n") if block][-1]
+            return json.loads(last.split("data: ", 1)[1])["status"]
+        data = json.loads(body)
+        if self.endpoint == "batch":
+            return data[0]["status"]
+        return data["status"]
+
+    def _request(self, scenario):
+        code = self._code(scenario)
+        if self.endpoint == "batch":
+            payload = {"items": [{"code": code, "language": "python"}]}
+        else:
+            payload = {"code": code, "language": "python"}
+
+        start = time.perf_counter()
+        status_code, body = self._post(payload)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ok = False
+        if status_code == 200:
+            try:
+                ok = self._execution_status(body) == SCENARIOS[scenario][1]
+            except (ValueError, KeyError, IndexError):
+                ok = False
+        return elapsed_ms, ok
+
+    def _run_scenario(self, scenario, concurrency, total):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(
+                executor.map(lambda _: self._request(scenario), range(total))
+            )
+        wall = time.perf_counter() - start
+
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": total,
+            "unexpected": sum(1 for _, ok in results if not ok),
+            **summarize(elapsed for elapsed, _ in results),
+            "throughput_rps": round(total / wall, 2),
+        }
+
+    def _print_report(self, report):
+        spawn = report.get("spawn")
+        if spawn:
+            self.stdout.write(
+                f"Arranque de intérprete: frío {spawn['cold_ms']} ms, "
+                f"en el pool {spawn['warm_ms']} ms "
+                f"(sobrecosto {spawn['overhead_ms']} ms)"
+            )
+        self.stdout.write(f"Endpoint: {report['endpoint']}")
+        header = (
+            f"{'escenario':<14}{'conc':>5}{'n':>6}{'fallos':>8}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+        )
+        self.stdout.write(header)
+        for run in report["runs"]:
+            line = (
+                f"{run['scenario']:<14}{run['concurrency']:>5}{run['requests']:>6}"
+                f"{run['unexpected']:>8}{run['p50_ms']:>10}{run['p95_ms']:>10}"
+                f"{run['p99_ms']:>10}{run['throughput_rps']:>9}"
+            )
+            if run["unexpected"]:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
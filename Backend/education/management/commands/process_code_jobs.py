@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from education.execution_jobs import process_next_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de trabajos de ejecución de código (TrabajoEjecucion)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Ejecuciones simultáneas."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.5,
+            help="Segundos de espera cuando la cola está vacía.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"{requeued} trabajos reencolados.")
+
+        self._stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._work, options["poll_interval"], options["once"])
+                for _ in range(workers)
+            ]
+            try:
+                processed = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                self._stop.set()
+                processed = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} trabajos procesados."))
+
+    def _work(self, poll_interval, once):
+        processed = 0
+        try:
+            while not self._stop.is_set():
+                if process_next_job():
+                    processed += 1
+                elif once:
+                    break
+                else:
+                    self._stop.wait(poll_interval)
+            return processed
+        finally:
+            connections.close_all()
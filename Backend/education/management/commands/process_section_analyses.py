@@ -0,0 +1,59 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from education.section_analysis import (
+    process_next_analysis,
+    request_all_sections,
+    requeue_stale_analyses,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera con IA el análisis previo (explicación y errores comunes) de los "
+        "ejercicios de las secciones pendientes (AnalisisPrevioSeccion)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Encola antes las secciones sin análisis o con el análisis desactualizado.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5,
+            help="Segundos de espera cuando la cola está vacía.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa los análisis pendientes y termina.",
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_analyses()
+        if requeued:
+            self.stdout.write(f"{requeued} análisis reencolados.")
+        if options["all"]:
+            self.stdout.write(f"{request_all_sections()} secciones encoladas.")
+
+        # Un solo hilo, el del comando: las llamadas al proveedor ya están
+        # limitadas por la cuota (AI_RATE_LIMIT_PER_MINUTE). Su conexión es la
+        # del propio comando, así que no se cierra aquí
+        stop = threading.Event()
+        processed = 0
+        try:
+            while not stop.is_set():
+                if process_next_analysis():
+                    processed += 1
+                elif options["once"]:
+                    break
+                else:
+                    stop.wait(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} análisis procesados."))
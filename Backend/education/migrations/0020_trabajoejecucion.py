@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 19:29
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0019_certificado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrabajoEjecucion",
+            fields=[
+                (
+                    "id_trabajo",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("codigo", models.TextField()),
+                ("lenguaje", models.CharField(default="python", max_length=50)),
+                (
+                    "estado_trabajo",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("ejecutando", "Ejecutando"),
+                            ("finalizado", "Finalizado"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                    ),
+                ),
+                ("salida", models.TextField(blank=True, default="")),
+                (
+                    "estado_ejecucion",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Estado de la ejecución (e.g., 'success', 'error', 'timeout').",
+                        max_length=20,
+                    ),
+                ),
+                ("resultado_en_cache", models.BooleanField(default=False)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+                ("fecha_inicio", models.DateTimeField(blank=True, null=True)),
+                ("fecha_fin", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Trabajo de Ejecución",
+                "verbose_name_plural": "Trabajos de Ejecución",
+                "ordering": ["fecha_creacion"],
+                "indexes": [
+                    models.Index(
+                        fields=["estado_trabajo", "fecha_creacion"],
+                        name="education_t_estado__87d739_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0020_trabajoejecucion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CasoPrueba",
+            fields=[
+                ("id_caso_prueba", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "entrada_caso",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Texto que el programa recibe por stdin.",
+                    ),
+                ),
+                (
+                    "salida_esperada_caso",
+                    models.TextField(
+                        help_text="Salida estándar esperada para la entrada."
+                    ),
+                ),
+                ("orden_caso", models.PositiveIntegerField(default=0)),
+                (
+                    "seccion",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="casos_prueba",
+                        to="education.seccion",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Caso de Prueba",
+                "verbose_name_plural": "Casos de Prueba",
+                "ordering": ["orden_caso", "id_caso_prueba"],
+            },
+        ),
+    ]
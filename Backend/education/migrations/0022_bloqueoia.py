@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0021_casoprueba"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BloqueoIA",
+            fields=[
+                (
+                    "clave",
+                    models.CharField(max_length=80, primary_key=True, serialize=False),
+                ),
+                ("propietario", models.CharField(max_length=64)),
+                ("expira_en", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Bloqueo de IA",
+                "verbose_name_plural": "Bloqueos de IA",
+            },
+        ),
+    ]
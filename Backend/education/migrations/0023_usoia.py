@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-18 20:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0022_bloqueoia"),
+        ("users", "0003_usuario_tipo_de_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsoIA",
+            fields=[
+                ("id_uso", models.BigAutoField(primary_key=True, serialize=False)),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+                ("endpoint", models.CharField(max_length=50)),
+                ("proveedor", models.CharField(max_length=20)),
+                ("modelo", models.CharField(max_length=100)),
+                (
+                    "tokens_prompt",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Tokens enviados al proveedor (0 si no se le llamó).",
+                    ),
+                ),
+                ("tokens_respuesta", models.PositiveIntegerField(default=0)),
+                ("latencia_ms", models.PositiveIntegerField(default=0)),
+                ("desde_cache", models.BooleanField(default=False)),
+                (
+                    "compartida",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Respuesta de otra petición idéntica en curso.",
+                    ),
+                ),
+                (
+                    "resultado",
+                    models.CharField(
+                        choices=[
+                            ("exito", "Éxito"),
+                            ("error", "Error"),
+                            (
+                                "rechazada",
+                                "Rechazada (límite de tasa o circuito abierto)",
+                            ),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "curso",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="education.curso",
+                    ),
+                ),
+                (
+                    "estudiante",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="users.estudiante",
+                    ),
+                ),
+                (
+                    "seccion",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="education.seccion",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Uso de IA",
+                "verbose_name_plural": "Usos de IA",
+                "indexes": [
+                    models.Index(fields=["fecha"], name="education_u_fecha_2f9ed8_idx")
+                ],
+            },
+        ),
+    ]
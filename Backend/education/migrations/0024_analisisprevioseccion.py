@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 20:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0023_usoia"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalisisPrevioSeccion",
+            fields=[
+                (
+                    "seccion",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="analisis_previo",
+                        serialize=False,
+                        to="education.seccion",
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("ejecutando", "Ejecutando"),
+                            ("finalizado", "Finalizado"),
+                            ("error", "Error"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "huella",
+                    models.CharField(
+                        help_text="Hash del contenido analizado; si cambia se vuelve a generar.",
+                        max_length=64,
+                    ),
+                ),
+                ("explicacion", models.TextField(blank=True, default="")),
+                ("errores_comunes", models.TextField(blank=True, default="")),
+                ("modelo", models.CharField(blank=True, default="", max_length=100)),
+                ("error", models.TextField(blank=True, default="")),
+                (
+                    "fecha_solicitud",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("fecha_inicio", models.DateTimeField(blank=True, null=True)),
+                ("fecha_fin", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Análisis previo de sección",
+                "verbose_name_plural": "Análisis previos de secciones",
+                "indexes": [
+                    models.Index(
+                        fields=["estado", "fecha_solicitud"],
+                        name="education_a_estado_839812_idx",
+                    )
+                ],
+            },
+        ),
+    ]
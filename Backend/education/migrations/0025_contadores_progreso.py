@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0024_analisisprevioseccion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="curso",
+            name="total_secciones",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Número de secciones del curso."
+            ),
+        ),
+        migrations.AddField(
+            model_name="inscripcioncurso",
+            name="secciones_completadas",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Secciones del curso completadas por el estudiante.",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def _count(queryset, group_field):
+    # COUNT(*) correlacionado, agrupado por ``group_field``
+    return Coalesce(
+        Subquery(
+            queryset.values(group_field).annotate(total=Count("*")).values("total")[:1]
+        ),
+        Value(0),
+    )
+
+
+def rellenar_contadores(apps, schema_editor):
+    Curso = apps.get_model("education", "Curso")
+    Seccion = apps.get_model("education", "Seccion")
+    InscripcionCurso = apps.get_model("education", "InscripcionCurso")
+    ProgresoSeccion = apps.get_model("education", "ProgresoSeccion")
+
+    # Un UPDATE por tabla, sin recorrer filas en Python
+    Curso.objects.update(
+        total_secciones=_count(
+            Seccion.objects.filter(seccion_del_curso=OuterRef("pk")),
+            "seccion_del_curso",
+        )
+    )
+    InscripcionCurso.objects.update(
+        secciones_completadas=_count(
+            # Igual que el recuento de InscripcionCurso.recalcular_progreso_curso
+            ProgresoSeccion.objects.filter(from_inscripcion=OuterRef("pk")),
+            "from_inscripcion",
+        )
+    )
+    # Porcentaje y estado a partir de los contadores (mismo cálculo que
+    # InscripcionCurso.recalcular_progreso)
+    total = Subquery(
+        Curso.objects.filter(pk=OuterRef("curso_inscripcion")).values(
+            "total_secciones"
+        )[:1]
+    )
+    InscripcionCurso.objects.filter(curso_inscripcion__total_secciones__gt=0).update(
+        porcentaje_progreso=Round(
+            Cast(F("secciones_completadas"), FloatField()) * Value(100.0) / total, 2
+        ),
+        completado=Case(
+            When(secciones_completadas__gte=total, then=Value(True)),
+            default=Value(False),
+        ),
+    )
+    InscripcionCurso.objects.filter(curso_inscripcion__total_secciones=0).update(
+        porcentaje_progreso=0.0, completado=False
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0025_contadores_progreso"),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
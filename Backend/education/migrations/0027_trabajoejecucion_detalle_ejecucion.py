@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("education", "0026_rellenar_contadores_progreso"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajoejecucion",
+            name="detalle_ejecucion",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
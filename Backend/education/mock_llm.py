@@ -0,0 +1,180 @@
+"""
+Servidor LLM simulado para pruebas y mediciones locales.
+
+Implementa ``POST /chat/completions`` con el formato de la API compatible con
+OpenAI que usa Groq, sin red ni claves. Cada respuesta repite el último
+mensaje del usuario y se puede añadir una latencia artificial. Con
+``"stream": true`` responde token a token como Server-Sent Events.
+
+Uso::
+
+    with MockLLMServer(delay=0.2) as server:
+        # settings.GROQ_BASE_URL = server.url
+        ...
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def mock_reply(messages):
+    """Texto que devuelve el servidor simulado para una lista de mensajes."""
+    last_user = next(
+        (m["content"] for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    return f"Respuesta simulada: {last_user}"
+
+
+def split_tokens(content):
+    """Fragmentos (palabra y espacios siguientes) en que se envía una respuesta."""
+    return re.findall(r"\S+\s*", content) or [content]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with server.lock:
+            server.requests.append(body)
+            server.connections.add(self.client_address)
+
+        if server.status_code != 200 and (
+            not server.fail_first or len(server.requests) <= server.fail_first
+        ):
+            self._send_json(
+                server.status_code, {"error": {"message": "Error simulado"}}
+            )
+            return
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        content = mock_reply(body.get("messages", []))
+        if body.get("stream"):
+            self._send_stream(body, content)
+            return
+        if server.token_delay:
+            # Sin streaming la respuesta llega cuando se generó el último token
+            time.sleep(server.token_delay * (len(split_tokens(content)) - 1))
+        self._send_json(
+            200,
+            {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": sum(
+                        len(m.get("content", "").split())
+                        for m in body.get("messages", [])
+                    ),
+                    "completion_tokens": len(content.split()),
+                    "total_tokens": 0,
+                },
+            },
+        )
+
+    def _send_stream(self, body, content):
+        # Formato SSE de la API de OpenAI: un "delta" por token y "[DONE]" al final
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, token in enumerate(split_tokens(content)):
+            if index and self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": token}}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status_code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Servidor HTTP en un hilo de fondo; ``url`` es la base para ``GROQ_BASE_URL``."""
+
+    daemon_threads = True
+    # Los benchmarks abren cientos de conexiones a la vez
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        delay=0.0,
+        token_delay=0.0,
+        status_code=200,
+        fail_first=0,
+    ):
+        super().__init__((host, port), _Handler)
+        # Espera antes de responder (o antes del primer token) y entre tokens
+        self.delay = delay
+        self.token_delay = token_delay
+        self.status_code = status_code
+        # Con status_code de error: solo las primeras N peticiones fallan (0 = todas)
+        self.fail_first = fail_first
+        self.requests = []
+        # Direcciones de los clientes: permite comprobar que se reutiliza la conexión
+        self.connections = set()
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Los clientes cierran conexiones keep-alive inactivas; no es un error
+        pass
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,8 +1,27 @@
-from django.db import models
+import uuid
+from django.conf import settings
+from django.db import models, transaction
 from datetime import timedelta
-from django.db.models import Sum, Avg
-from django.db.models.signals import post_save, post_delete
+from django.db.models import (
+    Sum,
+    Avg,
+    Case,
+    Count,
+    F,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
+from django.db.models.lookups import (
+    GreaterThan,
+    GreaterThanOrEqual,
+    LessThanOrEqual,
+)
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from users.models import Admin, Docente, Estudiante
 
 
@@ -96,6 +115,10 @@ class Curso(models.Model):
     dificultad_curso = models.ForeignKey(
         DificultadCurso, on_delete=models.SET_NULL, null=True, blank=True
     )
+    # Contador desnormalizado: se actualiza con F() al crear o borrar secciones
+    total_secciones = models.PositiveIntegerField(
+        default=0, help_text="Número de secciones del curso."
+    )
 
     def __str__(self):
         return self.nombre_curso
@@ -133,6 +156,36 @@ class EstudianteInstitucion(models.Model):
         return f"Estudiante {self.estudiante_id.user_id.username_user} en Institución {self.institucion_id.nombre_institucion}"
 
 
+def _total_secciones_del_curso():
+    # Total de secciones del curso de la inscripción, leído en la misma sentencia
+    return Subquery(
+        Curso.objects.filter(pk=OuterRef("curso_inscripcion")).values(
+            "total_secciones"
+        )[:1]
+    )
+
+
+def _progreso_desde_contador(completadas, total):
+    # Porcentaje y estado de una inscripción a partir de su contador de
+    # secciones completadas (mismo cálculo que recalcular_progreso)
+    return {
+        "porcentaje_progreso": Case(
+            When(
+                GreaterThan(total, Value(0)),
+                then=Round(
+                    Cast(completadas, models.FloatField()) * Value(100.0) / total, 2
+                ),
+            ),
+            default=Value(0.0),
+        ),
+        "completado": Case(
+            When(LessThanOrEqual(total, Value(0)), then=Value(False)),
+            When(GreaterThanOrEqual(completadas, total), then=Value(True)),
+            default=Value(False),
+        ),
+    }
+
+
 class InscripcionCurso(models.Model):
     id_inscripcion = models.AutoField(primary_key=True)
     estudiante_inscripcion = models.ForeignKey(
@@ -144,11 +197,89 @@ class InscripcionCurso(models.Model):
         default=0.0, help_text="Porcentaje de secciones completadas en este curso."
     )
     completado = models.BooleanField(default=False)
+    # Contador desnormalizado: se actualiza con F() al crear o borrar progresos
+    secciones_completadas = models.PositiveIntegerField(
+        default=0, help_text="Secciones del curso completadas por el estudiante."
+    )
 
     def __str__(self):
         return f"{self.estudiante} en {self.curso}"
 
+    @classmethod
+    def sumar_secciones_completadas(cls, id_inscripcion, delta):
+        """
+        Suma ``delta`` a las secciones completadas de la inscripción y
+        actualiza porcentaje y estado en un solo UPDATE con expresiones F, sin
+        contar las secciones del curso ni el progreso del estudiante. El
+        total de secciones se lee en el mismo UPDATE, así que una sección
+        añadida o borrada a la vez no deja un porcentaje desfasado.
+        """
+        completadas = Greatest(F("secciones_completadas") + delta, Value(0))
+        return cls.objects.filter(pk=id_inscripcion).update(
+            secciones_completadas=completadas,
+            **_progreso_desde_contador(completadas, _total_secciones_del_curso()),
+        )
+
+    @classmethod
+    def recalcular_progreso_curso(cls, id_curso, recontar=False, ids=None):
+        """
+        Recalcula porcentaje y estado de todas las inscripciones del curso
+        (p. ej. tras añadir o borrar una sección), o solo de las ``ids``
+        indicadas, con UPDATE por lotes de ``PROGRESS_RECALC_BATCH_SIZE``
+        filas, sin cargarlas en Python. Con ``recontar`` también vuelve a
+        contar sus secciones completadas. Devuelve cuántas inscripciones se
+        actualizaron.
+        """
+        if recontar:
+            # Solo las secciones que siguen en el curso: una sección movida a
+            # otro curso conserva el progreso que apunta a la inscripción antigua
+            completadas = Coalesce(
+                Subquery(
+                    ProgresoSeccion.objects.filter(
+                        from_inscripcion=OuterRef("pk"),
+                        seccion__seccion_del_curso=OuterRef("curso_inscripcion"),
+                    )
+                    .values("from_inscripcion")
+                    .annotate(total=Count("*"))
+                    .values("total")[:1]
+                ),
+                Value(0),
+            )
+            campos = {"secciones_completadas": completadas}
+        else:
+            completadas = F("secciones_completadas")
+            campos = {}
+        campos.update(
+            _progreso_desde_contador(completadas, _total_secciones_del_curso())
+        )
+
+        # Lotes por rango de clave primaria: cada UPDATE bloquea pocas filas y
+        # los cursos con decenas de miles de inscripciones no retienen la
+        # tabla durante todo el recálculo
+        inscripciones = cls.objects.filter(curso_inscripcion_id=id_curso)
+        if ids is not None:
+            inscripciones = inscripciones.filter(pk__in=ids)
+        batch_size = max(settings.PROGRESS_RECALC_BATCH_SIZE, 1)
+        actualizadas = 0
+        ultima = None
+        while True:
+            lote = inscripciones
+            if ultima is not None:
+                lote = lote.filter(pk__gt=ultima)
+            limite = (
+                lote.order_by("pk")
+                .values_list("pk", flat=True)[batch_size - 1 : batch_size]
+                .first()
+            )
+            if limite is not None:
+                lote = lote.filter(pk__lte=limite)
+            actualizadas += lote.update(**campos)
+            if limite is None:
+                return actualizadas
+            ultima = limite
+
     def recalcular_progreso(self):
+        # Recuento completo; el flujo normal usa sumar_secciones_completadas
         total_secciones = self.curso_inscripcion.secciones.count()
         secciones_completadas = self.estudiante_inscripcion.progreso_secciones.filter(
             seccion__seccion_del_curso=self.curso_inscripcion
@@ -161,8 +292,10 @@ class InscripcionCurso(models.Model):
 
         original_porcentaje = self.porcentaje_progreso
         original_completado = self.completado
+        original_completadas = self.secciones_completadas
 
         self.porcentaje_progreso = round(nuevo_porcentaje, 2)
+        self.secciones_completadas = secciones_completadas
 
         if nuevo_porcentaje >= 100:
             self.completado = True
@@ -174,8 +307,15 @@ class InscripcionCurso(models.Model):
         if (
             self.porcentaje_progreso != original_porcentaje
             or self.completado != original_completado
+            or self.secciones_completadas != original_completadas
         ):
-            self.save(update_fields=["porcentaje_progreso", "completado"])
+            self.save(
+                update_fields=[
+                    "porcentaje_progreso",
+                    "completado",
+                    "secciones_completadas",
+                ]
+            )
             print(
                 f"DEBUG: Inscripción {self.id_inscripcion} actualizada. Nuevo porcentaje: {self.porcentaje_progreso}%, Completado: {self.completado}"
             )
@@ -234,6 +374,29 @@ class Seccion(models.Model):
         return self.nombre_seccion
 
 
+class CasoPrueba(models.Model):
+    # Caso de prueba (entrada/salida esperada) del ejercicio de una sección
+    id_caso_prueba = models.AutoField(primary_key=True)
+    seccion = models.ForeignKey(
+        Seccion, on_delete=models.CASCADE, related_name="casos_prueba"
+    )
+    entrada_caso = models.TextField(
+        blank=True, default="", help_text="Texto que el programa recibe por stdin."
+    )
+    salida_esperada_caso = models.TextField(
+        help_text="Salida estándar esperada para la entrada."
+    )
+    orden_caso = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Caso de Prueba"
+        verbose_name_plural = "Casos de Prueba"
+        ordering = ["orden_caso", "id_caso_prueba"]
+
+    def __str__(self):
+        return f"Caso {self.orden_caso} de {self.seccion.nombre_seccion}"
+
+
 class ProgresoSeccion(models.Model):
     id_progreso_seccion = models.AutoField(primary_key=True)
     from_inscripcion = models.ForeignKey(
@@ -251,6 +414,12 @@ class ProgresoSeccion(models.Model):
         auto_now_add=True, help_text="Fecha y hora en que la sección fue completada."
     )
 
+    # Resultado de cada par en completar_en_lote
+    COMPLETADA = "completada"
+    YA_COMPLETADA = "ya_completada"
+    SIN_INSCRIPCION = "sin_inscripcion"
+    SECCION_INEXISTENTE = "seccion_inexistente"
+
     class Meta:
         unique_together = ("estudiante", "seccion")
         verbose_name = "Progreso de Sección"
@@ -259,6 +428,73 @@ class ProgresoSeccion(models.Model):
     def __str__(self):
         return f"Progreso de {self.estudiante.user_id.username_user} en {self.seccion.titulo_seccion}"
 
+    @classmethod
+    def completar_en_lote(cls, pares):
+        """
+        Marca como completados muchos pares ``(id_estudiante, id_seccion)``
+        con un número fijo de consultas: secciones, inscripciones y progresos
+        previos en una consulta cada uno, un ``bulk_create`` que ignora los
+        duplicados de (estudiante, sección) y un recuento por curso de las
+        inscripciones afectadas. Devuelve el resultado de cada par en orden.
+        """
+        pares = [(int(estudiante), int(seccion)) for estudiante, seccion in pares]
+        id_estudiantes = {estudiante for estudiante, _ in pares}
+        cursos_de_seccion = dict(
+            Seccion.objects.filter(
+                pk__in={seccion for _, seccion in pares}
+            ).values_list("pk", "seccion_del_curso_id")
+        )
+        inscripciones = {
+            (estudiante, curso): id_inscripcion
+            for id_inscripcion, estudiante, curso in InscripcionCurso.objects.filter(
+                estudiante_inscripcion_id__in=id_estudiantes,
+                curso_inscripcion_id__in=set(cursos_de_seccion.values()),
+            ).values_list("pk", "estudiante_inscripcion_id", "curso_inscripcion_id")
+        }
+        existentes = set(
+            cls.objects.filter(
+                estudiante_id__in=id_estudiantes, seccion_id__in=cursos_de_seccion
+            ).values_list("estudiante_id", "seccion_id")
+        )
+
+        resultados = {}
+        nuevos = []
+        afectadas = {}
+        for estudiante, seccion in pares:
+            if (estudiante, seccion) in resultados:
+                continue
+            curso = cursos_de_seccion.get(seccion)
+            id_inscripcion = inscripciones.get((estudiante, curso))
+            if curso is None:
+                resultado = cls.SECCION_INEXISTENTE
+            elif id_inscripcion is None:
+                resultado = cls.SIN_INSCRIPCION
+            elif (estudiante, seccion) in existentes:
+                resultado = cls.YA_COMPLETADA
+            else:
+                resultado = cls.COMPLETADA
+                nuevos.append(
+                    cls(
+                        estudiante_id=estudiante,
+                        seccion_id=seccion,
+                        from_inscripcion_id=id_inscripcion,
+                    )
+                )
+                afectadas.setdefault(curso, set()).add(id_inscripcion)
+            resultados[(estudiante, seccion)] = resultado
+
+        if nuevos:
+            # bulk_create no envía post_save: los contadores se recuentan una
+            # sola vez por inscripción, también si otra petición ya insertó
+            # alguno de los pares
+            with transaction.atomic():
+                cls.objects.bulk_create(nuevos, ignore_conflicts=True)
+                for curso, ids in afectadas.items():
+                    InscripcionCurso.recalcular_progreso_curso(
+                        curso, recontar=True, ids=ids
+                    )
+        return [resultados[par] for par in pares]
+
 
 class Certificado(models.Model):
     id_certificado = models.AutoField(primary_key=True)
@@ -338,6 +574,173 @@ class Comentario(models.Model):
         verbose_name_plural = "Comentarios de Curso"
 
 
+class TrabajoEjecucion(models.Model):
+    # Cola de ejecuciones asíncronas: la tabla hace de broker local
+    PENDIENTE = "pendiente"
+    EJECUTANDO = "ejecutando"
+    FINALIZADO = "finalizado"
+    ESTADOS_TRABAJO = [
+        (PENDIENTE, "Pendiente"),
+        (EJECUTANDO, "Ejecutando"),
+        (FINALIZADO, "Finalizado"),
+    ]
+
+    id_trabajo = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    codigo = models.TextField()
+    lenguaje = models.CharField(max_length=50, default="python")
+    estado_trabajo = models.CharField(
+        max_length=20, choices=ESTADOS_TRABAJO, default=PENDIENTE
+    )
+    salida = models.TextField(blank=True, default="")
+    estado_ejecucion = models.CharField(
+        max_length=20,
+        blank=True,
+        default="",
+        help_text="Estado de la ejecución (e.g., 'success', 'error', 'timeout').",
+    )
+    resultado_en_cache = models.BooleanField(default=False)
+    # Resto del resultado de execute-code/ (tipo y mensaje de error y
+    # consumo de recursos), con las mismas claves
+    detalle_ejecucion = models.JSONField(default=dict, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Trabajo de Ejecución"
+        verbose_name_plural = "Trabajos de Ejecución"
+        ordering = ["fecha_creacion"]
+        indexes = [models.Index(fields=["estado_trabajo", "fecha_creacion"])]
+
+    def __str__(self):
+        return f"Trabajo {self.id_trabajo} ({self.estado_trabajo})"
+
+
+class BloqueoIA(models.Model):
+    # Un prompt en curso por fila: el proceso que inserta la clave llama al
+    # proveedor y los demás esperan su respuesta en la caché compartida
+    clave = models.CharField(max_length=80, primary_key=True)
+    propietario = models.CharField(max_length=64)
+    expira_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Bloqueo de IA"
+        verbose_name_plural = "Bloqueos de IA"
+
+    def __str__(self):
+        return f"{self.clave} ({self.propietario})"
+
+
+class UsoIA(models.Model):
+    # Una fila por llamada a un endpoint de IA. Solo se inserta (en lotes,
+    # ver ai_usage.py) y se consulta agregada en ai-usage/
+    EXITO = "exito"
+    ERROR = "error"
+    RECHAZADA = "rechazada"
+    RESULTADOS = [
+        (EXITO, "Éxito"),
+        (ERROR, "Error"),
+        (RECHAZADA, "Rechazada (límite de tasa o circuito abierto)"),
+    ]
+
+    id_uso = models.BigAutoField(primary_key=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    endpoint = models.CharField(max_length=50)
+    proveedor = models.CharField(max_length=20)
+    modelo = models.CharField(max_length=100)
+    tokens_prompt = models.PositiveIntegerField(
+        default=0, help_text="Tokens enviados al proveedor (0 si no se le llamó)."
+    )
+    tokens_respuesta = models.PositiveIntegerField(default=0)
+    latencia_ms = models.PositiveIntegerField(default=0)
+    desde_cache = models.BooleanField(default=False)
+    compartida = models.BooleanField(
+        default=False, help_text="Respuesta de otra petición idéntica en curso."
+    )
+    resultado = models.CharField(max_length=20, choices=RESULTADOS)
+    # Sin restricción de clave foránea: los ids vienen del cliente y el
+    # registro se conserva aunque se borre el curso, la sección o el estudiante
+    curso = models.ForeignKey(
+        Curso,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    seccion = models.ForeignKey(
+        Seccion,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    estudiante = models.ForeignKey(
+        Estudiante,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    class Meta:
+        verbose_name = "Uso de IA"
+        verbose_name_plural = "Usos de IA"
+        indexes = [models.Index(fields=["fecha"])]
+
+    def __str__(self):
+        return (
+            f"{self.endpoint} {self.modelo} ({self.resultado}, {self.latencia_ms} ms)"
+        )
+
+
+class AnalisisPrevioSeccion(models.Model):
+    # Explicación y errores comunes del ejercicio de una sección, generados
+    # por la IA en segundo plano (ver section_analysis.py). La tabla también
+    # hace de cola: las filas pendientes son los trabajos por hacer
+    PENDIENTE = "pendiente"
+    EJECUTANDO = "ejecutando"
+    FINALIZADO = "finalizado"
+    ERROR = "error"
+    ESTADOS_ANALISIS = [
+        (PENDIENTE, "Pendiente"),
+        (EJECUTANDO, "Ejecutando"),
+        (FINALIZADO, "Finalizado"),
+        (ERROR, "Error"),
+    ]
+
+    seccion = models.OneToOneField(
+        Seccion,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="analisis_previo",
+    )
+    estado = models.CharField(
+        max_length=20, choices=ESTADOS_ANALISIS, default=PENDIENTE
+    )
+    huella = models.CharField(
+        max_length=64,
+        help_text="Hash del contenido analizado; si cambia se vuelve a generar.",
+    )
+    explicacion = models.TextField(blank=True, default="")
+    errores_comunes = models.TextField(blank=True, default="")
+    modelo = models.CharField(max_length=100, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    fecha_solicitud = models.DateTimeField(default=timezone.now)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Análisis previo de sección"
+        verbose_name_plural = "Análisis previos de secciones"
+        indexes = [models.Index(fields=["estado", "fecha_solicitud"])]
+
+    def __str__(self):
+        return f"Análisis previo de {self.seccion_id} ({self.estado})"
+
+
 # SIGNALS for models
 @receiver(post_save, sender=Seccion)
 def update_curso_duration_on_seccion_save(sender, instance, **kwargs):
@@ -345,12 +748,100 @@ def update_curso_duration_on_seccion_save(sender, instance, **kwargs):
         instance.seccion_del_curso.calcular_y_actualizar_duracion()
 
 
+@receiver(post_save, sender=Seccion)
+def solicitar_analisis_previo_on_seccion_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .section_analysis import request_section_analysis
+
+    request_section_analysis(instance)
+
+
+@receiver(post_save, sender=Recurso)
+def solicitar_analisis_previo_on_recurso_save(sender, instance, raw=False, **kwargs):
+    # Las instrucciones del ejercicio viven en el recurso, no en la sección
+    if raw:
+        return
+    from .section_analysis import request_section_analysis
+
+    for seccion in Seccion.objects.filter(instruccion_ejecutor_seccion=instance):
+        request_section_analysis(seccion)
+
+
 @receiver(post_delete, sender=Seccion)
 def update_curso_duration_on_seccion_delete(sender, instance, **kwargs):
     if instance.seccion_del_curso:
         instance.seccion_del_curso.calcular_y_actualizar_duracion()
 
 
+def _modelo_origen(origin):
+    # ``origin`` de post_delete: la instancia o el QuerySet cuyo borrado se pidió
+    return origin.model if isinstance(origin, models.QuerySet) else type(origin)
+
+
+def _recalcular_progreso_al_confirmar(id_curso, recontar=False):
+    # Fuera de la transacción que añade o borra la sección: cada lote se
+    # confirma por separado
+    transaction.on_commit(
+        lambda: InscripcionCurso.recalcular_progreso_curso(id_curso, recontar)
+    )
+
+
+@receiver(pre_save, sender=Seccion)
+def recordar_curso_anterior_seccion(sender, instance, raw=False, **kwargs):
+    # Curso en el que estaba la sección antes de guardarla, para detectar si
+    # se movió a otro curso (ver contar_seccion_creada)
+    instance._curso_anterior_id = None
+    if raw or instance._state.adding:
+        return
+    instance._curso_anterior_id = (
+        Seccion.objects.filter(pk=instance.pk)
+        .values_list("seccion_del_curso_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Seccion)
+def contar_seccion_creada(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Curso.objects.filter(pk=instance.seccion_del_curso_id).update(
+            total_secciones=F("total_secciones") + 1
+        )
+        _recalcular_progreso_al_confirmar(instance.seccion_del_curso_id)
+        return
+
+    anterior = getattr(instance, "_curso_anterior_id", None)
+    if anterior is None or anterior == instance.seccion_del_curso_id:
+        return
+    # La sección pasó a otro curso: se descuenta del anterior y se suma al nuevo
+    Curso.objects.filter(pk=anterior).update(
+        total_secciones=Greatest(F("total_secciones") - 1, Value(0))
+    )
+    Curso.objects.filter(pk=instance.seccion_del_curso_id).update(
+        total_secciones=F("total_secciones") + 1
+    )
+    curso_anterior = Curso.objects.filter(pk=anterior).first()
+    if curso_anterior is not None:
+        curso_anterior.calcular_y_actualizar_duracion()
+    # El progreso de la sección apunta a inscripciones del curso anterior
+    _recalcular_progreso_al_confirmar(anterior, recontar=True)
+    _recalcular_progreso_al_confirmar(instance.seccion_del_curso_id, recontar=True)
+
+
+@receiver(post_delete, sender=Seccion)
+def contar_seccion_eliminada(sender, instance, origin=None, **kwargs):
+    # Si se borra el curso entero sus inscripciones desaparecen también
+    if origin is not None and issubclass(_modelo_origen(origin), Curso):
+        return
+    Curso.objects.filter(pk=instance.seccion_del_curso_id).update(
+        total_secciones=Greatest(F("total_secciones") - 1, Value(0))
+    )
+    # El progreso de la sección se borró en cascada sin tocar los contadores
+    _recalcular_progreso_al_confirmar(instance.seccion_del_curso_id, recontar=True)
+
+
 @receiver(post_save, sender=Comentario)
 def comentario_creado_o_actualizado(sender, instance, created, **kwargs):
     if instance.curso:
@@ -365,37 +856,16 @@ def comentario_eliminado(sender, instance, **kwargs):
 
 @receiver(post_save, sender=ProgresoSeccion)
 def progreso_seccion_creado_o_actualizado(sender, instance, created, **kwargs):
-    inscripcion = instance.from_inscripcion
-
-    if inscripcion:
-        try:
-            inscripcion.recalcular_progreso()
-        except Exception as e:
-            print(
-                f"Error al recalcular progreso para InscripcionCurso ID {inscripcion.id_inscripcion}. "
-                f"Estudiante: {inscripcion.estudiante_inscripcion.user_id.username_user}, "
-                f"Curso: {inscripcion.curso_inscripcion.nombre_curso}. Error: {e}"
-            )
-    else:
-        print(
-            f"Advertencia: ProgresoSeccion ID {instance.id_progreso_seccion} se creó sin una InscripcionCurso válida."
-        )
+    # Solo cambia el número de secciones completadas al crear el progreso
+    if not created:
+        return
+    InscripcionCurso.sumar_secciones_completadas(instance.from_inscripcion_id, 1)
 
 
 @receiver(post_delete, sender=ProgresoSeccion)
-def progreso_seccion_eliminado(sender, instance, **kwargs):
-    inscripcion = instance.from_inscripcion
-
-    if inscripcion:
-        try:
-            inscripcion.recalcular_progreso()
-        except Exception as e:
-            print(
-                f"Error al recalcular progreso para InscripcionCurso ID {inscripcion.id_inscripcion}. "
-                f"Estudiante: {inscripcion.estudiante_inscripcion.user_id.username_user}, "
-                f"Curso: {inscripcion.curso_inscripcion.nombre_curso}. Error: {e}"
-            )
-    else:
-        print(
-            f"Advertencia: ProgresoSeccion ID {instance.id_progreso_seccion} se creó sin una InscripcionCurso válida."
-        )
+def progreso_seccion_eliminado(sender, instance, origin=None, **kwargs):
+    # En un borrado en cascada (sección, inscripción, estudiante...) quien
+    # origina el borrado recalcula en bloque; no se descuenta fila por fila
+    if origin is not None and _modelo_origen(origin) is not ProgresoSeccion:
+        return
+    InscripcionCurso.sumar_secciones_completadas(instance.from_inscripcion_id, -1)
@@ -0,0 +1,440 @@
+"""
+Proceso trabajador del ejecutor de código.
+
+Se lanza con ``python -I`` y se mantiene vivo entre ejecuciones: lee una
+petición JSON por línea desde stdin, ejecuta el código en un namespace nuevo
+y responde con otra línea JSON por stdout. Solo usa la biblioteca estándar.
+
+Cada ejecución recibe su propia copia de los builtins y, al terminar, se
+restaura el estado global del intérprete (``builtins``, ``sys.modules``,
+``sys.path``, ganchos de importación, ``linecache``, variables de entorno y
+manejadores de señales), de modo que el código de un estudiante no altera
+el resultado del siguiente. Los hilos que el código deja en marcha no se
+pueden detener: la respuesta indica cuántos quedan (``threads_left``) y el
+proceso padre descarta el trabajador en lugar de reutilizarlo.
+
+El primer argumento es un JSON con los límites de recursos del proceso y
+cada petición puede traer en ``limits`` los de esa ejecución (ver
+``code_executor.get_resource_limits``). Cada respuesta incluye el tiempo de
+CPU, el pico de memoria y los bytes de salida de esa ejecución.
+"""
+
+import _thread
+import builtins
+import io
+import json
+import linecache
+import math
+import os
+import signal
+import sys
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FILENAME = "<string>"
+
+
+# Excepciones internas: heredan de BaseException para que un
+# "except Exception" del estudiante no las capture
+class _CaseTimeout(BaseException):
+    pass
+
+
+class _CPULimitExceeded(BaseException):
+    pass
+
+
+class _OutputLimitExceeded(BaseException):
+    pass
+
+
+def _raise_case_timeout(signum, frame):
+    raise _CaseTimeout()
+
+
+def _raise_cpu_limit(signum, frame):
+    raise _CPULimitExceeded()
+
+
+class _OutputBudget:
+    """Bytes de salida (stdout + stderr) disponibles para una ejecución."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.exceeded = False
+
+    def take(self, text, counted=True):
+        # Devuelve la parte del texto que cabe en el presupuesto
+        if not counted:
+            return text
+        data = text.encode("utf-8", "replace")
+        if not self.limit or self.used + len(data) <= self.limit:
+            self.used += len(data)
+            return text
+        allowed = data[: self.limit - self.used].decode("utf-8", "ignore")
+        self.used = self.limit
+        self.exceeded = True
+        return allowed
+
+
+class _LimitedOutput(io.StringIO):
+    def __init__(self, budget):
+        super().__init__()
+        self._budget = budget
+
+    def write(self, text):
+        self.append(text)
+        if self._budget.exceeded:
+            raise _OutputLimitExceeded()
+        return len(text)
+
+    def append(self, text, counted=True):
+        # Escribe sin interrumpir el programa (tracebacks y mensajes finales)
+        super().write(self._budget.take(text, counted))
+
+
+class _StreamingOutput(io.TextIOBase):
+    """Reenvía la salida al proceso padre por líneas a medida que se produce."""
+
+    def __init__(self, name, emit, budget, chunk_size=4096):
+        self.name = name
+        self._emit = emit
+        self._budget = budget
+        self._chunk_size = chunk_size
+        self._buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.append(text)
+        if self._budget.exceeded:
+            self.flush()
+            raise _OutputLimitExceeded()
+        return len(text)
+
+    def append(self, text, counted=True):
+        self._buffer += self._budget.take(text, counted)
+        if len(self._buffer) >= self._chunk_size:
+            self.flush()
+        elif "\n" in text:
+            head, _, self._buffer = self._buffer.rpartition("\n")
+            self._emit(self.name, head + "\n")
+
+    def flush(self):
+        if self._buffer:
+            data, self._buffer = self._buffer, ""
+            self._emit(self.name, data)
+
+    def getvalue(self):
+        # La salida ya se envió al proceso padre
+        return ""
+
+
+def _restore_dict(target, saved):
+    # Restaura el contenido sin reemplazar el objeto (otros módulos guardan
+    # referencias a él)
+    for key in [key for key in target if key not in saved]:
+        del target[key]
+    for key, value in saved.items():
+        if key not in target or target[key] is not value:
+            target[key] = value
+
+
+class InterpreterState:
+    """Estado global del intérprete que el código de un estudiante puede alterar."""
+
+    SIGNALS = ("SIGALRM", "SIGXCPU")
+
+    def __init__(self):
+        self.builtins = dict(builtins.__dict__)
+        self.modules = dict(sys.modules)
+        # Atributos de cada módulo cargado (p. ej. "math.sqrt = None" o
+        # "json.dumps = ...")
+        self.module_dicts = {
+            name: dict(vars(module))
+            for name, module in self.modules.items()
+            if hasattr(module, "__dict__")
+        }
+        self.path = list(sys.path)
+        self.meta_path = list(sys.meta_path)
+        self.path_hooks = list(sys.path_hooks)
+        self.linecache = dict(linecache.cache)
+        self.environ = dict(os.environ)
+        self.recursion_limit = sys.getrecursionlimit()
+        self.handlers = {
+            name: signal.getsignal(getattr(signal, name))
+            for name in self.SIGNALS
+            if hasattr(signal, name)
+        }
+
+    def fresh_builtins(self):
+        return dict(self.builtins)
+
+    def restore(self):
+        # Primero los atributos de los módulos: devuelve a "sys" sus listas y
+        # diccionarios originales, cuyo contenido se restaura después
+        for name, saved in self.module_dicts.items():
+            _restore_dict(vars(self.modules[name]), saved)
+        _restore_dict(sys.modules, self.modules)
+        sys.path[:] = self.path
+        sys.meta_path[:] = self.meta_path
+        sys.path_hooks[:] = self.path_hooks
+        sys.path_importer_cache.clear()
+        _restore_dict(linecache.cache, self.linecache)
+        if os.environ != self.environ:
+            os.environ.clear()
+            os.environ.update(self.environ)
+        sys.setrecursionlimit(self.recursion_limit)
+        for name, handler in self.handlers.items():
+            signal.signal(getattr(signal, name), handler)
+
+
+# Se toma al iniciar el trabajador, antes de ejecutar código de estudiantes
+_pristine_state = None
+
+
+def _interpreter_state():
+    global _pristine_state
+    if _pristine_state is None:
+        _pristine_state = InterpreterState()
+        # Que restaurar este mismo módulo no descarte la instantánea
+        _pristine_state.module_dicts[__name__]["_pristine_state"] = _pristine_state
+    return _pristine_state
+
+
+def _format_exception(exc):
+    # Omitimos el frame de este módulo para que el traceback sea igual al de
+    # ejecutar el archivo directamente con "python archivo.py"
+    if isinstance(exc, SyntaxError):
+        return "".join(traceback.format_exception_only(type(exc), exc))
+    tb = exc.__traceback__.tb_next if exc.__traceback__ else None
+    return "".join(traceback.format_exception(type(exc), exc, tb))
+
+
+def apply_process_limits(limits):
+    """Límites que aplican a todo el proceso trabajador (memoria, archivos, procesos)."""
+    if resource is None:
+        return
+    for name, key, scale in (
+        ("RLIMIT_AS", "memory_mb", 1024 * 1024),
+        ("RLIMIT_NOFILE", "max_open_files", 1),
+        ("RLIMIT_NPROC", "max_processes", 1),
+    ):
+        value = limits.get(key)
+        if not value or not hasattr(resource, name):
+            continue
+        try:
+            resource.setrlimit(getattr(resource, name), (value * scale,) * 2)
+        except (ValueError, OSError):
+            pass
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+
+
+def _set_cpu_limit(cpu_seconds):
+    # RLIMIT_CPU es acumulativo por proceso: el trabajador persistente mueve
+    # el límite blando a "CPU usada hasta ahora + límite por ejecución"
+    if resource is None or not cpu_seconds:
+        return
+    soft = math.ceil(time.process_time()) + cpu_seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _reset_peak_memory():
+    # Linux: escribir "5" en clear_refs reinicia el pico de RSS (VmHWM)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_memory_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS lo reporta en bytes, Linux en KB
+        return peak // 1024 if sys.platform == "darwin" else peak
+    return None
+
+
+def run_code(code, stdin_text="", compiled=None, emit=None, limits=None):
+    limits = limits or {}
+    budget = _OutputBudget(limits.get("max_output_bytes"))
+    if emit is not None:
+        stdout = _StreamingOutput("stdout", emit, budget)
+        stderr = _StreamingOutput("stderr", emit, budget)
+    else:
+        stdout = _LimitedOutput(budget)
+        stderr = _LimitedOutput(budget)
+    state = _interpreter_state()
+    namespace = {"__name__": "__main__", "__builtins__": state.fresh_builtins()}
+    returncode = 0
+    timed_out = False
+    limit_exceeded = None
+
+    # Registrar el código en linecache para que el traceback muestre las líneas
+    linecache.cache[FILENAME] = (len(code), None, code.splitlines(True), FILENAME)
+
+    _reset_peak_memory()
+    _set_cpu_limit(limits.get("cpu_seconds"))
+    cpu_start = time.process_time()
+
+    saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(stdin_text), stdout, stderr
+    try:
+        exec(compiled or compile(code, FILENAME, "exec"), namespace)
+    except SystemExit as exc:
+        if exc.code is None:
+            returncode = 0
+        elif isinstance(exc.code, int):
+            returncode = exc.code
+        else:
+            stderr.append(f"{exc.code}\n")
+            returncode = 1
+    except _CaseTimeout:
+        timed_out = True
+        returncode = 1
+    except _CPULimitExceeded:
+        limit_exceeded = "cpu"
+        stderr.append(
+            f"\nError: El programa excedió el límite de CPU ({limits.get('cpu_seconds')} segundos)."
+        )
+        returncode = 1
+    except _OutputLimitExceeded:
+        limit_exceeded = "output"
+        # El aviso de truncado siempre se incluye aunque no quede presupuesto
+        stderr.append(
+            f"\n[Salida truncada: se superó el límite de {limits.get('max_output_bytes')} bytes]",
+            counted=False,
+        )
+        returncode = 1
+    except BaseException as exc:
+        if isinstance(exc, MemoryError):
+            limit_exceeded = "memory"
+        stderr.append(_format_exception(exc))
+        returncode = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        state.restore()
+        stdout.flush()
+        stderr.flush()
+
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "limit_exceeded": limit_exceeded,
+        "cpu_time_ms": round((time.process_time() - cpu_start) * 1000, 3),
+        "peak_memory_kb": _peak_memory_kb(),
+        "output_bytes": budget.used,
+    }
+
+
+def run_cases(code, inputs, case_timeout, limits=None):
+    """
+    Ejecuta el mismo código para cada entrada de prueba en este proceso.
+
+    El código se compila una sola vez y cada caso se limita con SIGALRM
+    cuando la plataforma lo permite.
+    """
+    try:
+        compiled = compile(code, FILENAME, "exec")
+    except (SyntaxError, ValueError) as exc:
+        # Todos los casos fallan igual; no hace falta ejecutarlos
+        failure = {
+            "stdout": "",
+            "stderr": _format_exception(exc),
+            "returncode": 1,
+            "timed_out": False,
+            "time_ms": 0.0,
+        }
+        return [dict(failure) for _ in inputs]
+
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_case_timeout)
+
+    cases = []
+    for stdin_text in inputs:
+        start = time.perf_counter()
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, case_timeout)
+        try:
+            result = run_code(code, stdin_text, compiled, limits=limits)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        cases.append({**result, "time_ms": round(elapsed_ms, 3)})
+    return cases
+
+
+def main():
+    limits = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+
+    # El protocolo usa copias de los descriptores; los originales se redirigen
+    # a /dev/null para que el código del estudiante no pueda corromperlo.
+    protocol_in = os.fdopen(os.dup(0), "rb")
+    protocol_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    apply_process_limits(limits)
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, _raise_case_timeout)
+    _interpreter_state()
+
+    def send(message):
+        protocol_out.write(json.dumps(message).encode("utf-8") + b"\n")
+        protocol_out.flush()
+
+    def emit(stream, data):
+        send({"event": "output", "stream": stream, "data": data})
+
+    workdir = os.getcwd()
+    for line in protocol_in:
+        request = json.loads(line)
+        os.chdir(workdir)
+        run_limits = {**limits, **request.get("limits", {})}
+        if request.get("stream"):
+            result = run_code(request["code"], emit=emit, limits=run_limits)
+        elif "inputs" in request:
+            result = {
+                "cases": run_cases(
+                    request["code"],
+                    request["inputs"],
+                    request["case_timeout"],
+                    limits=run_limits,
+                )
+            }
+        else:
+            result = run_code(request["code"], limits=run_limits)
+        # Hilos del estudiante que siguen vivos (sin contar el principal)
+        send({**result, "event": "result", "threads_left": _thread._count()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Análisis previo con IA de los ejercicios de cada sección.
+
+Las instrucciones del ejercicio (``instruccion_ejecutor_seccion``) son las
+mismas para todos los estudiantes, así que la explicación del enunciado y
+los errores comunes se generan una sola vez en segundo plano al crear o
+modificar la sección (o su recurso de instrucciones) y se guardan en
+``AnalisisPrevioSeccion``. La tabla hace de cola (ver job_queue.py): los
+procesa un pool de hilos del proceso web o el comando
+``process_section_analyses``.
+
+``AIAssistantView`` responde con ese contenido al instante las preguntas
+genéricas sobre el ejercicio; las que mencionan el código del estudiante
+siguen yendo al modelo.
+"""
+
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .ai_service_isolated import get_ai_service
+from .job_queue import TableQueue
+from .models import AnalisisPrevioSeccion, Seccion
+
+logger = logging.getLogger(__name__)
+
+# Si la sección cambia mientras el análisis espera, la huella es otra y la
+# reclamación se repite con el contenido nuevo
+analysis_queue = TableQueue(
+    AnalisisPrevioSeccion,
+    name="section-analysis",
+    status_field="estado",
+    order_field="fecha_solicitud",
+    workers_setting="AI_PREANALYSIS_WORKERS",
+    stale_after_setting="AI_PREANALYSIS_STALE_AFTER",
+    match_fields=("huella",),
+)
+
+SYSTEM_PROMPT = (
+    "Eres un experto profesor de Python que prepara material de apoyo para los "
+    "ejercicios de un curso. Responde en español, de forma clara y alentadora, "
+    "sin dar la solución completa del ejercicio."
+)
+EXPLANATION_PROMPT = (
+    "Explica paso a paso qué pide este ejercicio, qué conceptos de Python "
+    "necesita el estudiante y por dónde conviene empezar."
+)
+COMMON_ERRORS_PROMPT = (
+    "Enumera los errores más comunes que cometen los estudiantes principiantes "
+    "al resolver este ejercicio y da una pista breve para evitar cada uno."
+)
+
+# Preguntas sobre el ejercicio en general (no sobre el código del estudiante)
+GENERIC_QUESTION_RE = re.compile(
+    r"expl[ií]ca(me)?( el| este)? (ejercicio|enunciado|problema|tarea|secci[oó]n)"
+    r"|no entiendo (el|este) (ejercicio|enunciado|problema)"
+    r"|qu[eé] (hay que|tengo que|debo|se debe) hacer"
+    r"|de qu[eé] (trata|va) (el|este)"
+    r"|en qu[eé] consiste"
+    r"|(c[oó]mo|por d[oó]nde) (empiezo|comienzo|empezar|comenzar)"
+    r"|\bpistas?\b"
+    r"|errores (comunes|t[ií]picos|frecuentes)",
+    re.IGNORECASE,
+)
+COMMON_ERRORS_RE = re.compile(
+    r"\bpistas?\b|errores (comunes|t[ií]picos|frecuentes)|qu[eé] (debo|tengo que) evitar",
+    re.IGNORECASE,
+)
+# Si la pregunta menciona el código del estudiante hace falta el modelo
+SPECIFIC_QUESTION_RE = re.compile(
+    r"```|\bmi (c[oó]digo|programa|soluci[oó]n|funci[oó]n|respuesta)\b|\bl[ií]nea \d",
+    re.IGNORECASE,
+)
+
+
+def section_instructions(seccion):
+    recurso = seccion.instruccion_ejecutor_seccion
+    if recurso is None:
+        return ""
+    return (recurso.texto_recurso or "").strip()
+
+
+def section_fingerprint(seccion):
+    content = "\n".join(
+        [
+            seccion.nombre_seccion,
+            seccion.descripcion_seccion,
+            section_instructions(seccion),
+        ]
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def request_section_analysis(seccion):
+    """
+    Encola el análisis de ``seccion`` si su contenido cambió desde el último.
+    Devuelve ``True`` si se encoló.
+    """
+    if not settings.AI_PREANALYSIS_ENABLED:
+        return False
+    if not section_instructions(seccion):
+        # Sin ejercicio no hay nada que analizar
+        AnalisisPrevioSeccion.objects.filter(seccion=seccion).delete()
+        return False
+
+    fingerprint = section_fingerprint(seccion)
+    current = (
+        AnalisisPrevioSeccion.objects.filter(seccion=seccion)
+        .values_list("huella", "estado")
+        .first()
+    )
+    # Mismo contenido: solo se repite si el análisis anterior falló
+    if current is not None and current[0] == fingerprint:
+        if current[1] != AnalisisPrevioSeccion.ERROR:
+            return False
+
+    AnalisisPrevioSeccion.objects.update_or_create(
+        seccion=seccion,
+        defaults={
+            "estado": AnalisisPrevioSeccion.PENDIENTE,
+            "huella": fingerprint,
+            "error": "",
+            "fecha_solicitud": timezone.now(),
+            "fecha_inicio": None,
+            "fecha_fin": None,
+        },
+    )
+    transaction.on_commit(dispatch_analyses)
+    return True
+
+
+def claim_next_analysis():
+    """Reclama el análisis pendiente más antiguo. Devuelve ``None`` si no hay ninguno."""
+    return analysis_queue.claim(
+        AnalisisPrevioSeccion.objects.select_related(
+            "seccion__instruccion_ejecutor_seccion"
+        )
+    )
+
+
+def _ask(service, seccion, prompt):
+    exercise = (
+        f"Sección: {seccion.nombre_seccion}\n"
+        f"Descripción: {seccion.descripcion_seccion}\n"
+        f"Instrucciones del ejercicio:\n{section_instructions(seccion)}"
+    )
+    result = service.complete(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{exercise}\n\n{prompt}"},
+        ],
+        max_tokens=1000,
+        usage_context={
+            "endpoint": "analisis-previo",
+            "curso_id": seccion.seccion_del_curso_id,
+            "seccion_id": seccion.id_seccion,
+        },
+    )
+    if not result["success"]:
+        raise Exception(result["content"])
+    return result["content"]
+
+
+def run_analysis(analisis):
+    service = get_ai_service()
+    if service is None:
+        raise Exception("El servicio de IA no está disponible")
+    seccion = analisis.seccion
+    explanation = _ask(service, seccion, EXPLANATION_PROMPT)
+    common_errors = _ask(service, seccion, COMMON_ERRORS_PROMPT)
+    # Si la sección cambió mientras tanto la fila ya tiene otra huella y
+    # este resultado se descarta
+    return AnalisisPrevioSeccion.objects.filter(
+        seccion_id=analisis.seccion_id,
+        huella=analisis.huella,
+        estado=AnalisisPrevioSeccion.EJECUTANDO,
+    ).update(
+        estado=AnalisisPrevioSeccion.FINALIZADO,
+        explicacion=explanation,
+        errores_comunes=common_errors,
+        modelo=service.model,
+        fecha_fin=timezone.now(),
+    )
+
+
+def process_next_analysis():
+    """Procesa un análisis pendiente. Devuelve ``True`` si había alguno."""
+    analisis = claim_next_analysis()
+    if analisis is None:
+        return False
+    try:
+        run_analysis(analisis)
+    except Exception as e:
+        logger.error(
+            f"Error en el análisis previo de la sección {analisis.seccion_id}: {e}"
+        )
+        AnalisisPrevioSeccion.objects.filter(
+            seccion_id=analisis.seccion_id,
+            huella=analisis.huella,
+            estado=AnalisisPrevioSeccion.EJECUTANDO,
+        ).update(
+            estado=AnalisisPrevioSeccion.ERROR,
+            error=str(e),
+            fecha_fin=timezone.now(),
+        )
+    return True
+
+
+def requeue_stale_analyses():
+    """Devuelve a la cola los análisis que quedaron en ejecución (p. ej. si el proceso murió)."""
+    return analysis_queue.requeue_stale()
+
+
+def request_all_sections():
+    """Encola todas las secciones con ejercicio cuyo análisis falta o está desactualizado."""
+    secciones = Seccion.objects.filter(
+        instruccion_ejecutor_seccion__isnull=False
+    ).select_related("instruccion_ejecutor_seccion")
+    return sum(1 for seccion in secciones if request_section_analysis(seccion))
+
+
+def dispatch_analyses():
+    """Encola una tarea en el pool local. Con 0 hilos solo procesa el comando externo."""
+    analysis_queue.dispatch(process_next_analysis)
+
+
+def is_generic_question(message):
+    return bool(GENERIC_QUESTION_RE.search(message)) and not (
+        SPECIFIC_QUESTION_RE.search(message)
+    )
+
+
+def precomputed_answer(section_id, message):
+    """
+    ``(texto, análisis)`` precalculado para una pregunta genérica sobre el
+    ejercicio de la sección, o ``None`` si hay que preguntar al modelo.
+    """
+    if not section_id or not is_generic_question(message):
+        return None
+    analisis = AnalisisPrevioSeccion.objects.filter(
+        seccion_id=section_id, estado=AnalisisPrevioSeccion.FINALIZADO
+    ).first()
+    if analisis is None:
+        return None
+    if COMMON_ERRORS_RE.search(message):
+        return analisis.errores_comunes, analisis
+    return analisis.explicacion, analisis
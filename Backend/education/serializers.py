@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from .models import (
     Departamento,
@@ -18,6 +20,8 @@ from .models import (
     InscripcionCurso,
     ProgresoSeccion,
     Certificado,
+    TrabajoEjecucion,
+    CasoPrueba,
 )
 from users.models import Estudiante
 
@@ -277,13 +281,15 @@ class ProgresoSeccionSerializer(serializers.ModelSerializer):
                 "No se encontró una inscripción activa para este estudiante en el curso de esta sección."
             )
 
-        # Crear la instancia de ProgresoSeccion
-        progreso_seccion = ProgresoSeccion.objects.create(
-            estudiante=estudiante,
-            seccion=seccion,
-            from_inscripcion=inscripcion,
-            **validated_data
-        )
+        # Crear la instancia de ProgresoSeccion; el contador de la inscripción
+        # se actualiza (señal post_save) en la misma transacción
+        with transaction.atomic():
+            progreso_seccion = ProgresoSeccion.objects.create(
+                estudiante=estudiante,
+                seccion=seccion,
+                from_inscripcion=inscripcion,
+                **validated_data,
+            )
         return progreso_seccion
 
     # Validar que el estudiante no haya completado ya esta sección
@@ -302,6 +308,26 @@ class ProgresoSeccionSerializer(serializers.ModelSerializer):
         return data
 
 
+class ProgresoSeccionLoteItemSerializer(serializers.Serializer):
+    estudiante_id = serializers.IntegerField()
+    seccion_id = serializers.IntegerField()
+
+
+class ProgresoSeccionLoteSerializer(serializers.Serializer):
+    items = ProgresoSeccionLoteItemSerializer(
+        many=True,
+        allow_empty=False,
+        help_text="Pares estudiante/sección completados; los resultados se devuelven en el mismo orden.",
+    )
+
+    def validate_items(self, value):
+        if len(value) > settings.PROGRESS_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Se permiten como máximo {settings.PROGRESS_BULK_MAX_ITEMS} secciones por lote."
+            )
+        return value
+
+
 class SeccionesParaCursoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Seccion
@@ -398,12 +424,46 @@ class CodeExecutionInputSerializer(serializers.Serializer):
     language = serializers.CharField(
         max_length=50, help_text="El lenguaje de programación es python."
     )
+    estudiante_id = serializers.IntegerField(
+        required=False,
+        help_text="Estudiante que ejecuta el código; se usa para repartir la cola de ejecución.",
+    )
+
+
+class CodeExecutionBatchItemSerializer(serializers.Serializer):
+    code = serializers.CharField(
+        style={"base_template": "textarea.html"},
+        help_text="El código Python a ejecutar.",
+    )
+    language = serializers.CharField(
+        max_length=50, help_text="El lenguaje de programación es python."
+    )
+
+
+class CodeExecutionBatchInputSerializer(serializers.Serializer):
+    items = CodeExecutionBatchItemSerializer(
+        many=True,
+        allow_empty=False,
+        help_text="Fragmentos de código a ejecutar; los resultados se devuelven en el mismo orden.",
+    )
+    estudiante_id = serializers.IntegerField(
+        required=False,
+        help_text="Usuario que envía el lote; se usa para repartir la cola de ejecución.",
+    )
+
+    def validate_items(self, value):
+        if len(value) > settings.CODE_EXECUTOR_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Se permiten como máximo {settings.CODE_EXECUTOR_BATCH_MAX_ITEMS} fragmentos por lote."
+            )
+        return value
 
 
 # Serializer para la salida de datos del ejecutor de código
 class CodeExecutionOutputSerializer(serializers.Serializer):
     output = serializers.CharField(
-        help_text="La salida estándar (stdout) y/o errores (stderr) de la ejecución del código."
+        allow_blank=True,
+        help_text="La salida estándar (stdout) y/o errores (stderr) de la ejecución del código.",
     )
     status = serializers.CharField(
         max_length=20,
@@ -420,6 +480,89 @@ class CodeExecutionOutputSerializer(serializers.Serializer):
         max_length=50,
         help_text="Tipo de error (e.g., 'SyntaxError', 'TimeoutError').",
     )
+    cached = serializers.BooleanField(
+        default=False,
+        help_text="Indica si el resultado se obtuvo de la caché de ejecuciones.",
+    )
+    limit_exceeded = serializers.CharField(
+        required=False,
+        allow_null=True,
+        help_text="Límite de recursos superado, si hubo alguno ('cpu', 'memory', 'output').",
+    )
+    cpu_time_ms = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        help_text="Tiempo de CPU consumido por la ejecución, en milisegundos.",
+    )
+    peak_memory_kb = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="Pico de memoria residente (RSS) del intérprete, en KB.",
+    )
+    output_bytes = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="Bytes escritos en stdout y stderr por el programa.",
+    )
+
+
+class CasoPruebaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CasoPrueba
+        fields = [
+            "id_caso_prueba",
+            "seccion",
+            "entrada_caso",
+            "salida_esperada_caso",
+            "orden_caso",
+        ]
+        read_only_fields = ["id_caso_prueba", "seccion"]
+
+
+class CalificacionInputSerializer(serializers.Serializer):
+    code = serializers.CharField(
+        style={"base_template": "textarea.html"},
+        help_text="El código Python a calificar.",
+    )
+    estudiante_id = serializers.PrimaryKeyRelatedField(
+        queryset=Estudiante.objects.all(),
+        required=False,
+        allow_null=True,
+        help_text="Estudiante que envía la solución.",
+    )
+    marcar_completado = serializers.BooleanField(
+        default=False,
+        help_text="Registrar la sección como completada si pasan todos los casos.",
+    )
+
+
+class TrabajoEjecucionSerializer(serializers.ModelSerializer):
+    resultado = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrabajoEjecucion
+        fields = [
+            "id_trabajo",
+            "estado_trabajo",
+            "fecha_creacion",
+            "fecha_inicio",
+            "fecha_fin",
+            "resultado",
+        ]
+        read_only_fields = fields
+
+    def get_resultado(self, obj):
+        # Mismo formato que la respuesta síncrona de execute-code/
+        if obj.estado_trabajo != TrabajoEjecucion.FINALIZADO:
+            return None
+        return CodeExecutionOutputSerializer(
+            {
+                **obj.detalle_ejecucion,
+                "output": obj.salida,
+                "status": obj.estado_ejecucion,
+                "cached": obj.resultado_en_cache,
+            }
+        ).data
 
 
 class ComentarioCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,21 @@
+"""Utilidades para respuestas Server-Sent Events (text/event-stream)."""
+
+import json
+
+from django.http import StreamingHttpResponse
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Convierte un iterable de ``(evento, datos)`` en una respuesta SSE."""
+    response = StreamingHttpResponse(
+        (sse_event(event, data) for event, data in events),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Evita que nginx acumule la respuesta antes de enviarla
+    response["X-Accel-Buffering"] = "no"
+    return response
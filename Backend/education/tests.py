@@ -1,14 +1,75 @@
-from django.test import TransactionTestCase, TestCase
+from django.test import TransactionTestCase, TestCase, SimpleTestCase
+from django.test import override_settings
+from unittest import mock
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import os
 from django.urls import reverse
+from django.apps import apps as django_apps
+from importlib import import_module
+from contextlib import contextmanager, nullcontext
+from django.core.management import call_command
+from io import StringIO
+import json
+from django.conf import settings
+from django.core.cache import caches
 from django.db import IntegrityError
+from django.utils import timezone
+from datetime import date, timedelta
 from education.models import (
     NivelEducativo,
     Modulo,
     Idioma,
     DificultadCurso,
     TipoRecurso,
+    Curso,
+    Seccion,
+    CasoPrueba,
+    InscripcionCurso,
+    ProgresoSeccion,
+    BloqueoIA,
+    UsoIA,
+    AnalisisPrevioSeccion,
+    Recurso,
+    TrabajoEjecucion,
 )
-from users.models import Usuario, Admin, Docente
+from users.models import Usuario, Admin, Docente, Estudiante, TipoUsuario
+from education.code_analysis import analyze_python_code
+from education.code_executor import (
+    DEFAULT_ADMISSION_KEY,
+    ExecutorPool,
+    build_execution_result,
+    execute_python_code,
+    is_deterministic,
+    run_test_cases,
+    stream_python_code,
+    _execute,
+)
+from education.result_cache import LRUTTLCache
+from education.mock_llm import MockLLMServer, mock_reply
+from education.ai_cache import ai_cache_key, reset_ai_cache
+from education.ai_history import HistoryManager, estimate_message_tokens
+from education.ai_resilience import CLOSED, get_provider_guard
+from education.ai_usage import usage_buffer
+from education.ai_service_isolated import (
+    AI_BUSY_MESSAGE,
+    AIService,
+    RELOADABLE_ENV,
+    ai_service_registry,
+    check_ai_configuration,
+    check_ai_configuration_deploy,
+    get_ai_service,
+)
+from education.admission import ExecutionQueueFull, FileLockLimiter, _fair_order
+from education.execution_jobs import (
+    claim_next_job,
+    process_next_job,
+    requeue_stale_jobs,
+)
+from education.section_analysis import process_next_analysis
 
 
 class EducationModelsTest(TestCase):
@@ -85,3 +146,1756 @@ class TipoRecursoModelTest(EducationModelsTest):
         self.assertIsNotNone(tipo.id_tipo_recurso)
         self.assertEqual(tipo.tipo_recurso, "PeDF")
         self.assertEqual(str(tipo), "PeDF")
+
+
+class ExecutorPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ExecutorPool(size=1, max_runs=2)
+        self.pool.prestart()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_execute_success(self):
+        result = self.pool.execute("print('hola')", timeout=5)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["output"].strip(), "hola")
+
+    def test_execute_error_uses_string_filename(self):
+        result = self.pool.execute("x = 1\n1 / 0", timeout=5)
+        self.assertEqual(result["status"], "error")
+        self.assertIn('File "<string>", line 2, in <module>', result["output"])
+        self.assertIn("ZeroDivisionError", result["output"])
+        self.assertNotIn("sandbox_worker", result["output"])
+
+    def test_fresh_namespace_between_runs(self):
+        self.pool.execute("secreto = 42", timeout=5)
+        result = self.pool.execute("print(secreto)", timeout=5)
+        self.assertEqual(result["status"], "error")
+        self.assertIn("NameError", result["output"])
+
+    def test_run_cannot_affect_next_run(self):
+        # Ambas ejecuciones usan el mismo trabajador (max_runs=2)
+        self.pool.execute(
+            "import builtins, os, string, sys\n"
+            "builtins.print = lambda *a, **k: None\n"
+            "sys.modules['math'] = None\n"
+            "string.digits = ''\n"
+            "sys.path.insert(0, '/tmp')\n"
+            "os.environ['INYECTADO'] = '1'",
+            timeout=5,
+        )
+        result = self.pool.execute(
+            "import math, os, string, sys\n"
+            "print(math.sqrt(4), string.digits, '/tmp' in sys.path, "
+            "os.environ.get('INYECTADO'))",
+            timeout=5,
+        )
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["output"].strip(), "2.0 0123456789 False None")
+
+    def test_threads_do_not_leak_output_into_next_run(self):
+        self.pool.execute(
+            "import threading, time\n"
+            "def ruido():\n"
+            "    while True:\n"
+            "        print('de otro estudiante')\n"
+            "        time.sleep(0.01)\n"
+            "threading.Thread(target=ruido, daemon=True).start()",
+            timeout=5,
+        )
+        result = self.pool.execute(
+            "import time\ntime.sleep(0.2)\nprint('propio')", timeout=5
+        )
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["output"].strip(), "propio")
+
+    def test_timeout_replaces_worker(self):
+        result = self.pool.execute("while True:\n    pass", timeout=1)
+        self.assertEqual(result["status"], "timeout")
+        result = self.pool.execute("print('sigo vivo')", timeout=5)
+        self.assertEqual(result["status"], "success")
+
+    def test_worker_recycled_after_max_runs(self):
+        code = "import os\nprint(os.getpid())"
+        first = self.pool.execute(code, timeout=5)["output"]
+        second = self.pool.execute(code, timeout=5)["output"]
+        third = self.pool.execute(code, timeout=5)["output"]
+        self.assertEqual(first, second)
+        self.assertNotEqual(second, third)
+
+    def test_crash_is_reported_as_error(self):
+        result = self.pool.execute("import os\nos._exit(3)", timeout=5)
+        self.assertEqual(result["status"], "error")
+        result = self.pool.execute("print('ok')", timeout=5)
+        self.assertEqual(result["status"], "success")
+
+
+class ResourceLimitsTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ExecutorPool(
+            size=1,
+            max_runs=10,
+            limits={"cpu_seconds": 1, "memory_mb": 256, "max_output_bytes": 1000},
+        )
+        self.pool.prestart()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_result_includes_accounting(self):
+        result = self.pool.execute("print('hola')", timeout=5)
+        self.assertEqual(result["output_bytes"], 5)
+        self.assertIsNone(result["limit_exceeded"])
+        self.assertGreaterEqual(result["cpu_time_ms"], 0)
+        self.assertGreater(result["peak_memory_kb"], 0)
+
+    def test_output_limit_stops_program(self):
+        result = self.pool.execute("while True:\n    print('x' * 10)", timeout=5)
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["limit_exceeded"], "output")
+        self.assertEqual(result["output_bytes"], 1000)
+        self.assertIn("Salida truncada", result["output"])
+
+    def test_memory_limit(self):
+        result = self.pool.execute("datos = bytearray(512 * 1024 * 1024)", timeout=5)
+        self.assertEqual(result["limit_exceeded"], "memory")
+        self.assertIn("MemoryError", result["output"])
+
+    def test_cpu_limit_survives_except_exception(self):
+        code = "try:\n    while True:\n        pass\nexcept Exception:\n    pass"
+        result = self.pool.execute(code, timeout=5)
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["limit_exceeded"], "cpu")
+        result = self.pool.execute("print('ok')", timeout=5)
+        self.assertEqual(result["status"], "success")
+
+
+class AdmissionControlTest(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.limiter = FileLockLimiter(
+            self.lock_dir, slots=1, queue_size=1, queue_timeout=2
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir, ignore_errors=True)
+
+    def test_fair_order_alternates_students(self):
+        entries = [
+            {"ticket": "a1", "student": "a", "since": 1},
+            {"ticket": "a2", "student": "a", "since": 2},
+            {"ticket": "b1", "student": "b", "since": 3},
+        ]
+        self.assertEqual(_fair_order(entries), ["a1", "b1", "a2"])
+
+    def test_queue_full_and_slot_released(self):
+        running = threading.Event()
+        release = threading.Event()
+
+        def hold_slot():
+            with self.limiter.acquire("a"):
+                running.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        running.wait(5)
+
+        admitted = []
+        waiter = threading.Thread(
+            target=lambda: self._run_admitted(admitted, "b"),
+        )
+        waiter.start()
+        while self.limiter.waiting() == 0:
+            pass
+
+        # Un cupo ocupado y la cola (tamaño 1) llena
+        with self.assertRaises(ExecutionQueueFull) as ctx:
+            with self.limiter.acquire("c"):
+                pass
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+        release.set()
+        holder.join()
+        waiter.join()
+        self.assertEqual(admitted, ["b"])
+        self.assertEqual(self.limiter.waiting(), 0)
+
+    def test_polls_do_not_rewrite_unchanged_queue(self):
+        with self.limiter._queue() as entries:
+            entries.append(
+                {
+                    "ticket": "a1",
+                    "student": "a",
+                    "pid": os.getpid(),
+                    "since": time.time(),
+                }
+            )
+        queue_path = os.path.join(self.lock_dir, "cola.json")
+        before = os.stat(queue_path)
+        for _ in range(3):
+            self.assertEqual(self.limiter.waiting(), 1)
+        after = os.stat(queue_path)
+        self.assertEqual(
+            (before.st_ino, before.st_mtime_ns), (after.st_ino, after.st_mtime_ns)
+        )
+
+    def test_every_sandbox_path_takes_a_slot(self):
+        keys = []
+
+        @contextmanager
+        def slot(key):
+            keys.append(key)
+            yield
+
+        with mock.patch("education.code_executor.execution_slot", slot):
+            execute_python_code("print(1)", use_cache=False)
+            run_test_cases("print(input())", ["a"], admission_key=5)
+            list(stream_python_code("print(1)", admission_key=7))
+        self.assertEqual(keys, [DEFAULT_ADMISSION_KEY, 5, 7])
+
+    def test_stream_reports_full_queue(self):
+        with mock.patch(
+            "education.code_executor.execution_slot",
+            side_effect=ExecutionQueueFull(3),
+        ):
+            events = list(stream_python_code("print(1)"))
+        self.assertIn("saturado", events[0]["data"])
+        self.assertEqual(events[-1]["status"], "error")
+
+    def _run_admitted(self, admitted, student):
+        with self.limiter.acquire(student):
+            admitted.append(student)
+
+    def test_view_returns_429_with_retry_after(self):
+        with mock.patch(
+            "education.code_executor.execution_slot",
+            side_effect=ExecutionQueueFull(7),
+        ):
+            response = self.client.post(
+                reverse("execute-code"),
+                {"code": "print(1)", "language": "python", "estudiante_id": 1},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+
+    def test_view_keys_admission_on_client_not_body(self):
+        keys = []
+
+        def slot(key):
+            keys.append(key)
+            return nullcontext()
+
+        with mock.patch("education.code_executor.execution_slot", side_effect=slot):
+            for estudiante_id in (1, 2):
+                self.client.post(
+                    reverse("execute-code"),
+                    {
+                        "code": f"print('clave de admisión', {estudiante_id})",
+                        "language": "python",
+                        "estudiante_id": estudiante_id,
+                    },
+                    content_type="application/json",
+                )
+        self.assertEqual(keys, ["ip:127.0.0.1", "ip:127.0.0.1"])
+
+
+class ExecutionResultCacheTest(SimpleTestCase):
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUTTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+    def test_size_cap_in_bytes(self):
+        cache = LRUTTLCache(max_entries=10, max_bytes=10)
+        cache.set("a", "x", size=6)
+        cache.set("b", "y", size=6)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "y")
+
+    def test_nondeterministic_code_is_detected(self):
+        self.assertTrue(is_deterministic("import math\nprint(math.sqrt(4))"))
+        self.assertFalse(is_deterministic("import random\nprint(random.random())"))
+        self.assertFalse(is_deterministic("from time import time\nprint(time())"))
+        self.assertFalse(is_deterministic("import os\nprint(os.environ)"))
+        self.assertFalse(is_deterministic("print(input())"))
+
+    def test_process_dependent_output_is_not_deterministic(self):
+        # Orden de los sets de cadenas (PYTHONHASHSEED), identidad y hash
+        self.assertFalse(is_deterministic("print({'a', 'b', 'c'})"))
+        self.assertFalse(is_deterministic("print(set('abc'))"))
+        self.assertFalse(is_deterministic("print(frozenset(['a', 'b']))"))
+        self.assertFalse(is_deterministic("print({c for c in 'abc'})"))
+        self.assertFalse(is_deterministic("print(id(1), hash('a'))"))
+        # Imports dinámicos que esquivan la lista de módulos
+        self.assertFalse(
+            is_deterministic("__builtins__.__dict__['__import__']('random')")
+        )
+        self.assertFalse(is_deterministic("getattr(__builtins__, 'open')"))
+        self.assertFalse(is_deterministic("eval('1')"))
+        self.assertFalse(is_deterministic("exec('x = 1')"))
+        self.assertFalse(is_deterministic("().__class__.__base__.__subclasses__()"))
+        # El hash de las cadenas cambia en cada proceso
+        self.assertFalse(is_deterministic("print('abc'.__hash__())"))
+        self.assertFalse(is_deterministic("print((1).__hash__(), 'a'.__sizeof__())"))
+
+    def test_results_that_hit_a_resource_limit_are_not_cached(self):
+        url = reverse("execute-code")
+        data = {"code": "print([0] * 10**6 == [0] * 10**6)", "language": "python"}
+        hit_limit = {
+            **build_execution_result("", "MemoryError", 1),
+            "limit_exceeded": "memory",
+        }
+        with mock.patch(
+            "education.code_executor._execute", return_value=hit_limit
+        ) as sandbox:
+            self.client.post(url, data, content_type="application/json")
+            second = self.client.post(url, data, content_type="application/json")
+        # Con menos carga el mismo código puede terminar bien
+        self.assertEqual(sandbox.call_count, 2)
+        self.assertFalse(second.json()["cached"])
+
+    def test_default_repr_output_is_not_cached(self):
+        url = reverse("execute-code")
+        data = {
+            "code": "class A:\n    pass\nprint(A())",
+            "language": "python",
+        }
+        self.assertTrue(is_deterministic(data["code"]))
+        first = self.client.post(url, data, content_type="application/json")
+        second = self.client.post(url, data, content_type="application/json")
+        self.assertIn("object at 0x", first.json()["output"])
+        self.assertFalse(second.json()["cached"])
+
+    def test_identical_submission_is_served_from_cache(self):
+        url = reverse("execute-code")
+        data = {"code": "print(sum(range(10)))", "language": "python"}
+        first = self.client.post(url, data, content_type="application/json")
+        second = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(first.json()["output"], "45")
+        self.assertEqual(second.json()["output"], "45")
+        self.assertTrue(second.json()["cached"])
+
+
+@override_settings(CODE_EXECUTOR_JOB_WORKERS=0)
+class CodeExecutionJobTest(TestCase):
+    def test_job_is_queued_and_processed(self):
+        response = self.client.post(
+            reverse("execute-code-job-create"),
+            {"code": "print('en cola')", "language": "python"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["estado_trabajo"], "pendiente")
+        self.assertIsNone(response.json()["resultado"])
+
+        self.assertTrue(process_next_job())
+        self.assertFalse(process_next_job())
+
+        detail = self.client.get(
+            reverse(
+                "execute-code-job-detail",
+                kwargs={"job_id": response.json()["id_trabajo"]},
+            )
+        )
+        self.assertEqual(detail.json()["estado_trabajo"], "finalizado")
+        self.assertEqual(detail.json()["resultado"]["output"], "en cola")
+        self.assertEqual(detail.json()["resultado"]["status"], "success")
+        # Mismo formato que la respuesta síncrona de execute-code/
+        self.assertGreater(detail.json()["resultado"]["peak_memory_kb"], 0)
+        self.assertIn("error_type", detail.json()["resultado"])
+
+    def test_job_result_includes_error_details(self):
+        response = self.client.post(
+            reverse("execute-code-job-create"),
+            {"code": "print(", "language": "python"},
+            content_type="application/json",
+        )
+        process_next_job()
+        detail = self.client.get(
+            reverse(
+                "execute-code-job-detail",
+                kwargs={"job_id": response.json()["id_trabajo"]},
+            ),
+            {"wait": 1},
+        )
+        self.assertEqual(detail.json()["resultado"]["error_type"], "SyntaxError")
+
+    def test_long_poll_returns_pending_job_after_wait(self):
+        response = self.client.post(
+            reverse("execute-code-job-create"),
+            {"code": "print(1)", "language": "python"},
+            content_type="application/json",
+        )
+        detail = self.client.get(
+            reverse(
+                "execute-code-job-detail",
+                kwargs={"job_id": response.json()["id_trabajo"]},
+            ),
+            {"wait": 0.5},
+        )
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(detail.json()["estado_trabajo"], "pendiente")
+
+    @override_settings(CODE_EXECUTOR_JOB_ADMISSION_ATTEMPTS=2)
+    def test_job_fails_after_bounded_admission_attempts(self):
+        job = TrabajoEjecucion.objects.create(codigo="print(1)")
+        with mock.patch(
+            "education.execution_jobs.execute_python_code",
+            side_effect=ExecutionQueueFull(0),
+        ) as execute:
+            self.assertTrue(process_next_job())
+        self.assertEqual(execute.call_count, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.estado_trabajo, TrabajoEjecucion.FINALIZADO)
+        self.assertEqual(job.estado_ejecucion, "error")
+        self.assertIn("saturado", job.salida)
+        self.assertEqual(job.detalle_ejecucion["error_type"], "ExecutionQueueFull")
+
+    @override_settings(CODE_EXECUTOR_JOB_STALE_AFTER=60)
+    def test_stale_job_is_requeued_and_claimed_again(self):
+        job = TrabajoEjecucion.objects.create(codigo="print(1)")
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        # El proceso que lo reclamó murió hace más de STALE_AFTER segundos
+        TrabajoEjecucion.objects.filter(pk=job.pk).update(
+            fecha_inicio=timezone.now() - timedelta(seconds=120)
+        )
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_next_job().pk, job.pk)
+
+    def test_unsupported_language_is_rejected(self):
+        response = self.client.post(
+            reverse("execute-code-job-create"),
+            {"code": "console.log(1)", "language": "javascript"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CursoConSeccionesTest(TestCase):
+    def setUp(self):
+        TipoUsuario.objects.create(id_tipo_usuario=2, tipo_usuario="Estudiante")
+        user_docente = Usuario.objects.create(
+            username_user="docente_curso",
+            password_user="pass123",
+            email_user="docente_curso@example.com",
+        )
+        user_estudiante = Usuario.objects.create(
+            username_user="estudiante_curso",
+            password_user="pass123",
+            email_user="estudiante_c@example.com",
+        )
+        self.docente = Docente.objects.create(
+            user_id=user_docente,
+            nombre_docente="Ana",
+            apellidos_docente="Rojas",
+            ci_docente="55667788",
+            telefono_docente=70000000,
+        )
+        self.estudiante = Estudiante.objects.create(
+            user_id=user_estudiante,
+            nombre_estudiante="Luis",
+            apellidos_estudiante="Mamani",
+            ci_estudiante="99887766",
+        )
+        self.curso = Curso.objects.create(
+            nombre_curso="Python básico",
+            profesor_curso=self.docente,
+            descripcion_curso="Curso de prueba",
+            portada_curso="https://example.com/portada.png",
+            fecha_inicio_curso=date(2025, 1, 1),
+            fecha_cierre_curso=date(2025, 12, 31),
+        )
+        self.secciones = [
+            Seccion.objects.create(
+                nombre_seccion=f"Sección {i}",
+                descripcion_seccion="Descripción",
+                seccion_del_curso=self.curso,
+            )
+            for i in range(1, 3)
+        ]
+        self.inscripcion = InscripcionCurso.objects.create(
+            estudiante_inscripcion=self.estudiante, curso_inscripcion=self.curso
+        )
+
+
+class CalificarSeccionTest(CursoConSeccionesTest):
+    def setUp(self):
+        super().setUp()
+        self.seccion = self.secciones[0]
+        CasoPrueba.objects.create(
+            seccion=self.seccion, entrada_caso="2\n3\n", salida_esperada_caso="5"
+        )
+        CasoPrueba.objects.create(
+            seccion=self.seccion, entrada_caso="10\n-4\n", salida_esperada_caso="6\n"
+        )
+        self.url = reverse(
+            "calificar-seccion", kwargs={"seccion_id": self.seccion.id_seccion}
+        )
+
+    def test_all_cases_pass_and_progress_is_recorded(self):
+        response = self.client.post(
+            self.url,
+            {
+                "code": "a = int(input())\nb = int(input())\nprint(a + b)",
+                "estudiante_id": self.estudiante.id_estudiante,
+                "marcar_completado": True,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["aprobado"])
+        self.assertEqual(data["casos_aprobados"], 2)
+        self.assertTrue(data["progreso_registrado"])
+        self.assertIsNotNone(data["resultados"][0]["tiempo_ms"])
+        self.assertTrue(
+            ProgresoSeccion.objects.filter(
+                estudiante=self.estudiante, seccion=self.seccion
+            ).exists()
+        )
+
+    def test_grading_goes_through_admission_control(self):
+        with mock.patch(
+            "education.code_executor.execution_slot",
+            side_effect=ExecutionQueueFull(4),
+        ):
+            response = self.client.post(
+                self.url, {"code": "print(5)"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "4")
+
+    def test_wrong_answer_reports_failed_cases(self):
+        response = self.client.post(
+            self.url,
+            {"code": "a = int(input())\nb = int(input())\nprint(a * b)"},
+            content_type="application/json",
+        )
+        data = response.json()
+        self.assertFalse(data["aprobado"])
+        self.assertEqual([r["aprobado"] for r in data["resultados"]], [False, False])
+        self.assertFalse(data["progreso_registrado"])
+
+    def test_case_timeout_does_not_stop_other_cases(self):
+        code = "a = int(input())\nwhile a == 2:\n    pass\nprint(a + int(input()))"
+        with override_settings(CODE_EXECUTOR_TIMEOUT=1):
+            response = self.client.post(
+                self.url, {"code": code}, content_type="application/json"
+            )
+        resultados = response.json()["resultados"]
+        self.assertEqual(resultados[0]["status"], "timeout")
+        self.assertTrue(resultados[1]["aprobado"])
+
+    def test_create_test_case_for_section(self):
+        response = self.client.post(
+            reverse(
+                "casos-prueba-by-seccion",
+                kwargs={"seccion_id": self.secciones[1].id_seccion},
+            ),
+            {"entrada_caso": "", "salida_esperada_caso": "hola"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.secciones[1].casos_prueba.count(), 1)
+
+
+class ContadoresProgresoTest(CursoConSeccionesTest):
+    def _completar(self, seccion):
+        return ProgresoSeccion.objects.create(
+            estudiante=self.estudiante,
+            seccion=seccion,
+            from_inscripcion=self.inscripcion,
+        )
+
+    def test_counters_follow_sections_and_progress(self):
+        self.curso.refresh_from_db()
+        self.assertEqual(self.curso.total_secciones, 2)
+
+        # Insert y un UPDATE con F() que lee el total del curso en la misma sentencia
+        with self.assertNumQueries(2):
+            progreso = self._completar(self.secciones[0])
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 1)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 50.0)
+        self.assertFalse(self.inscripcion.completado)
+
+        self._completar(self.secciones[1])
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 100.0)
+        self.assertTrue(self.inscripcion.completado)
+
+        progreso.delete()
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 1)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 50.0)
+        self.assertFalse(self.inscripcion.completado)
+
+    def test_backfill_migration(self):
+        self._completar(self.secciones[0])
+        # Otra inscripción del mismo estudiante en el curso: su progreso es
+        # solo el que apunta a ella, como en el recuento normal
+        otra = InscripcionCurso.objects.create(
+            estudiante_inscripcion=self.estudiante, curso_inscripcion=self.curso
+        )
+        Curso.objects.update(total_secciones=0)
+        InscripcionCurso.objects.update(
+            secciones_completadas=0, porcentaje_progreso=0.0
+        )
+
+        migration = import_module(
+            "education.migrations.0026_rellenar_contadores_progreso"
+        )
+        migration.rellenar_contadores(django_apps, None)
+
+        self.curso.refresh_from_db()
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.curso.total_secciones, 2)
+        self.assertEqual(self.inscripcion.secciones_completadas, 1)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 50.0)
+        otra.refresh_from_db()
+        self.assertEqual(otra.secciones_completadas, 0)
+        self.assertEqual(otra.porcentaje_progreso, 0.0)
+
+    def test_new_section_recomputes_enrollments(self):
+        self._completar(self.secciones[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Seccion.objects.create(
+                nombre_seccion="Sección 3",
+                descripcion_seccion="Descripción",
+                seccion_del_curso=self.curso,
+            )
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 1)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 33.33)
+
+    def test_moved_section_updates_both_courses(self):
+        otro_curso = Curso.objects.create(
+            nombre_curso="Python avanzado",
+            profesor_curso=self.docente,
+            descripcion_curso="Curso de prueba",
+            portada_curso="https://example.com/portada.png",
+            fecha_inicio_curso=date(2025, 1, 1),
+            fecha_cierre_curso=date(2025, 12, 31),
+        )
+        otra_inscripcion = InscripcionCurso.objects.create(
+            estudiante_inscripcion=self.estudiante, curso_inscripcion=otro_curso
+        )
+        self._completar(self.secciones[1])
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 50.0)
+
+        seccion = self.secciones[1]
+        seccion.seccion_del_curso = otro_curso
+        with self.captureOnCommitCallbacks(execute=True):
+            seccion.save()
+
+        self.curso.refresh_from_db()
+        otro_curso.refresh_from_db()
+        self.assertEqual(self.curso.total_secciones, 1)
+        self.assertEqual(otro_curso.total_secciones, 1)
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 0)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 0.0)
+        otra_inscripcion.refresh_from_db()
+        self.assertEqual(otra_inscripcion.secciones_completadas, 0)
+        self.assertEqual(otra_inscripcion.porcentaje_progreso, 0.0)
+
+        # Guardar sin cambiar de curso no vuelve a tocar los totales
+        seccion.nombre_seccion = "Sección movida"
+        seccion.save()
+        otro_curso.refresh_from_db()
+        self.assertEqual(otro_curso.total_secciones, 1)
+
+    def test_deleted_section_recounts_enrollments(self):
+        self._completar(self.secciones[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.secciones[0].delete()
+        self.curso.refresh_from_db()
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.curso.total_secciones, 1)
+        self.assertEqual(self.inscripcion.secciones_completadas, 0)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 0.0)
+
+        self._completar(self.secciones[1])
+        self.inscripcion.refresh_from_db()
+        self.assertTrue(self.inscripcion.completado)
+
+    @override_settings(PROGRESS_RECALC_BATCH_SIZE=2)
+    def test_recompute_runs_in_batches(self):
+        for i in range(4):
+            usuario = Usuario.objects.create(
+                username_user=f"estudiante_lote_{i}",
+                password_user="pass123",
+                email_user=f"lote_{i}@example.com",
+            )
+            estudiante = Estudiante.objects.create(
+                user_id=usuario,
+                nombre_estudiante="Lote",
+                apellidos_estudiante=str(i),
+                ci_estudiante=f"1000{i}",
+            )
+            InscripcionCurso.objects.create(
+                estudiante_inscripcion=estudiante,
+                curso_inscripcion=self.curso,
+                secciones_completadas=2,
+            )
+
+        # Por cada lote de 2, su límite y un UPDATE
+        with self.assertNumQueries(3 * 2):
+            actualizadas = InscripcionCurso.recalcular_progreso_curso(self.curso.pk)
+        self.assertEqual(actualizadas, 5)
+        self.assertEqual(
+            InscripcionCurso.objects.filter(
+                curso_inscripcion=self.curso, completado=True
+            ).count(),
+            4,
+        )
+
+    def test_bulk_completion_endpoint(self):
+        self._completar(self.secciones[0])
+        items = [
+            {"estudiante_id": self.estudiante.pk, "seccion_id": seccion}
+            for seccion in (self.secciones[0].pk, self.secciones[1].pk, 999999)
+        ]
+        response = self.client.post(
+            reverse("progreso-seccion-completar-lote"),
+            {"items": items},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["completadas"], 1)
+        self.assertEqual(
+            [item["resultado"] for item in response.data["resultados"]],
+            [
+                ProgresoSeccion.YA_COMPLETADA,
+                ProgresoSeccion.COMPLETADA,
+                ProgresoSeccion.SECCION_INEXISTENTE,
+            ],
+        )
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 2)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 100.0)
+        self.assertTrue(self.inscripcion.completado)
+
+    def test_bulk_completion_query_count_does_not_grow(self):
+        secciones = [
+            Seccion.objects.create(
+                nombre_seccion=f"Extra {i}",
+                descripcion_seccion="Descripción",
+                seccion_del_curso=self.curso,
+            )
+            for i in range(10)
+        ]
+        pares = [(self.estudiante.pk, seccion.pk) for seccion in secciones]
+        # Secciones, inscripciones, progresos previos, savepoint, INSERT,
+        # límite del lote, UPDATE y fin del savepoint
+        with self.assertNumQueries(8):
+            ProgresoSeccion.completar_en_lote(pares)
+        self.inscripcion.refresh_from_db()
+        self.assertEqual(self.inscripcion.secciones_completadas, 10)
+        self.assertEqual(self.inscripcion.porcentaje_progreso, 83.33)
+
+
+class CodeExecutorStreamTest(SimpleTestCase):
+    def _events(self, code):
+        response = self.client.post(
+            reverse("execute-code-stream"),
+            {"code": code, "language": "python"},
+            content_type="application/json",
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode("utf-8")
+        return [block for block in body.split("\n\n") if block]
+
+    def test_output_is_streamed_line_by_line(self):
+        events = self._events("for i in range(3):\n    print(i)")
+        self.assertEqual(len(events), 4)
+        self.assertTrue(events[0].startswith("event: output"))
+        self.assertIn('"status": "success"', events[-1])
+
+    @override_settings(CODE_EXECUTOR_MAX_OUTPUT_BYTES=10)
+    def test_output_is_truncated_at_byte_cap(self):
+        events = self._events("while True:\n    print('x' * 4)")
+        self.assertIn('"truncated": true', events[-1])
+        self.assertIn('"output_bytes": 10', events[-1])
+
+
+class CodeExecutorBatchTest(SimpleTestCase):
+    def _post(self, items):
+        return self.client.post(
+            reverse("execute-code-batch"),
+            {"items": items},
+            content_type="application/json",
+        )
+
+    def test_results_keep_submission_order(self):
+        items = [
+            {
+                "code": f"import time\ntime.sleep(0.{3 - i})\nprint({i})",
+                "language": "python",
+            }
+            for i in range(3)
+        ]
+        items.append({"code": "console.log(1)", "language": "javascript"})
+        response = self._post(items)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([r["output"] for r in data[:3]], ["0", "1", "2"])
+        self.assertEqual(data[3]["status"], "error")
+        self.assertEqual(data[3]["error_type"], "UnsupportedLanguage")
+
+    def test_per_item_timeout(self):
+        with override_settings(CODE_EXECUTOR_TIMEOUT=1):
+            response = self._post(
+                [
+                    {"code": "while True:\n    pass", "language": "python"},
+                    {"code": "print('ok')", "language": "python"},
+                ]
+            )
+        data = response.json()
+        self.assertEqual(data[0]["status"], "timeout")
+        self.assertEqual(data[1]["status"], "success")
+
+    @override_settings(CODE_EXECUTOR_BATCH_MAX_ITEMS=2)
+    def test_rejects_too_many_items(self):
+        response = self._post([{"code": "print(1)", "language": "python"}] * 3)
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkExecutorCommandTest(SimpleTestCase):
+    @override_settings(ALLOWED_HOSTS=["localhost"])
+    def test_reports_percentiles_per_scenario(self):
+        out = StringIO()
+        call_command(
+            "benchmark_executor",
+            "--scenarios=trivial,syntax_error",
+            "--concurrency=1,2",
+            "--requests=4",
+            "--skip-spawn",
+            "--json",
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(len(report["runs"]), 4)
+        for run in report["runs"]:
+            self.assertEqual(run["unexpected"], 0)
+            self.assertLessEqual(run["p50_ms"], run["p99_ms"])
+
+
+class SyntaxPrecheckTest(SimpleTestCase):
+    def test_syntax_error_returns_without_sandbox(self):
+        code = "print('hola'"
+        expected = _execute(code, 5)["output"].strip()
+        with mock.patch("education.code_executor._execute") as sandbox:
+            response = self.client.post(
+                reverse("execute-code"),
+                {"code": code, "language": "python"},
+                content_type="application/json",
+            )
+        sandbox.assert_not_called()
+        data = response.json()
+        self.assertEqual(data["status"], "error")
+        self.assertEqual(data["output"], expected)
+        self.assertEqual(data["error_type"], "SyntaxError")
+        self.assertEqual(data["error_message"], "'(' was never closed (línea 1)")
+
+    def test_valid_code_is_executed(self):
+        response = self.client.post(
+            reverse("execute-code"),
+            {"code": "print('ok')\n# sin caché 1", "language": "python"},
+            content_type="application/json",
+        )
+        data = response.json()
+        self.assertEqual(data["output"], "ok")
+        self.assertIsNone(data["error_type"])
+
+
+# Sin límite de tasa ni reintentos y con el estado del breaker en memoria,
+# para que las pruebas no dependan unas de otras (ver AIResilienceTest)
+AI_PROVIDER_TEST_SETTINGS = {
+    # Proveedor fijo: la configuración de IA del entorno o de Backend/.env
+    # no debe cambiar el resultado de las pruebas
+    "AI_PROVIDER": "groq",
+    "GROQ_API_KEY": "clave-de-prueba",
+    "GROQ_MODEL": "llama3-8b-8192",
+    "OPENAI_API_KEY": None,
+    "AI_FAST_MODEL": "",
+    "ENV_FILE": "",
+    "AI_RESILIENCE_CACHE_ALIAS": "default",
+    "AI_RATE_LIMIT_PER_MINUTE": 0,
+    "AI_MAX_RETRIES": 0,
+    "AI_BREAKER_FAILURE_THRESHOLD": 1000,
+    "AI_USAGE_ENABLED": False,
+}
+
+
+class CodeAnalysisTest(SimpleTestCase):
+    def _warnings(self, code):
+        return [
+            (w["type"], w["line"], w["message"])
+            for w in analyze_python_code(code)["warnings"]
+        ]
+
+    def test_scopes_do_not_produce_false_positives(self):
+        code = (
+            "import math\n"
+            "from os import path as p\n"
+            "def media(datos, *extra, factor=2, **opciones):\n"
+            "    global contador\n"
+            "    contador = len(datos)\n"
+            "    pares = [x * y for x in datos for y in extra if (z := x)]\n"
+            "    return sum(pares) / max(contador, 1), math.pi, p.sep, z\n"
+            "try:\n"
+            "    media([1, 2]).real\n"
+            "except ValueError as error:\n"
+            "    print(error.args, contador)\n"
+        )
+        result = analyze_python_code(code)
+        self.assertEqual(result["warnings"], [])
+        self.assertFalse(result["has_issues"])
+        self.assertIn("contador", result["defined_variables"])
+
+    def test_reports_undefined_and_use_before_assignment(self):
+        code = (
+            "print(total)\n"
+            "total = 0\n"
+            "class Caja:\n"
+            "    tam = 1\n"
+            "    def medida(self):\n"
+            "        return tam\n"
+            "def f():\n"
+            "    print(v)\n"
+            "    v = 2\n"
+            "for i in range(3):\n"
+            "    if i:\n"
+            "        print(anterior)\n"
+            "    anterior = i\n"
+            "print([n for n in range(3)], n)\n"
+        )
+        self.assertEqual(
+            self._warnings(code),
+            [
+                ("NameError", 1, "Variable 'total' se usa antes de asignarse"),
+                ("NameError", 6, "Variable 'tam' no está definida"),
+                ("UnboundLocalError", 8, "Variable 'v' se usa antes de asignarse"),
+                ("NameError", 14, "Variable 'n' no está definida"),
+            ],
+        )
+
+    def test_augmented_assignment_reads_the_name(self):
+        code = (
+            "contador += 1\n"
+            "suma = 0\n"
+            "def sumar(x):\n"
+            "    suma += x\n"
+            "    return suma\n"
+            "def acumular(x):\n"
+            "    global suma\n"
+            "    suma += x\n"
+            "def duplicar(y):\n"
+            "    y = y * 2\n"
+            "    y += 1\n"
+            "    return y\n"
+        )
+        self.assertEqual(
+            self._warnings(code),
+            [
+                ("NameError", 1, "Variable 'contador' se usa antes de asignarse"),
+                ("UnboundLocalError", 4, "Variable 'suma' se usa antes de asignarse"),
+            ],
+        )
+
+    def test_annotation_without_value_does_not_define(self):
+        code = "edad: int\nprint(edad)\nnombre: str = 'Ana'\nprint(nombre)\n"
+        result = analyze_python_code(code)
+        self.assertEqual(
+            [(w["type"], w["line"]) for w in result["warnings"]], [("NameError", 2)]
+        )
+        self.assertNotIn("edad", result["defined_variables"])
+        self.assertIn("nombre", result["defined_variables"])
+
+    def test_syntax_error_and_star_import(self):
+        result = analyze_python_code("def f(:\n    pass")
+        self.assertEqual(result["errors"][0]["type"], "SyntaxError")
+        self.assertEqual(result["errors"][0]["line"], 1)
+        self.assertEqual(self._warnings("from math import *\nprint(sqrt(2))"), [])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_code_analysis",
+            "--lines",
+            "50",
+            "--repeat=1",
+            "--json",
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())["50"]
+        self.assertEqual(report["ast"]["warnings"], 0)
+        self.assertGreater(report["regex"]["warnings"], 0)
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AIServiceHTTPClientTest(SimpleTestCase):
+    def setUp(self):
+        self.server = MockLLMServer().start()
+        self.settings_override = override_settings(
+            GROQ_BASE_URL=self.server.url, AI_CACHE_BACKEND=""
+        )
+        self.settings_override.enable()
+        ai_service_registry.reset()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_reuses_connection_between_requests(self):
+        messages = [{"role": "user", "content": "hola"}]
+        first = get_ai_service().get_ai_response(messages)
+        second = get_ai_service().get_ai_response(messages, max_tokens=50)
+        self.assertEqual(first, "Respuesta simulada: hola")
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[1]["max_tokens"], 50)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_ignores_proxy_environment(self):
+        with mock.patch.dict(os.environ, {"HTTP_PROXY": "http://127.0.0.1:9"}):
+            response = AIService().get_ai_response([{"role": "user", "content": "x"}])
+        self.assertEqual(response, "Respuesta simulada: x")
+
+    def test_provider_error_returns_friendly_message(self):
+        self.server.status_code = 500
+        response = get_ai_service().get_ai_response([{"role": "user", "content": "x"}])
+        self.assertTrue(response.startswith("Lo siento"))
+        self.assertEqual(ai_service_registry.health()["status"], "degraded")
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AIServiceRegistryTest(SimpleTestCase):
+    def tearDown(self):
+        ai_service_registry.reset()
+
+    @override_settings(AI_CONFIG_RELOAD_INTERVAL=3600)
+    def test_singleton_and_cached_failure(self):
+        with override_settings(GROQ_API_KEY=None):
+            ai_service_registry.reset()
+            with mock.patch(
+                "education.ai_service_isolated.AIService", wraps=AIService
+            ) as constructor:
+                self.assertIsNone(get_ai_service())
+                self.assertIsNone(get_ai_service())
+            self.assertEqual(constructor.call_count, 1)
+            self.assertEqual(self.client.get(reverse("ai-health")).status_code, 503)
+
+        ai_service_registry.reset()
+        self.assertIs(get_ai_service(), get_ai_service())
+
+    @override_settings(AI_CONFIG_RELOAD_INTERVAL=0)
+    def test_hot_reload_rebuilds_only_on_change(self):
+        ai_service_registry.reset()
+        first = get_ai_service()
+        self.assertIs(get_ai_service(), first)
+        with override_settings(GROQ_MODEL="otro-modelo"):
+            second = get_ai_service()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.model, "otro-modelo")
+
+    @override_settings(AI_CONFIG_RELOAD_INTERVAL=0)
+    def test_hot_reload_reads_env_file(self):
+        env_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, env_dir)
+        env_file = os.path.join(env_dir, ".env")
+        with open(env_file, "w") as f:
+            f.write("GROQ_MODEL=modelo-inicial\n")
+
+        # Entorno real sin configuración de IA salvo la clave
+        environ = {
+            name: value
+            for name, value in os.environ.items()
+            if name not in RELOADABLE_ENV
+        }
+        environ["GROQ_API_KEY"] = "clave"
+        with override_settings(
+            ENV_FILE=env_file, GROQ_MODEL="modelo-inicial", GROQ_API_KEY="clave"
+        ):
+            with mock.patch.dict(os.environ, environ, clear=True):
+                ai_service_registry.reset()
+                self.assertEqual(get_ai_service().model, "modelo-inicial")
+
+                with open(env_file, "w") as f:
+                    f.write("GROQ_MODEL=modelo-nuevo\nGROQ_API_KEY=otra-clave\n")
+                # La clave del entorno real tiene prioridad sobre el archivo
+                service = get_ai_service()
+                self.assertEqual(service.model, "modelo-nuevo")
+                self.assertEqual(service.config["api_key"], "clave")
+
+    @override_settings(AI_CONFIG_RELOAD_INTERVAL=0)
+    def test_metrics_follow_reloaded_provider(self):
+        env_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, env_dir)
+        env_file = os.path.join(env_dir, ".env")
+        with open(env_file, "w") as f:
+            f.write("AI_PROVIDER=groq\n")
+        environ = {
+            name: value
+            for name, value in os.environ.items()
+            if name not in RELOADABLE_ENV
+        }
+        with override_settings(ENV_FILE=env_file), mock.patch.dict(
+            os.environ, environ, clear=True
+        ):
+            ai_service_registry.reset()
+            self.assertEqual(
+                self.client.get(reverse("ai-metrics")).json()["provider"], "groq"
+            )
+            with open(env_file, "w") as f:
+                f.write("AI_PROVIDER=openai\nOPENAI_API_KEY=clave\n")
+            self.assertEqual(
+                self.client.get(reverse("ai-metrics")).json()["provider"], "openai"
+            )
+
+    def test_missing_key_only_fails_deploy_check(self):
+        with override_settings(GROQ_API_KEY=None):
+            warnings = check_ai_configuration(None)
+            errors = check_ai_configuration_deploy(None)
+        # migrate, test y runserver siguen funcionando sin clave
+        self.assertEqual([warning.id for warning in warnings], ["education.W002"])
+        self.assertFalse(warnings[0].is_serious())
+        self.assertEqual([error.id for error in errors], ["education.E002"])
+        self.assertTrue(errors[0].is_serious())
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AIResponseCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.server = MockLLMServer().start()
+        self.settings_override = override_settings(
+            GROQ_BASE_URL=self.server.url, AI_CACHE_BACKEND="local"
+        )
+        self.settings_override.enable()
+        ai_service_registry.reset()
+        reset_ai_cache()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def _analyze(self, **extra):
+        return self.client.post(
+            reverse("ai-code-analysis"),
+            {"code": "x = 1\nprint(x)", "type": "explain", **extra},
+            content_type="application/json",
+        ).json()
+
+    def test_key_ignores_surrounding_whitespace(self):
+        self.assertEqual(
+            ai_cache_key([{"role": "user", "content": " hola\r\n"}], "m", 10),
+            ai_cache_key([{"role": "user", "content": "hola"}], "m", 10),
+        )
+        self.assertNotEqual(
+            ai_cache_key([{"role": "user", "content": "hola"}], "m", 10),
+            ai_cache_key([{"role": "user", "content": "hola"}], "m", 20),
+        )
+
+    def test_identical_analysis_calls_provider_once(self):
+        first = self._analyze()
+        second = self._analyze()
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(first["analysis"], second["analysis"])
+        self.assertEqual(len(self.server.requests), 1)
+        stats = self.client.get(reverse("ai-health")).json()["cache"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_opt_out_and_errors_are_not_cached(self):
+        self._analyze()
+        self.assertFalse(self._analyze(useCache=False)["cached"])
+        self.assertEqual(len(self.server.requests), 2)
+
+        self.server.status_code = 500
+        failed = self._analyze(type="optimize")
+        self.assertFalse(failed["success"])
+        self.server.status_code = 200
+        self.assertFalse(self._analyze(type="optimize")["cached"])
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AIAssistantStreamTest(SimpleTestCase):
+    def setUp(self):
+        self.server = MockLLMServer().start()
+        self.settings_override = override_settings(
+            GROQ_BASE_URL=self.server.url, AI_CACHE_BACKEND="local"
+        )
+        self.settings_override.enable()
+        ai_service_registry.reset()
+        reset_ai_cache()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def _events(self, message):
+        response = self.client.post(
+            reverse("ai-assistant-stream"),
+            {"message": message},
+            content_type="application/json",
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode("utf-8")
+        return [
+            (
+                block.split("\n")[0][len("event: ") :],
+                json.loads(block.split("data: ", 1)[1]),
+            )
+            for block in body.split("\n\n")
+            if block
+        ]
+
+    def test_tokens_are_forwarded_as_they_arrive(self):
+        events = self._events("uno dos tres")
+        tokens = [data["content"] for event, data in events if event == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertTrue("".join(tokens).endswith("uno dos tres"))
+        self.assertEqual(events[-1], ("done", {"success": True, "cached": False}))
+        self.assertTrue(self.server.requests[0]["stream"])
+
+    def test_streamed_answer_is_cached(self):
+        first = self._events("hola")
+        second = self._events("hola")
+        self.assertEqual(second[-1][1]["cached"], True)
+        self.assertEqual(
+            "".join(d["content"] for e, d in first if e == "token"),
+            second[0][1]["content"],
+        )
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_iterator_matches_blocking_response(self):
+        service = get_ai_service()
+        messages = [{"role": "user", "content": "cuatro cinco"}]
+        streamed = "".join(service.iter_ai_response(messages, use_cache=False))
+        self.assertEqual(streamed, service.get_ai_response(messages, use_cache=False))
+
+    def test_provider_error_ends_stream(self):
+        self.server.status_code = 503
+        events = self._events("hola")
+        self.assertTrue(events[0][1]["content"].startswith("Lo siento"))
+        self.assertEqual(events[-1][1]["success"], False)
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AIAsyncViewsTest(SimpleTestCase):
+    def setUp(self):
+        self.server = MockLLMServer(delay=0.3).start()
+        self.settings_override = override_settings(
+            GROQ_BASE_URL=self.server.url, AI_CACHE_BACKEND="local"
+        )
+        self.settings_override.enable()
+        ai_service_registry.reset()
+        reset_ai_cache()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+        self.settings_override.disable()
+        self.server.stop()
+
+    async def _post(self, name, data):
+        response = await self.async_client.post(
+            reverse(name), data, content_type="application/json"
+        )
+        return response.status_code, response.json()
+
+    async def test_concurrent_requests_share_the_event_loop(self):
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                self._post("ai-assistant-async", {"message": f"pregunta {i}"})
+                for i in range(10)
+            )
+        )
+        # Diez llamadas de 0.3 s en paralelo, no una detrás de otra
+        self.assertLess(time.perf_counter() - start, 2)
+        status_code, data = results[3]
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data["response"], "Respuesta simulada: pregunta 3")
+        self.assertEqual((data["success"], data["cached"]), (True, False))
+
+    async def test_code_analysis_matches_sync_view_and_uses_cache(self):
+        body = {"code": "x = 1\nprint(x)", "type": "explain"}
+        status_code, first = await self._post("ai-code-analysis-async", body)
+        _, second = await self._post("ai-code-analysis-async", body)
+        self.assertEqual(status_code, 200)
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertIn("automatic_analysis", first)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0]["max_tokens"], 1500)
+
+    async def test_validation_errors(self):
+        status_code, _ = await self._post("ai-assistant-async", {"message": ""})
+        self.assertEqual(status_code, 400)
+        response = await self.async_client.post(
+            reverse("ai-code-analysis-async"),
+            "no es json",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    **{
+        **AI_PROVIDER_TEST_SETTINGS,
+        "AI_MAX_RETRIES": 2,
+        "AI_BREAKER_FAILURE_THRESHOLD": 2,
+    },
+    AI_CACHE_BACKEND="",
+    AI_RETRY_BASE_DELAY=0.01,
+    AI_BREAKER_RESET_TIMEOUT=0.3,
+)
+class AIResilienceTest(SimpleTestCase):
+    messages = [{"role": "user", "content": "hola"}]
+
+    def setUp(self):
+        self.server = MockLLMServer().start()
+        self.settings_override = override_settings(GROQ_BASE_URL=self.server.url)
+        self.settings_override.enable()
+        ai_service_registry.reset()
+        self.guard = get_provider_guard("groq")
+        self.guard.reset()
+
+    def tearDown(self):
+        self.guard.reset()
+        ai_service_registry.reset()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def _ask(self):
+        return get_ai_service().complete(self.messages)
+
+    def test_transient_errors_are_retried(self):
+        self.server.status_code = 503
+        self.server.fail_first = 2
+        self.assertTrue(self._ask()["success"])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.guard.metrics()["process"]["retries"], 2)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.status_code = 400
+        self.assertFalse(self._ask()["success"])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.guard.metrics()["circuit"]["failures"], 0)
+
+    def test_breaker_opens_fails_fast_and_recovers(self):
+        self.server.status_code = 503
+        self._ask()
+        self._ask()
+        self.assertEqual(len(self.server.requests), 6)
+        metrics = self.client.get(reverse("ai-metrics")).json()
+        self.assertEqual(metrics["circuit"]["state"], "open")
+
+        # Abierto: responde al momento sin llamar al proveedor
+        result = self._ask()
+        self.assertEqual(result["content"], AI_BUSY_MESSAGE)
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.guard.metrics()["process"]["rejected_circuit_open"], 1)
+
+        self.server.status_code = 200
+        time.sleep(0.35)
+        self.assertTrue(self._ask()["success"])
+        self.assertEqual(self.guard.metrics()["circuit"]["state"], "closed")
+
+    def test_async_guard_does_not_block_event_loop(self):
+        # Caché compartida lenta: cada consulta del breaker tarda 0,3 s
+        def slow_breaker():
+            time.sleep(0.3)
+            return {"state": CLOSED, "failures": 0, "opened_at": None}
+
+        async def ticker(stop):
+            ticks = 0
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return ticks
+
+        async def scenario():
+            stop = asyncio.Event()
+            ticks = asyncio.ensure_future(ticker(stop))
+            await self.guard.acall(lambda: asyncio.sleep(0, result="ok"))
+            stop.set()
+            return await ticks
+
+        with mock.patch.object(self.guard, "_breaker", side_effect=slow_breaker):
+            ticks = asyncio.run(scenario())
+        # Con el loop bloqueado el ticker no avanzaría mientras dura la llamada
+        self.assertGreater(ticks, 10)
+
+    @override_settings(
+        AI_RATE_LIMIT_PER_MINUTE=60, AI_RATE_LIMIT_BURST=2, AI_RATE_LIMIT_MAX_WAIT=0
+    )
+    def test_rate_limit_fails_fast_when_bucket_is_empty(self):
+        results = [self._ask() for _ in range(3)]
+        self.assertEqual([r["success"] for r in results], [True, True, False])
+        self.assertEqual(results[2]["content"], AI_BUSY_MESSAGE)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.guard.metrics()["rate_limit"]["available"], 0)
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS, AI_CACHE_BACKEND="")
+class AIProvidersTest(SimpleTestCase):
+    def tearDown(self):
+        ai_service_registry.reset()
+
+    @override_settings(AI_PROVIDER="stub", GROQ_API_KEY=None)
+    def test_stub_provider_works_offline_without_key(self):
+        with override_settings(GROQ_API_KEY=None):
+            ai_service_registry.reset()
+            self.assertEqual(check_ai_configuration(None), [])
+            response = self.client.post(
+                reverse("ai-assistant"),
+                {"message": "¿qué es una lista?"},
+                content_type="application/json",
+            )
+            tokens = list(
+                get_ai_service().iter_ai_response([{"role": "user", "content": "a b"}])
+            )
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["provider"], "stub")
+        self.assertEqual(data["response"], "Respuesta simulada: ¿qué es una lista?")
+        self.assertEqual("".join(tokens), "Respuesta simulada: a b")
+
+    @override_settings(AI_PROVIDER="otro")
+    def test_unknown_provider(self):
+        ai_service_registry.reset()
+        self.assertIsNone(get_ai_service())
+        self.assertEqual(check_ai_configuration(None)[0].id, "education.E001")
+
+    @override_settings(AI_FAST_MODEL="modelo-rapido", AI_FAST_MODEL_TASKS=["explain"])
+    def test_explain_requests_use_fast_model(self):
+        server = MockLLMServer().start()
+        try:
+            with override_settings(
+                AI_PROVIDER="openai",
+                OPENAI_BASE_URL=server.url,
+                OPENAI_MODEL="grande",
+                OPENAI_API_KEY="clave",
+            ):
+                ai_service_registry.reset()
+                for analysis_type in ("explain", "debug"):
+                    response = self.client.post(
+                        reverse("ai-code-analysis"),
+                        {"code": "print(1)", "type": analysis_type},
+                        content_type="application/json",
+                    )
+                    self.assertEqual(response.json()["provider"], "openai")
+        finally:
+            server.stop()
+        self.assertEqual(
+            [request["model"] for request in server.requests],
+            ["modelo-rapido", "grande"],
+        )
+
+
+@override_settings(
+    **{**AI_PROVIDER_TEST_SETTINGS, "AI_PROVIDER": "stub", "AI_USAGE_ENABLED": True},
+    AI_CACHE_BACKEND="local",
+    AI_USAGE_BUFFER_SIZE=100,
+    AI_USAGE_FLUSH_INTERVAL=3600,
+)
+class AIUsageMeteringTest(TestCase):
+    def setUp(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+        usage_buffer.flush()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+
+    def _ask(self, message, **ids):
+        return self.client.post(
+            reverse("ai-assistant"),
+            {"message": message, "context": {"courseName": "Python", **ids}},
+            content_type="application/json",
+        )
+
+    def test_calls_are_buffered_and_aggregated(self):
+        self._ask("¿qué es un bucle?", courseId=7, sectionId=3)
+        self._ask("¿qué es un bucle?", courseId=7, sectionId=3)
+        self._ask("¿qué es una función?", courseId="8")
+        # Se acumulan en memoria hasta el siguiente volcado
+        self.assertEqual(UsoIA.objects.count(), 0)
+        self.assertEqual(usage_buffer.pending(), 3)
+
+        response = self.client.get(reverse("ai-usage"), {"group_by": "curso"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UsoIA.objects.count(), 3)
+        rows = {row["curso"]: row for row in response.json()["results"]}
+        self.assertEqual(rows[7]["calls"], 2)
+        self.assertEqual(rows[7]["cache_hits"], 1)
+        self.assertEqual(rows[8]["calls"], 1)
+
+        first, cached = UsoIA.objects.filter(curso_id=7).order_by("id_uso")
+        self.assertEqual(first.endpoint, "ai-assistant")
+        self.assertEqual(first.proveedor, "stub")
+        self.assertEqual(first.resultado, UsoIA.EXITO)
+        self.assertEqual(first.seccion_id, 3)
+        self.assertGreater(first.tokens_prompt, 0)
+        self.assertGreater(first.tokens_respuesta, 0)
+        # La respuesta de caché no gasta tokens del proveedor
+        self.assertTrue(cached.desde_cache)
+        self.assertEqual(cached.tokens_prompt + cached.tokens_respuesta, 0)
+
+    @override_settings(AI_USAGE_BUFFER_SIZE=2)
+    def test_buffer_flushes_in_batches(self):
+        self._ask("uno")
+        self.assertEqual(UsoIA.objects.count(), 0)
+        self._ask("dos")
+        self.assertEqual(UsoIA.objects.count(), 2)
+        self.assertEqual(usage_buffer.pending(), 0)
+
+    def test_invalid_group_by(self):
+        response = self.client.get(reverse("ai-usage"), {"group_by": "docente"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    AI_PROMPT_TOKEN_BUDGET=600,
+    AI_HISTORY_RECENT_MESSAGES=4,
+    AI_HISTORY_SUMMARY_TOKENS=100,
+    AI_CONTEXT_CODE_TOKENS=200,
+)
+class AIHistoryCompactionTest(SimpleTestCase):
+    exercise = "\n".join(f"valor_{i} = {i} * 2" for i in range(60))
+
+    def _history(self, turns):
+        return [
+            {
+                "sender": "user" if i % 2 == 0 else "ai",
+                "content": f"Mensaje {i}. " + "detalle " * 40,
+            }
+            for i in range(turns)
+        ]
+
+    def test_old_turns_are_summarized_within_budget(self):
+        messages, report = HistoryManager().build(
+            "Sistema", self._history(12), "¿Y ahora?"
+        )
+        self.assertLessEqual(estimate_message_tokens(messages), 600)
+        self.assertEqual(report["tokens"], estimate_message_tokens(messages))
+        self.assertGreater(report["tokens_saved"], 0)
+        self.assertTrue(messages[1]["content"].startswith("Resumen"))
+        self.assertIn("Mensaje 7.", messages[1]["content"])
+        self.assertTrue(messages[2]["content"].startswith("Mensaje 8."))
+        self.assertEqual(messages[-1], {"role": "user", "content": "¿Y ahora?"})
+        self.assertEqual(report["summarized_messages"], 12 - (len(messages) - 3))
+
+    def test_repeated_code_blocks_are_replaced(self):
+        modified = self.exercise.replace("valor_30 = 30", "valor_30 = -30")
+        history = [
+            {
+                "sender": "user",
+                "content": f"Mi código:\n```python\n{self.exercise}\n```",
+            },
+            {"sender": "ai", "content": f"Prueba así:\n```python\n{modified}\n```"},
+        ]
+        system = f"Código del estudiante:\n{self.exercise}"
+        messages, report = HistoryManager(budget=4000).build(
+            system, history, "gracias", exercise_code=self.exercise
+        )
+        self.assertEqual(report["deduplicated_code_blocks"], 2)
+        self.assertIn("[código actual del ejercicio", messages[1]["content"])
+        self.assertIn("-valor_30 = 30 * 2\n+valor_30 = -30 * 2", messages[2]["content"])
+        # El código largo del prompt del sistema se recorta
+        self.assertIn("líneas omitidas", messages[0]["content"])
+        self.assertLess(report["tokens"], report["original_tokens"])
+
+    def test_short_conversation_is_sent_verbatim(self):
+        history = [{"sender": "user", "content": "hola"}]
+        messages, report = HistoryManager().build("Sistema", history, "adiós")
+        self.assertEqual(
+            messages,
+            [
+                {"role": "system", "content": "Sistema"},
+                {"role": "user", "content": "hola"},
+                {"role": "user", "content": "adiós"},
+            ],
+        )
+        self.assertEqual(report["tokens_saved"], 0)
+
+
+@override_settings(**AI_PROVIDER_TEST_SETTINGS)
+class AICoalescingTest(TestCase):
+    messages = [{"role": "user", "content": "analiza esto"}]
+
+    def setUp(self):
+        self.server = MockLLMServer(delay=0.3).start()
+        self.settings_override = override_settings(
+            GROQ_BASE_URL=self.server.url,
+            AI_CACHE_BACKEND="django",
+            AI_CACHE_ALIAS="default",
+        )
+        self.settings_override.enable()
+        ai_service_registry.reset()
+        reset_ai_cache()
+        caches["default"].clear()
+
+    def tearDown(self):
+        ai_service_registry.reset()
+        reset_ai_cache()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_concurrent_threads_share_one_call(self):
+        service = get_ai_service()
+        barrier = threading.Barrier(5)
+        results = []
+
+        def ask():
+            barrier.wait()
+            # Sin caché solo queda la coalescencia dentro del proceso
+            results.append(service.complete(self.messages, use_cache=False))
+
+        threads = [threading.Thread(target=ask) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual({r["content"] for r in results}, {mock_reply(self.messages)})
+        self.assertEqual(sum(r["coalesced"] for r in results), 4)
+
+    def test_concurrent_coroutines_share_one_call(self):
+        service = get_ai_service()
+
+        async def ask_all():
+            return await asyncio.gather(
+                *(service.acomplete(self.messages, use_cache=False) for _ in range(5))
+            )
+
+        results = asyncio.run(ask_all())
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual([r["coalesced"] for r in results], [False] + [True] * 4)
+
+    def test_waits_for_worker_holding_the_lock(self):
+        key = ai_cache_key(self.messages, settings.GROQ_MODEL, 1000)
+        BloqueoIA.objects.create(
+            clave=key,
+            propietario="otro-worker",
+            expira_en=timezone.now() + timedelta(seconds=60),
+        )
+        # El otro worker termina su llamada y deja la respuesta en la caché
+        timer = threading.Timer(
+            0.3, caches["default"].set, args=(key, "respuesta del otro worker")
+        )
+        timer.start()
+        result = get_ai_service().complete(self.messages)
+        timer.join()
+
+        self.assertEqual(result["content"], "respuesta del otro worker")
+        self.assertTrue(result["coalesced"])
+        self.assertEqual(self.server.requests, [])
+
+    def test_lock_is_released_after_call(self):
+        result = get_ai_service().complete(self.messages)
+        self.assertTrue(result["success"])
+        self.assertFalse(BloqueoIA.objects.exists())
+        self.assertEqual(len(self.server.requests), 1)
+
+
+@override_settings(
+    **{**AI_PROVIDER_TEST_SETTINGS, "AI_PROVIDER": "stub"},
+    AI_CACHE_BACKEND="",
+    AI_PREANALYSIS_ENABLED=True,
+    AI_PREANALYSIS_WORKERS=0,
+)
+class AnalisisPrevioSeccionTest(CursoConSeccionesTest):
+    def setUp(self):
+        super().setUp()
+        ai_service_registry.reset()
+        self.instrucciones = Recurso.objects.create(
+            nombre_recurso="Instrucciones",
+            texto_recurso="Escribe una función que sume dos números.",
+            tipo_recurso=TipoRecurso.objects.create(tipo_recurso="Texto"),
+        )
+        self.seccion = Seccion.objects.create(
+            nombre_seccion="Funciones",
+            descripcion_seccion="Definir funciones",
+            seccion_del_curso=self.curso,
+            instruccion_ejecutor_seccion=self.instrucciones,
+        )
+
+    def tearDown(self):
+        ai_service_registry.reset()
+
+    def _ask(self, message):
+        return self.client.post(
+            reverse("ai-assistant"),
+            {"message": message, "context": {"sectionId": self.seccion.id_seccion}},
+            content_type="application/json",
+        ).json()
+
+    def test_section_with_exercise_is_analyzed_once(self):
+        analisis = AnalisisPrevioSeccion.objects.get(seccion=self.seccion)
+        self.assertEqual(analisis.estado, AnalisisPrevioSeccion.PENDIENTE)
+        # Las secciones sin ejercicio no se analizan
+        self.assertEqual(AnalisisPrevioSeccion.objects.count(), 1)
+
+        self.assertTrue(process_next_analysis())
+        self.assertFalse(process_next_analysis())
+        analisis.refresh_from_db()
+        self.assertEqual(analisis.estado, AnalisisPrevioSeccion.FINALIZADO)
+        self.assertIn("Escribe una función", analisis.explicacion)
+        self.assertIn("errores más comunes", analisis.errores_comunes)
+
+        # Guardar sin cambios no repite el análisis; cambiar el enunciado sí
+        self.seccion.save()
+        analisis.refresh_from_db()
+        self.assertEqual(analisis.estado, AnalisisPrevioSeccion.FINALIZADO)
+        self.instrucciones.texto_recurso = "Escribe una función que reste."
+        self.instrucciones.save()
+        analisis.refresh_from_db()
+        self.assertEqual(analisis.estado, AnalisisPrevioSeccion.PENDIENTE)
+
+    def test_generic_questions_use_precomputed_content(self):
+        # Sin análisis terminado todavía se pregunta al modelo
+        self.assertNotIn("precomputed", self._ask("¿Qué tengo que hacer?"))
+        process_next_analysis()
+        analisis = AnalisisPrevioSeccion.objects.get(seccion=self.seccion)
+
+        data = self._ask("¿Qué tengo que hacer en este ejercicio?")
+        self.assertTrue(data["precomputed"])
+        self.assertEqual(data["response"], analisis.explicacion)
+        data = self._ask("¿Cuáles son los errores comunes?")
+        self.assertEqual(data["response"], analisis.errores_comunes)
+
+        data = self._ask("¿Qué tengo que hacer? Mi código da error")
+        self.assertNotIn("precomputed", data)
+        self.assertEqual(data["provider"], "stub")
+
+    def test_backfill_command(self):
+        AnalisisPrevioSeccion.objects.all().delete()
+        out = StringIO()
+        call_command("process_section_analyses", "--all", "--once", stdout=out)
+        self.assertIn("1 secciones encoladas", out.getvalue())
+        self.assertEqual(
+            AnalisisPrevioSeccion.objects.get().estado,
+            AnalisisPrevioSeccion.FINALIZADO,
+        )
@@ -7,7 +7,16 @@ from .views import (
     CursosPorDocenteView,
 )
 from . import views
-from .ai_views import AIAssistantView, AICodeAnalysisView
+from .ai_views import (
+    AIAssistantView,
+    AIAssistantAsyncView,
+    AIAssistantStreamView,
+    AICodeAnalysisView,
+    AICodeAnalysisAsyncView,
+    AIHealthView,
+    AIMetricsView,
+    AIUsageView,
+)
 
 router = DefaultRouter()
 router.register(r"secciones", SeccionViewSet, basename="seccion")
@@ -65,6 +74,11 @@ urlpatterns = [
         views.ProgresoSeccionCreateView.as_view(),
         name="progreso-seccion-completar",
     ),
+    path(
+        "progreso-secciones/completar/lote/",
+        views.ProgresoSeccionBulkCreateView.as_view(),
+        name="progreso-seccion-completar-lote",
+    ),
     path(
         "docentes/<int:docente_id>/cursos/",
         CursosPorDocenteView.as_view(),
@@ -72,6 +86,26 @@ urlpatterns = [
     ),
     # For Sections
     path("execute-code/", views.CodeExecutorAPIView.as_view(), name="execute-code"),
+    path(
+        "execute-code/batch/",
+        views.CodeExecutorBatchAPIView.as_view(),
+        name="execute-code-batch",
+    ),
+    path(
+        "execute-code/stream/",
+        views.CodeExecutorStreamAPIView.as_view(),
+        name="execute-code-stream",
+    ),
+    path(
+        "execute-code/jobs/",
+        views.CodeExecutionJobCreateView.as_view(),
+        name="execute-code-job-create",
+    ),
+    path(
+        "execute-code/jobs/<uuid:job_id>/",
+        views.CodeExecutionJobDetailView.as_view(),
+        name="execute-code-job-detail",
+    ),
     path("tipos-recurso/", views.TipoRecursoList.as_view(), name="tipos-recurso-list"),
     path("", include(router.urls)),
     path(
@@ -79,6 +113,16 @@ urlpatterns = [
         views.RecursosBySeccion.as_view(),
         name="recursos-by-seccion",
     ),
+    path(
+        "casos-prueba/seccion/<int:seccion_id>/",
+        views.CasosPruebaBySeccion.as_view(),
+        name="casos-prueba-by-seccion",
+    ),
+    path(
+        "calificar/seccion/<int:seccion_id>/",
+        views.CalificarSeccionView.as_view(),
+        name="calificar-seccion",
+    ),
     path(
         "feedback/create/", views.FeedbackCreateView.as_view(), name="feedback-create"
     ),
@@ -120,5 +164,24 @@ urlpatterns = [
     ),
     # endpoints para la ia
     path("ai-assistant/", AIAssistantView.as_view(), name="ai-assistant"),
+    path(
+        "ai-assistant/stream/",
+        AIAssistantStreamView.as_view(),
+        name="ai-assistant-stream",
+    ),
+    # Versiones asíncronas para despliegues ASGI (Pystart/asgi.py)
+    path(
+        "ai-assistant/async/",
+        AIAssistantAsyncView.as_view(),
+        name="ai-assistant-async",
+    ),
     path("ai-code-analysis/", AICodeAnalysisView.as_view(), name="ai-code-analysis"),
+    path(
+        "ai-code-analysis/async/",
+        AICodeAnalysisAsyncView.as_view(),
+        name="ai-code-analysis-async",
+    ),
+    path("ai-health/", AIHealthView.as_view(), name="ai-health"),
+    path("ai-metrics/", AIMetricsView.as_view(), name="ai-metrics"),
+    path("ai-usage/", AIUsageView.as_view(), name="ai-usage"),
 ]
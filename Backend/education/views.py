@@ -1,16 +1,17 @@
 from django.shortcuts import render
-from django.http import Http404
+from django.http import Http404, JsonResponse
+from django.views import View
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
 from users.models import Docente
+from django.conf import settings
+
+import asyncio
+import time
 
-import subprocess
-import tempfile
-import os
-import re
 from datetime import timedelta  # Necesario si usas DurationField en modelos
 from django.db.models import Sum
 from .models import (
@@ -32,10 +33,23 @@ from .models import (
     Comentario,
     ProgresoSeccion,
     Certificado,
+    TrabajoEjecucion,
+    CasoPrueba,
 )
 from users import models
+from .admission import ExecutionQueueFull
+from .code_executor import (
+    RESOURCE_METRICS,
+    execute_python_batch,
+    execute_python_code,
+    stream_python_code,
+)
+from .execution_jobs import enqueue_job
+from .grading import grade_submission
+from .sse import sse_response
 from .serializers import (
     CodeExecutionInputSerializer,
+    CodeExecutionBatchInputSerializer,
     CodeExecutionOutputSerializer,
     DepartamentoSerializer,
     ProvinciaSerializer,
@@ -58,8 +72,12 @@ from .serializers import (
     ComentarioCreateSerializer,
     ComentarioDetailSerializer,
     ProgresoSeccionSerializer,
+    ProgresoSeccionLoteSerializer,
     CertificadoSerializer,
     CertificadoInscripcionSerializer,
+    TrabajoEjecucionSerializer,
+    CasoPruebaSerializer,
+    CalificacionInputSerializer,
 )
 
 
@@ -154,6 +172,57 @@ class RecursosBySeccion(generics.ListAPIView):
         return Recurso.objects.filter(id_recurso__in=recursos_ids)
 
 
+# GET y POST de los casos de prueba por ID sección
+class CasosPruebaBySeccion(generics.ListCreateAPIView):
+    serializer_class = CasoPruebaSerializer
+
+    def get_seccion(self):
+        seccion_id = self.kwargs.get("seccion_id")
+        try:
+            return Seccion.objects.get(pk=seccion_id)
+        except Seccion.DoesNotExist:
+            raise Http404("La sección no existe")
+
+    def get_queryset(self):
+        return CasoPrueba.objects.filter(seccion=self.get_seccion())
+
+    def perform_create(self, serializer):
+        serializer.save(seccion=self.get_seccion())
+
+
+# POST para calificar una solución contra los casos de prueba de la sección
+class CalificarSeccionView(APIView):
+    def post(self, request, seccion_id, *args, **kwargs):
+        try:
+            seccion = Seccion.objects.get(pk=seccion_id)
+        except Seccion.DoesNotExist:
+            return Response(
+                {"error": "La sección no existe"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        input_serializer = CalificacionInputSerializer(data=request.data)
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not seccion.casos_prueba.exists():
+            return Response(
+                {"error": "La sección no tiene casos de prueba."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            resultado = grade_submission(
+                seccion,
+                input_serializer.validated_data["code"],
+                estudiante=input_serializer.validated_data.get("estudiante_id"),
+                marcar_completado=input_serializer.validated_data["marcar_completado"],
+                admission_key=_admission_key(request),
+            )
+        except ExecutionQueueFull as e:
+            return _queue_full_response(e)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+
 class DificultadDetail(generics.ListAPIView):
     queryset = DificultadCurso.objects.all()
     serializer_class = DificultadSerializer
@@ -229,6 +298,36 @@ class ProgresoSeccionCreateView(generics.CreateAPIView):
     serializer_class = ProgresoSeccionSerializer
 
 
+class ProgresoSeccionBulkCreateView(APIView):
+    """
+    Variante de progreso-secciones/completar/ para sincronizar muchas
+    secciones completadas a la vez (clientes sin conexión, migraciones de
+    datos). Los pares ya completados no son un error; el resultado de cada
+    uno se devuelve en el mismo orden del envío.
+    """
+
+    def post(self, request, *args, **kwargs):
+        input_serializer = ProgresoSeccionLoteSerializer(data=request.data)
+
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = input_serializer.validated_data["items"]
+        resultados = ProgresoSeccion.completar_en_lote(
+            (item["estudiante_id"], item["seccion_id"]) for item in items
+        )
+        return Response(
+            {
+                "completadas": resultados.count(ProgresoSeccion.COMPLETADA),
+                "resultados": [
+                    {**item, "resultado": resultado}
+                    for item, resultado in zip(items, resultados)
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class QuizCreateView(generics.CreateAPIView):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
@@ -311,85 +410,205 @@ class CodeExecutorAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        output = ""
-        execution_status = "success"
-        timeout_seconds = 5  # 5 sec para evitar bucles infinitos
-        temp_file_path = None
-
+        # Se ejecuta en un intérprete precalentado del pool (ver code_executor.py)
+        # cuando el limitador del nodo concede un cupo (ver admission.py)
+        admission_key = _admission_key(request)
         try:
-            # 1. Crear un archivo temporal para el código Python
-            with tempfile.NamedTemporaryFile(
-                mode="w", delete=False, suffix=".py", encoding="utf-8"
-            ) as temp_file:
-                temp_file.write(code)
-                temp_file_path = temp_file.name
-
-            # 2. Ejecutar el código Python usando subprocess
-            result = subprocess.run(
-                ["python", temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds,
-                check=False,  # En caso de código de error (ej. SyntaxError)
-            )
+            result = execute_python_code(code, admission_key=admission_key)
+        except ExecutionQueueFull as e:
+            return _queue_full_response(e)
 
-            # 3. Procesar la salida
-            if result.stdout:
-                output += result.stdout
-            if result.stderr:
-                output += "\n" + result.stderr
-
-            # 4. Determinar el estado de la ejecución
-            if result.returncode != 0:
-                execution_status = "error"
-            elif "Timeout" in output:
-                execution_status = "timeout"
-
-        except subprocess.TimeoutExpired:
-            output = f"Error: La ejecución del código excedió el límite de tiempo ({timeout_seconds} segundos)."
-            execution_status = "timeout"
-        except FileNotFoundError:
-            output = "Error: El intérprete de Python no se encontró."
-            execution_status = "error"
-        except Exception as e:
-            output = f"Error inesperado al ejecutar el código: {str(e)}"
-            execution_status = "error"
-        finally:
-            # 5. Limpiar el archivo temporal
-            if "temp_file_path" in locals() and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-
-        # Limpiado del nombre del archivo en el output
-        if temp_file_path:
-            # Escapar la ruta para que sea segura en la regex (especialmente en Windows con '\')
-            escaped_temp_path = re.escape(temp_file_path)
-            output = re.sub(
-                rf"File \"{escaped_temp_path}\", line (\d+), in <module>",
-                r"File \"<string>\", line \1, in <module>",
-                output,
-            )
-            output = re.sub(
-                rf"File \"{escaped_temp_path}\"", r"File \"<string>\"", output
-            )
-
-        # Eliminar cualquier otra ruta temporal que pueda aparecer, aunque el anterior es el más común
-        output = re.sub(
-            r"File \".*?tmp[a-zA-Z0-9]+\.py\", line (\d+), in <module>",
-            r"File \"<string>\", line \1, in <module>",
-            output,
+        # 6. Preparar la respuesta usando el Output Serializer
+        output_serializer = CodeExecutionOutputSerializer(
+            data=_execution_output_data(result)
         )
-        output = re.sub(
-            r"File \".*?tmp[a-zA-Z0-9]+\.py\"", r"File \"<string>\"", output
+        output_serializer.is_valid(raise_exception=True)
+
+        return Response(output_serializer.data, status=status.HTTP_200_OK)
+
+
+def _admission_key(request):
+    """
+    Clave con la que el limitador del nodo reparte los turnos (ver
+    admission.py): el usuario autenticado, la sesión si existe o la IP. El
+    ``estudiante_id`` del cuerpo lo elige el cliente y cambiándolo en cada
+    petición se adelantaría en la cola.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"usuario:{user.pk}"
+    session = getattr(request, "session", None)
+    # Solo una sesión creada por el servidor: la cookie la puede inventar el cliente
+    if (
+        session is not None
+        and session.session_key
+        and session.exists(session.session_key)
+    ):
+        return f"sesion:{session.session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _queue_full_response(exc):
+    return Response(
+        {
+            "error": "El ejecutor está saturado.",
+            "details": f"Intenta de nuevo en {exc.retry_after} segundos.",
+        },
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _execution_output_data(result):
+    output_data = {
+        "output": result["output"].strip(),
+        "status": result["status"],
+        "cached": result["cached"],
+        "error_type": result.get("error_type"),
+        "error_message": result.get("error_message"),
+    }
+    # Consumo medido por el sandbox (no existe si el proceso no terminó)
+    for metric in RESOURCE_METRICS:
+        output_data[metric] = result.get(metric)
+    return output_data
+
+
+class CodeExecutorBatchAPIView(APIView):
+    """
+    Ejecuta varios fragmentos de código en una sola petición (p. ej. para
+    revisar las entregas de todo un curso). Los fragmentos se reparten en un
+    pool de hilos de tamaño ``CODE_EXECUTOR_BATCH_PARALLELISM`` y los
+    resultados se devuelven en el mismo orden del envío.
+    """
+
+    def post(self, request, *args, **kwargs):
+        input_serializer = CodeExecutionBatchInputSerializer(data=request.data)
+
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = input_serializer.validated_data["items"]
+        admission_key = _admission_key(request)
+
+        python_indexes = [
+            index for index, item in enumerate(items) if item["language"] == "python"
+        ]
+        results = execute_python_batch(
+            [items[index]["code"] for index in python_indexes],
+            admission_key=admission_key,
         )
 
-        # 6. Preparar la respuesta usando el Output Serializer
-        output_data = {"output": output.strip(), "status": execution_status}
-        output_serializer = CodeExecutionOutputSerializer(data=output_data)
+        output_data = [
+            {
+                "output": "Lenguaje no soportado. Actualmente solo se soporta 'python'.",
+                "status": "error",
+                "error_type": "UnsupportedLanguage",
+            }
+            for _ in items
+        ]
+        for index, result in zip(python_indexes, results):
+            output_data[index] = _execution_output_data(result)
+
+        output_serializer = CodeExecutionOutputSerializer(data=output_data, many=True)
         output_serializer.is_valid(raise_exception=True)
-
         return Response(output_serializer.data, status=status.HTTP_200_OK)
 
 
+class CodeExecutorStreamAPIView(APIView):
+    """
+    Variante de execute-code/ que envía la salida como Server-Sent Events a
+    medida que el programa la produce. Eventos: "output" con cada fragmento
+    y "result" con el estado final.
+    """
+
+    def post(self, request, *args, **kwargs):
+        input_serializer = CodeExecutionInputSerializer(data=request.data)
+
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        code = input_serializer.validated_data["code"]
+        language = input_serializer.validated_data["language"]
+
+        if language != "python":
+            return Response(
+                {
+                    "error": "Lenguaje no soportado.",
+                    "details": "Actualmente solo se soporta 'python'.",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        admission_key = _admission_key(request)
+        events = stream_python_code(code, admission_key=admission_key)
+        return sse_response((event.pop("event"), event) for event in events)
+
+
+class CodeExecutionJobCreateView(APIView):
+    """
+    Modo asíncrono: encola el código y devuelve el id del trabajo de inmediato.
+    El resultado se consulta en execute-code/jobs/<id>/.
+    """
+
+    def post(self, request, *args, **kwargs):
+        input_serializer = CodeExecutionInputSerializer(data=request.data)
+
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        code = input_serializer.validated_data["code"]
+        language = input_serializer.validated_data["language"]
+
+        if language != "python":
+            return Response(
+                {
+                    "error": "Lenguaje no soportado.",
+                    "details": "Actualmente solo se soporta 'python'.",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        job = enqueue_job(code, language)
+        serializer = TrabajoEjecucionSerializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class CodeExecutionJobDetailView(View):
+    """
+    GET del estado de un trabajo. Con ?wait=<segundos> hace long-polling hasta
+    que el trabajo termine o se agote la espera. La vista es asíncrona: bajo
+    ASGI la espera no ocupa ningún hilo (bajo WSGI sí, por eso
+    ``CODE_EXECUTOR_JOB_MAX_WAIT`` es corto por defecto).
+    """
+
+    poll_interval = 0.25
+
+    async def get(self, request, job_id, *args, **kwargs):
+        job = await TrabajoEjecucion.objects.filter(id_trabajo=job_id).afirst()
+        if job is None:
+            return JsonResponse(
+                {"error": "Trabajo de ejecución no encontrado."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            wait = float(request.GET.get("wait", 0))
+        except ValueError:
+            wait = 0
+        wait = max(0, min(wait, settings.CODE_EXECUTOR_JOB_MAX_WAIT))
+
+        deadline = time.monotonic() + wait
+        while (
+            job.estado_trabajo != TrabajoEjecucion.FINALIZADO
+            and time.monotonic() < deadline
+        ):
+            await asyncio.sleep(self.poll_interval)
+            await job.arefresh_from_db()
+
+        serializer = TrabajoEjecucionSerializer(job)
+        return JsonResponse(serializer.data, status=status.HTTP_200_OK)
+
+
 class ComentarioCreateView(generics.CreateAPIView):
     serializer_class = ComentarioCreateSerializer
 